@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# graphql subscriptions are served over websocket next to django (imported once the apps are loaded)
+from core.websocket import GraphQLWebSocketApp  # noqa: E402
+
+graphql_websocket_application = GraphQLWebSocketApp(path='/graphql/')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await graphql_websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
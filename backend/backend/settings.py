@@ -1,4 +1,4 @@
-from decouple import config
+from decouple import Csv, config
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +32,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.routers.ReplicaStickinessMiddleware',
 ]
 
 # cors conf
@@ -39,10 +40,137 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:3000",
 ]
+# the read-from-primary cookie set after a mutation (core/routers.py)
+CORS_ALLOW_CREDENTIALS = True
 
 # graphene conf
 GRAPHENE = {
-    'SCHEMA': 'core.schema.schema'
+    'SCHEMA': 'core.schema.schema',
+    'MIDDLEWARE': ['core.instrumentation.InstrumentationMiddleware'],
+}
+
+# graphql instrumentation conf (core/instrumentation.py)
+# EXTENSIONS returns the per-operation profile in the response, histograms are served at /graphql/metrics/
+GRAPHQL_INSTRUMENTATION = {
+    'ENABLED': config('GRAPHQL_INSTRUMENTATION', default=True, cast=bool),
+    'EXTENSIONS': config('GRAPHQL_PROFILE_EXTENSIONS', default=DEBUG, cast=bool),
+    'N_PLUS_ONE_THRESHOLD': config('GRAPHQL_N_PLUS_ONE_THRESHOLD', default=5, cast=int),
+    'METRICS_TOKEN': config('GRAPHQL_METRICS_TOKEN', default=''),
+}
+
+# cache conf, REDIS_URL switches the default cache to a shared redis instance
+REDIS_URL = config('REDIS_URL', default='')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# graphql query result cache conf (core/cache.py)
+# core.cache.LocalMemoryBackend is per process, core.cache.DjangoCacheBackend uses CACHES[ALIAS]
+GRAPHQL_CACHE = {
+    'BACKEND': config('GRAPHQL_CACHE_BACKEND', default='core.cache.LocalMemoryBackend'),
+    'TIMEOUT': config('GRAPHQL_CACHE_TIMEOUT', default=60, cast=int),
+    'MAX_ENTRIES': config('GRAPHQL_CACHE_MAX_ENTRIES', default=10000, cast=int),
+    'ALIAS': 'default',
+}
+
+# persisted queries conf (core/persisted_queries.py)
+# ALLOW_LIST_ONLY rejects every operation missing from the MANIFEST json file
+GRAPHQL_PERSISTED_QUERIES = {
+    'ALLOW_LIST_ONLY': config('GRAPHQL_ALLOW_LIST_ONLY', default=False, cast=bool),
+    'MANIFEST': config('GRAPHQL_PERSISTED_QUERIES_MANIFEST', default=''),
+    'DOCUMENT_CACHE_SIZE': config('GRAPHQL_DOCUMENT_CACHE_SIZE', default=500, cast=int),
+    'CACHE_ALIAS': 'default',
+}
+
+# graphql cost limits conf (core/complexity.py)
+# BUDGET is the cost an organization may spend per WINDOW seconds, TENANT_BUDGETS overrides it per organization id
+# an operation may name at most MAX_TARGETS distinct organizations, projects and tasks
+GRAPHQL_COMPLEXITY = {
+    'ENABLED': config('GRAPHQL_COMPLEXITY', default=True, cast=bool),
+    'MAX_DEPTH': config('GRAPHQL_MAX_DEPTH', default=10, cast=int),
+    'MAX_COST': config('GRAPHQL_MAX_COST', default=20000, cast=int),
+    'MAX_TARGETS': config('GRAPHQL_MAX_TARGETS', default=1000, cast=int),
+    'BUDGET': config('GRAPHQL_COST_BUDGET', default=100000, cast=int),
+    'TENANT_BUDGETS': {},
+    'WINDOW': config('GRAPHQL_COST_WINDOW', default=60, cast=int),
+    'CACHE_ALIAS': 'default',
+}
+
+# per tenant rate limits conf (core/ratelimit.py)
+# every operation takes a token from the bucket of each organization it targets (refilled at RATE per
+# second up to BURST) and at most CONCURRENCY operations of an organization run at once, others get
+# HTTP 429; TENANT_LIMITS overrides them per organization id ({id: {'RATE': ..., 'BURST': ..., 'CONCURRENCY': ...}}),
+# core.ratelimit.CacheRateLimiter shares the limits between processes through CACHES[CACHE_ALIAS]
+GRAPHQL_RATE_LIMIT = {
+    'ENABLED': config('GRAPHQL_RATE_LIMIT', default=True, cast=bool),
+    'RATE': config('GRAPHQL_RATE_LIMIT_RATE', default=100, cast=float),
+    'BURST': config('GRAPHQL_RATE_LIMIT_BURST', default=200, cast=int),
+    'CONCURRENCY': config('GRAPHQL_RATE_LIMIT_CONCURRENCY', default=16, cast=int),
+    'TENANT_LIMITS': {},
+    'BACKEND': config(
+        'GRAPHQL_RATE_LIMIT_BACKEND',
+        default='core.ratelimit.CacheRateLimiter' if REDIS_URL else 'core.ratelimit.LocalRateLimiter',
+    ),
+    'CACHE_ALIAS': 'default',
+}
+
+# graphql subscriptions conf (core/subscriptions.py, websocket server in backend/asgi.py)
+# without a CHANNEL_LAYER events only reach the subscribers of the process that ran the mutation,
+# core.subscriptions.RedisChannelLayer (redis package) shares them between processes and nodes
+GRAPHQL_SUBSCRIPTIONS = {
+    'CHANNEL_LAYER': config(
+        'GRAPHQL_SUBSCRIPTIONS_CHANNEL_LAYER', default='core.subscriptions.RedisChannelLayer' if REDIS_URL else ''
+    ),
+    'REDIS_URL': REDIS_URL,
+    'QUEUE_SIZE': config('GRAPHQL_SUBSCRIPTIONS_QUEUE_SIZE', default=1000, cast=int),
+    'CONNECTION_INIT_TIMEOUT': 10,
+    'MAX_SUBSCRIPTIONS': config('GRAPHQL_MAX_SUBSCRIPTIONS', default=100, cast=int),
+}
+
+# tenant export conf (core/export.py), served at /export/organizations/<id>/ to staff users or with TOKEN
+EXPORT = {
+    'CHUNK_SIZE': config('EXPORT_CHUNK_SIZE', default=2000, cast=int),
+    'TOKEN': config('EXPORT_TOKEN', default=''),
+}
+
+# tenant import conf (core/bulk_import.py), POST /import/organizations/<id>/ needs TOKEN, disabled without one
+IMPORT = {
+    'CHUNK_SIZE': config('IMPORT_CHUNK_SIZE', default=5000, cast=int),
+    'TOKEN': config('IMPORT_TOKEN', default=''),
+}
+
+# chunked delete and archival conf (core/archive.py)
+# archive_projects moves projects in one of STATUSES with no activity for RETENTION_DAYS to the archive tables
+ARCHIVE = {
+    'BATCH_SIZE': config('ARCHIVE_BATCH_SIZE', default=1000, cast=int),
+    'RETENTION_DAYS': config('ARCHIVE_RETENTION_DAYS', default=365, cast=int),
+    'STATUSES': config('ARCHIVE_STATUSES', default='COMPLETED', cast=Csv()),
+}
+
+# incremental sync conf (core/sync.py)
+# a sync's last cursor lags SETTLE_SECONDS behind (longer than write transactions and replication lag),
+# tombstones of removed rows are pruned after TOMBSTONE_DAYS (prune_tombstones command)
+SYNC = {
+    'PAGE_SIZE': config('SYNC_PAGE_SIZE', default=200, cast=int),
+    'MAX_PAGE_SIZE': config('SYNC_MAX_PAGE_SIZE', default=1000, cast=int),
+    'SETTLE_SECONDS': config('SYNC_SETTLE_SECONDS', default=10, cast=int),
+    'TOMBSTONE_DAYS': config('SYNC_TOMBSTONE_DAYS', default=30, cast=int),
+}
+
+# activity log conf (core/activity.py)
+# mutations queue their entries, a background thread of each process writes them BATCH_SIZE at a time
+# or every FLUSH_SECONDS; beyond MAX_QUEUE pending entries new ones are dropped
+ACTIVITY_LOG = {
+    'ENABLED': config('ACTIVITY_LOG', default=True, cast=bool),
+    'BACKGROUND': config('ACTIVITY_LOG_BACKGROUND', default=True, cast=bool),
+    'BATCH_SIZE': config('ACTIVITY_LOG_BATCH_SIZE', default=500, cast=int),
+    'FLUSH_SECONDS': config('ACTIVITY_LOG_FLUSH_SECONDS', default=1.0, cast=float),
+    'MAX_QUEUE': config('ACTIVITY_LOG_MAX_QUEUE', default=10000, cast=int),
 }
 
 ROOT_URLCONF = 'backend.urls'
@@ -66,17 +194,52 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
+# connection reuse: CONN_MAX_AGE keeps a connection per thread across requests (WSGI worker threads);
+# DATABASE_POOL shares a bounded pool between the threads of a process instead (ASGI runs every request
+# in a new thread), connections then go back to the pool at the end of each request (core/postgresql_pool)
+DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.postgresql_pool' if DATABASE_POOL else 'django.db.backends.postgresql',
         'NAME': config('DATABASE_NAME', default='multi_tenant_db'),
         'USER': config('DATABASE_USER', default='postgres'),
         'PASSWORD': config('DATABASE_PASSWORD'),
         'HOST': config('DATABASE_HOST', default='localhost'),
         'PORT': config('DATABASE_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DATABASE_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'POOL': {
+            'MAX_SIZE': config('DATABASE_POOL_MAX_SIZE', default=20, cast=int),
+            'TIMEOUT': config('DATABASE_POOL_TIMEOUT', default=10, cast=float),
+            'MAX_LIFETIME': config('DATABASE_POOL_MAX_LIFETIME', default=1800, cast=int),
+        } if DATABASE_POOL else None,
     }
 }
 
+# read replicas, host or host:port of a streaming replica of the default database
+for number, replica_host in enumerate(config('DATABASE_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        # same data as default in tests, never migrated
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# read replica routing conf (core/routers.py)
+# graphql queries read from REPLICAS, TENANT_DATABASES pins organization ids to dedicated replica aliases
+# ({id: [alias, ...]} or the dotted path of a function of the id); a client that ran a mutation reads
+# from the primary for STICKY_SECONDS, the replication lag bound
+DATABASE_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias.startswith('replica_')],
+    'TENANT_DATABASES': {},
+    'STICKY_SECONDS': config('DATABASE_STICKY_SECONDS', default=5, cast=int),
+    'STICKY_COOKIE': 'db_primary',
+}
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -1,9 +1,15 @@
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from core.views import (
+    AsyncGraphQLView, PersistedGraphQLView, export_organization, graphql_metrics, import_organization,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))), # query through single endpoint
+    path('export/organizations/<int:organization_id>/', export_organization), # streamed ndjson / csv
+    path('import/organizations/<int:organization_id>/', csrf_exempt(import_organization)), # bearer token only
+    path('graphql/metrics/', graphql_metrics),
+    path('graphql/async/', csrf_exempt(AsyncGraphQLView.as_view(graphiql=True))), # same schema, for ASGI servers
+    path('graphql/', csrf_exempt(PersistedGraphQLView.as_view(graphiql=True))), # query through single endpoint
 ]
\ No newline at end of file
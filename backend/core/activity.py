@@ -0,0 +1,247 @@
+"""
+Append-only activity log of the GraphQL mutations.
+
+Mutations report the objects they create or change with the *_created /
+*_updated hooks, which build one ActivityEntry per object with its
+field-level diff and hand them to the ActivityWriter once the transaction
+commits. The writer's background thread inserts them with one bulk INSERT
+per BATCH_SIZE entries or FLUSH_SECONDS, so the log costs a request an
+append to an in-process queue. A full queue (MAX_QUEUE entries, e.g. while
+the database is unreachable) drops entries instead of blocking requests,
+entries still queued are written at exit.
+
+Entries are never updated: small integer kind and action codes, the diff as
+JSON, indexed on (organization_id, -created_at, -id) for the tenant scoped,
+keyset paginated activityFeed query.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from graphql import GraphQLError
+
+from .models import ActivityEntry
+from .serialization import json_value
+
+logger = logging.getLogger(__name__)
+
+PROJECT_FIELDS = ('name', 'description', 'status', 'due_date')
+TASK_FIELDS = ('title', 'description', 'status', 'assignee_email', 'due_date')
+COMMENT_FIELDS = ('content', 'author_email')
+
+KINDS = {
+    'project': ActivityEntry.PROJECT,
+    'task': ActivityEntry.TASK,
+    'comment': ActivityEntry.COMMENT,
+}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+ACTION_NAMES = {ActivityEntry.CREATED: 'created', ActivityEntry.UPDATED: 'updated'}
+
+
+def activity_settings():
+    options = getattr(settings, 'ACTIVITY_LOG', {})
+    return {
+        'ENABLED': options.get('ENABLED', True),
+        # False: written in the committing thread, for commands and tests
+        'BACKGROUND': options.get('BACKGROUND', True),
+        'BATCH_SIZE': options.get('BATCH_SIZE', 500),
+        'FLUSH_SECONDS': options.get('FLUSH_SECONDS', 1.0),
+        'MAX_QUEUE': options.get('MAX_QUEUE', 10000),
+    }
+
+
+def actor_of(context):
+    """
+    username of the user behind a request or websocket context, '' when anonymous
+    """
+    user = getattr(context, 'user', None)
+    if user is None:
+        user = getattr(context, 'scope', {}).get('user')
+    if user is None or not user.is_authenticated:
+        return ''
+    return user.get_username()
+
+
+class ActivityWriter:
+    """
+    queue of entries written by a background thread of this process
+    """
+
+    def __init__(self, batch_size=500, flush_seconds=1.0, max_queue=10000, background=True):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.background = background
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def put(self, entries):
+        if not self.background:
+            self.write(entries)
+            return
+        self._start()
+        for entry in entries:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning("Activity log queue full, %d entries dropped", self.dropped)
+
+    def _start(self):
+        # threads do not survive a fork, each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='activity-writer', daemon=True).start()
+
+    def _take(self, block=True):
+        """
+        next batch of queued entries, waiting up to flush_seconds for a full one
+        """
+        try:
+            batch = [self._queue.get(block=block)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + (self.flush_seconds if block else 0)
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self.write(self._take())
+
+    def write(self, entries):
+        if not entries:
+            return
+        close_old_connections()
+        try:
+            ActivityEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+        except Exception:
+            logger.exception("Could not write %d activity entries", len(entries))
+
+    def flush(self):
+        """
+        write the queued entries from the calling thread
+        """
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self.write(batch)
+
+
+_activity_writer = None
+
+
+def get_activity_writer():
+    global _activity_writer
+    if _activity_writer is None:
+        options = activity_settings()
+        _activity_writer = ActivityWriter(
+            batch_size=options['BATCH_SIZE'], flush_seconds=options['FLUSH_SECONDS'],
+            max_queue=options['MAX_QUEUE'], background=options['BACKGROUND'],
+        )
+        atexit.register(_activity_writer.flush)
+    return _activity_writer
+
+
+def _record_on_commit(entries):
+    if entries and activity_settings()['ENABLED']:
+        transaction.on_commit(lambda: get_activity_writer().put(entries))
+
+
+def _entry(kind, action, instance, organization_id, changes, actor):
+    return ActivityEntry(
+        organization_id=organization_id,
+        kind=KINDS[kind],
+        object_id=instance.pk,
+        action=action,
+        actor=actor,
+        changes=changes,
+        created_at=timezone.now(),
+    )
+
+
+def snapshot(instance, fields):
+    """
+    values of fields before a mutation changes them, for *_updated()
+    """
+    return {field: getattr(instance, field) for field in fields}
+
+
+def changed_fields(instance, previous):
+    return [field for field, value in previous.items() if getattr(instance, field) != value]
+
+
+def _created(kind, instances, fields, organization_id, actor):
+    _record_on_commit([
+        _entry(
+            kind, ActivityEntry.CREATED, instance, organization_id,
+            {field: json_value(getattr(instance, field)) for field in fields}, actor
+        )
+        for instance in instances
+    ])
+
+
+def _updated(kind, changes, organization_id, actor):
+    """
+    changes: [(instance, snapshot() taken before the change)], unchanged instances are not logged
+    """
+    entries = []
+    for instance, previous in changes:
+        diff = {
+            field: [json_value(previous[field]), json_value(getattr(instance, field))]
+            for field in changed_fields(instance, previous)
+        }
+        if diff:
+            entries.append(_entry(kind, ActivityEntry.UPDATED, instance, organization_id, diff, actor))
+    _record_on_commit(entries)
+
+
+def projects_created(projects, organization_id, actor=''):
+    _created('project', projects, PROJECT_FIELDS, organization_id, actor)
+
+
+def projects_updated(changes, organization_id, actor=''):
+    _updated('project', changes, organization_id, actor)
+
+
+def tasks_created(tasks, organization_id, actor=''):
+    _created('task', tasks, ('project_id', *TASK_FIELDS), organization_id, actor)
+
+
+def tasks_updated(changes, organization_id, actor=''):
+    _updated('task', changes, organization_id, actor)
+
+
+def comments_created(comments, organization_id, actor=''):
+    _created('comment', comments, ('task_id', *COMMENT_FIELDS), organization_id, actor)
+
+
+def feed(organization_id, kind=None, object_id=None):
+    """
+    entries of an organization, of one kind of object or of one object, newest first
+    """
+    entries = ActivityEntry.objects.filter(organization_id=organization_id)
+    if kind is not None:
+        if kind not in KINDS:
+            raise GraphQLError(f"Unknown activity kind: {kind}")
+        entries = entries.filter(kind=KINDS[kind])
+    if object_id is not None:
+        entries = entries.filter(object_id=object_id)
+    return entries
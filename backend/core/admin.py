@@ -1,34 +1,193 @@
 from django.contrib import admin
-from .models import Organizations, Projects, Tasks, TaskComment
+from django.contrib.auth import get_permission_codename
+from django.db.models import Q
+from . import counters, search
+from .archive import Remover
+from .cache import get_query_cache
+from .models import ActivityEntry, ImportJob, Organizations, Projects, Tasks, TaskComment
+
+
+class FullTextSearchMixin:
+    """
+    admin search through the GIN indexed search_vector where available,
+    the remaining search_fields (emails) are matched exactly
+    """
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        engine = search.get_search_engine()
+        if not engine.indexed or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        document_fields = {field for field, weight in search.SEARCH_FIELDS[self.search_kind]}
+        exact = Q()
+        for field in self.search_fields:
+            if field not in document_fields:
+                exact |= Q(**{f'{field}__iexact': search_term.strip()})
+        queryset = engine.annotate(self.search_kind, queryset, search_term)
+        return queryset.filter(Q(search_match=True) | exact), False
+
+
+class ChunkedDeleteMixin:
+    """
+    deletes through core.archive.Remover, in batches committed one by one, instead of a cascade
+    collected in Python, with counters and tombstones kept up to date;
+    the confirmation page counts the rows going with the objects
+    """
+
+    def remove(self, remover, obj):
+        raise NotImplementedError
+
+    def descendants(self, objs):
+        """
+        [(model, queryset)] of the rows deleted with objs
+        """
+        raise NotImplementedError
+
+    def delete_view(self, request, object_id, extra_context=None):
+        # without the transaction ModelAdmin.delete_view wraps around the whole deletion
+        return self._delete_view(request, object_id, extra_context)
+
+    def delete_model(self, request, obj):
+        self.remove(Remover(), obj)
+
+    def delete_queryset(self, request, queryset):
+        remover = Remover()
+        for obj in queryset:
+            self.remove(remover, obj)
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        model_count = {self.model._meta.verbose_name_plural: len(objs)}
+        perms_needed = set()
+        for model, queryset in [(self.model, None)] + self.descendants(objs):
+            opts = model._meta
+            if queryset is not None:
+                model_count[opts.verbose_name_plural] = queryset.count()
+            if not request.user.has_perm(f"{opts.app_label}.{get_permission_codename('delete', opts)}"):
+                perms_needed.add(opts.verbose_name)
+        return [str(obj) for obj in objs], model_count, perms_needed, []
 
 
 @admin.register(Organizations)
-class OrganizationAdmin(admin.ModelAdmin):
+class OrganizationAdmin(ChunkedDeleteMixin, admin.ModelAdmin):
     list_display = ['name', 'slug', 'contact_email', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name', 'contact_email']
     prepopulated_fields = {'slug': ('name',)}
 
+    def remove(self, remover, obj):
+        remover.remove_organization(obj)
+
+    def descendants(self, objs):
+        ids = [obj.pk for obj in objs]
+        return [
+            (Projects, Projects.objects.filter(organization_id__in=ids)),
+            (Tasks, Tasks.objects.filter(organization_id__in=ids)),
+            (TaskComment, TaskComment.objects.filter(organization_id__in=ids)),
+        ]
+
 
 @admin.register(Projects)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(ChunkedDeleteMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = search.PROJECT
     list_display = ['name', 'organization', 'status', 'due_date', 'task_count', 'created_at']
     list_filter = ['status', 'organization', 'created_at']
     search_fields = ['name', 'description']
     raw_id_fields = ['organization']
 
+    def get_readonly_fields(self, request, obj=None):
+        # projects never move between organizations, counters and cached owners rely on it
+        return ['organization'] if obj is not None else []
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old_status = Projects.objects.select_for_update().filter(pk=obj.pk).values_list('status', flat=True).get()
+            super().save_model(request, obj, form, change)
+            counters.project_status_changed(obj, old_status)
+        else:
+            super().save_model(request, obj, form, change)
+            counters.project_created(obj)
+        get_query_cache().invalidate_on_commit(obj.organization_id)
+
+    def remove(self, remover, obj):
+        remover.remove_project(obj)
+
+    def descendants(self, objs):
+        ids = [obj.pk for obj in objs]
+        return [
+            (Tasks, Tasks.objects.filter(project_id__in=ids)),
+            (TaskComment, TaskComment.objects.filter(task__project_id__in=ids)),
+        ]
+
 
 @admin.register(Tasks)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(ChunkedDeleteMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = search.TASK
     list_display = ['title', 'project', 'status', 'assignee_email', 'due_date', 'created_at']
-    list_filter = ['status', 'project__organization', 'created_at']
+    list_filter = ['status', 'organization', 'created_at']
     search_fields = ['title', 'description', 'assignee_email']
     raw_id_fields = ['project']
 
+    def get_readonly_fields(self, request, obj=None):
+        return ['project'] if obj is not None else []
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old_status = Tasks.objects.select_for_update().filter(pk=obj.pk).values_list('status', flat=True).get()
+            super().save_model(request, obj, form, change)
+            counters.task_status_changed(obj, old_status)
+        else:
+            super().save_model(request, obj, form, change)
+            counters.task_created(obj)
+        get_query_cache().invalidate_on_commit(obj.organization_id)
+
+    def remove(self, remover, obj):
+        remover.remove_tasks(Tasks.objects.filter(pk=obj.pk), obj.organization_id or obj.project.organization_id)
+
+    def descendants(self, objs):
+        return [(TaskComment, TaskComment.objects.filter(task_id__in=[obj.pk for obj in objs]))]
+
 
 @admin.register(TaskComment)
-class TaskCommentAdmin(admin.ModelAdmin):
+class TaskCommentAdmin(ChunkedDeleteMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = search.COMMENT
     list_display = ['task', 'author_email', 'created_at']
     list_filter = ['created_at']
     search_fields = ['content', 'author_email']
     raw_id_fields = ['task']
+
+    def remove(self, remover, obj):
+        remover.remove_comments(
+            TaskComment.objects.filter(pk=obj.pk), obj.organization_id or obj.task.project.organization_id
+        )
+
+    def descendants(self, objs):
+        return []
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'organization', 'status', 'records_committed', 'tasks_created', 'comments_created',
+                    'rejected', 'created_at']
+    list_filter = ['status', 'created_at']
+    raw_id_fields = ['organization']
+    readonly_fields = ['records_committed', 'tasks_created', 'comments_created', 'rejected', 'errors', 'last_error']
+
+
+@admin.register(ActivityEntry)
+class ActivityEntryAdmin(admin.ModelAdmin):
+    """
+    read only, the log is append-only
+    """
+    list_display = ['created_at', 'organization_id', 'kind', 'object_id', 'action', 'actor']
+    list_filter = ['kind', 'action', 'created_at']
+    search_fields = ['actor']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
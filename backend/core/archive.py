@@ -0,0 +1,213 @@
+"""
+Chunked deletion and archival of organizations and projects.
+
+Model.delete() on an organization or a project makes Django collect every
+descendant row in Python (projects, tasks, comments, import refs) and
+delete them all in one transaction, memory grows with the tenant and locks
+are held until the end. Remover works bottom-up instead, one batch of
+BATCH_SIZE tasks per short transaction (their comments, then the tasks),
+then the projects and finally the organization, whose delete() has nothing
+left to collect. With archive=True every batch is first copied to the
+Archived* tables by one INSERT ... SELECT, so rows never pass through
+Python either way; the tombstones changesSince serves (core/sync.py) are
+written alike.
+
+cold_projects() selects the projects left COMPLETED (STATUSES) with no
+activity for RETENTION_DAYS, archiving them keeps the hot tables small.
+Counters and the query cache follow batch by batch; an interrupted run
+leaves whole batches behind and is simply run again.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, DateTimeField, F, Value
+from django.utils import timezone
+
+from . import counters, sync
+from .cache import get_query_cache
+from .models import (
+    ActivityEntry, ArchivedProject, ArchivedTask, ArchivedTaskComment, ImportJob, Organizations, Projects, Tasks,
+    TaskComment, Tombstone,
+)
+
+ARCHIVE_MODELS = {
+    Projects: ArchivedProject,
+    Tasks: ArchivedTask,
+    TaskComment: ArchivedTaskComment,
+}
+
+
+def archive_settings():
+    options = getattr(settings, 'ARCHIVE', {})
+    return {
+        'BATCH_SIZE': options.get('BATCH_SIZE', 1000),
+        'RETENTION_DAYS': options.get('RETENTION_DAYS', 365),
+        'STATUSES': options.get('STATUSES', ['COMPLETED']),
+    }
+
+
+def cold_projects(retention_days=None, statuses=None, organization_id=None):
+    """
+    projects in one of statuses whose project and tasks were not updated for retention_days
+    """
+    options = archive_settings()
+    days = options['RETENTION_DAYS'] if retention_days is None else retention_days
+    cutoff = timezone.now() - timedelta(days=days)
+    projects = Projects.objects.filter(status__in=statuses or options['STATUSES'], updated_at__lt=cutoff)
+    if organization_id is not None:
+        projects = projects.filter(organization_id=organization_id)
+    return projects.exclude(tasks__updated_at__gte=cutoff)
+
+
+def insert_select(model, queryset, values):
+    """
+    INSERT INTO <model table> (...) SELECT ... FROM <queryset>, values: model field -> expression
+    over the rows of queryset; return the number of rows inserted
+    """
+    # annotations only, the SELECT list then follows their order
+    aliases = {f'insert_{index}': expression for index, expression in enumerate(values.values())}
+    select = queryset.order_by().annotate(**aliases).values_list(*aliases)
+    sql, params = select.query.sql_with_params()
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in values)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def copy_to_archive(queryset, archived_at):
+    archive_model = ARCHIVE_MODELS[queryset.model]
+    values = {
+        field.attname: F(field.attname)
+        for field in archive_model._meta.concrete_fields if field.name != 'archived_at'
+    }
+    values['archived_at'] = Value(archived_at, output_field=DateTimeField())
+    return insert_select(archive_model, queryset, values)
+
+
+def record_removals(queryset, removed_at):
+    """
+    tombstones of the rows of queryset
+    """
+    return insert_select(Tombstone, queryset.filter(organization__isnull=False), {
+        'organization_id': F('organization_id'),
+        'kind': Value(sync.MODEL_KINDS[queryset.model], output_field=CharField()),
+        'object_id': F('pk'),
+        'deleted_at': Value(removed_at, output_field=DateTimeField()),
+    })
+
+
+class Remover:
+    """
+    removes (archive=True: archives) organizations and projects in batches,
+    on_batch(remover) is called after every committed batch
+    """
+
+    def __init__(self, archive=False, batch_size=None, on_batch=None):
+        self.archive = archive
+        self.batch_size = batch_size or archive_settings()['BATCH_SIZE']
+        self.on_batch = on_batch
+        self.removed_at = timezone.now()
+        self.removed = {'projects': 0, 'tasks': 0, 'comments': 0}
+        self.started = time.monotonic()
+
+    @property
+    def rows(self):
+        return sum(self.removed.values())
+
+    @property
+    def rows_per_second(self):
+        return self.rows / max(time.monotonic() - self.started, 1e-9)
+
+    def _batches(self, queryset):
+        # removed rows drop out of queryset, so every batch is its first batch_size rows
+        while True:
+            ids = list(queryset.order_by().values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            yield ids
+
+    def _remove(self, queryset, bookkeeping=True):
+        if self.archive:
+            copy_to_archive(queryset, self.removed_at)
+        if bookkeeping:
+            record_removals(queryset, self.removed_at)
+        deleted, by_model = queryset.delete()
+        return by_model.get(queryset.model._meta.label, 0)
+
+    def _progress(self, **removed):
+        for kind, count in removed.items():
+            self.removed[kind] += count
+        if self.on_batch is not None:
+            self.on_batch(self)
+
+    def remove_tasks(self, tasks, organization_id, bookkeeping=True):
+        """
+        remove the tasks of a queryset and their comments, one transaction per batch;
+        bookkeeping=False writes neither counters nor tombstones, for an organization removed whole
+        """
+        for ids in self._batches(tasks):
+            with transaction.atomic():
+                # locked, so no comment is added to them before they go
+                rows = list(Tasks.objects.select_for_update().filter(pk__in=ids).values_list('project_id', 'status'))
+                comments = self._remove(TaskComment.objects.filter(task_id__in=ids), bookkeeping)
+                removed = self._remove(Tasks.objects.filter(pk__in=ids), bookkeeping)
+                if bookkeeping:
+                    counters.tasks_deleted(rows, organization_id)
+                get_query_cache().invalidate_on_commit(organization_id)
+            self._progress(tasks=removed, comments=comments)
+
+    def remove_comments(self, comments, organization_id):
+        for ids in self._batches(comments):
+            with transaction.atomic():
+                removed = self._remove(TaskComment.objects.filter(pk__in=ids))
+                get_query_cache().invalidate_on_commit(organization_id)
+            self._progress(comments=removed)
+
+    def remove_project(self, project):
+        self.remove_tasks(Tasks.objects.filter(project_id=project.pk), project.organization_id)
+        with transaction.atomic():
+            Projects.objects.select_for_update().filter(pk=project.pk).first()
+            # tasks added meanwhile, usually none
+            self.remove_tasks(Tasks.objects.filter(project_id=project.pk), project.organization_id)
+            projects = self._remove(Projects.objects.filter(pk=project.pk))
+            if projects:
+                counters.project_deleted(project)
+            get_query_cache().invalidate_on_commit(project.organization_id)
+        self._progress(projects=projects)
+
+    def remove_projects(self, projects):
+        """
+        remove every project of a queryset (e.g. cold_projects()), one after the other
+        """
+        for ids in self._batches(projects):
+            for project in Projects.objects.filter(pk__in=ids).order_by('pk'):
+                self.remove_project(project)
+
+    def remove_organization(self, organization):
+        """
+        remove an organization with its projects, tasks, comments, import jobs, tombstones and
+        activity entries; its archived rows are purged too unless they are archived
+        """
+        organization_id = organization.pk
+        self.remove_tasks(Tasks.objects.filter(organization_id=organization_id), organization_id, bookkeeping=False)
+        projects = Projects.objects.filter(organization_id=organization_id)
+        for ids in self._batches(projects):
+            with transaction.atomic():
+                # collects the tasks left without organization_id, if any
+                removed = self._remove(Projects.objects.filter(pk__in=ids), bookkeeping=False)
+            self._progress(projects=removed)
+        ImportJob.objects.filter(organization_id=organization_id).delete()
+        for model in (Tombstone, ActivityEntry):
+            # plain organization_id columns, no cascade reaches them
+            for ids in self._batches(model.objects.filter(organization_id=organization_id)):
+                model.objects.filter(pk__in=ids).delete()
+        if not self.archive:
+            for archive_model in ARCHIVE_MODELS.values():
+                archived = archive_model.objects.filter(organization_id=organization_id)
+                for ids in self._batches(archived):
+                    archive_model.objects.filter(pk__in=ids).delete()
+        Organizations.objects.filter(pk=organization_id).delete()
+        get_query_cache().invalidate(organization_id)
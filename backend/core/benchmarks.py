@@ -0,0 +1,250 @@
+"""
+GraphQL benchmark suite.
+
+Replays representative operations (the ones the frontend sends) against
+core.schema.schema in-process and reports latency percentiles and SQL queries
+per operation. Variables are sampled from the current database, so run it
+after generate_load_data.
+
+run_connection_benchmark() replays one operation as a request of its own
+under each way of getting a database connection (a new one per request, a
+persistent one, one from the pool of core.postgresql_pool) to measure what
+connection reuse saves per request.
+"""
+import random
+import time
+from dataclasses import dataclass, field
+
+from django.core.signals import request_finished, request_started
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .cache import get_query_cache
+from .models import Organizations, Projects, Tasks
+
+OPERATIONS = {
+    'organizations': (
+        'query { organizations { id name slug contactEmail createdAt } }',
+        (),
+    ),
+    'projects': (
+        '''query($organizationId: Int!) {
+          projects(organizationId: $organizationId, first: 50) {
+            edges { node { id name description status dueDate taskCount completedTasksCount completionRate createdAt } }
+            pageInfo { hasNextPage endCursor }
+          }
+        }''',
+        ('organizationId',),
+    ),
+    'tasks': (
+        '''query($projectId: Int!) {
+          tasks(projectId: $projectId, first: 50) {
+            edges { node { id title description status assigneeEmail dueDate createdAt } }
+            pageInfo { hasNextPage endCursor }
+          }
+        }''',
+        ('projectId',),
+    ),
+    'open_tasks': (
+        '''query($projectId: Int!) {
+          tasks(projectId: $projectId, status: ["TODO", "IN_PROGRESS"], orderBy: "DUE_DATE", first: 50) {
+            edges { node { id title status assigneeEmail dueDate } }
+            pageInfo { hasNextPage endCursor }
+          }
+        }''',
+        ('projectId',),
+    ),
+    'task': (
+        'query($taskId: Int!) { task(id: $taskId) { id title status } }',
+        ('taskId',),
+    ),
+    'task_comments': (
+        '''query($taskId: Int!) {
+          taskComments(taskId: $taskId, first: 50) { edges { node { id content authorEmail createdAt } } }
+        }''',
+        ('taskId',),
+    ),
+    'project_stats': (
+        '''query($organizationId: Int!) {
+          projectStats(organizationId: $organizationId) {
+            totalProjects activeProjects completedProjects totalTasks completedTasks overallCompletionRate
+          }
+        }''',
+        ('organizationId',),
+    ),
+    'create_task': (
+        '''mutation($projectId: Int!) {
+          createTask(input: {projectId: $projectId, title: "Benchmark task"}) { success task { id } }
+        }''',
+        ('projectId',),
+    ),
+    'update_task': (
+        '''mutation($taskId: Int!) {
+          updateTask(input: {id: $taskId, status: "DONE"}) { success task { id status } }
+        }''',
+        ('taskId',),
+    ),
+}
+MUTATIONS = {'create_task', 'update_task'}
+
+
+@dataclass
+class OperationResult:
+    name: str
+    timings: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+    def percentile(self, percent):
+        ordered = sorted(self.timings)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            'operation': self.name,
+            'runs': len(self.timings),
+            'errors': self.errors,
+            'p50_ms': self.percentile(50) * 1000,
+            'p90_ms': self.percentile(90) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': max(self.timings, default=0) * 1000,
+            'queries_avg': sum(self.queries) / len(self.queries) if self.queries else 0,
+            'queries_max': max(self.queries, default=0),
+        }
+
+
+class VariableSampler:
+    """
+    random ids of existing rows, sampled once
+    """
+
+    def __init__(self, rng, sample_size=200):
+        self.rng = rng
+        self.ids = {
+            'organizationId': list(Organizations.objects.order_by('?').values_list('id', flat=True)[:sample_size]),
+            'projectId': list(Projects.objects.order_by('?').values_list('id', flat=True)[:sample_size]),
+            'taskId': list(Tasks.objects.order_by('?').values_list('id', flat=True)[:sample_size]),
+        }
+
+    def variables(self, names):
+        missing = [name for name in names if not self.ids[name]]
+        if missing:
+            raise ValueError(f"No rows to sample {', '.join(missing)} from, generate data first")
+        return {name: self.rng.choice(self.ids[name]) for name in names}
+
+
+def run_benchmarks(schema, operations=None, iterations=100, cold=False, seed=None):
+    """
+    run every operation `iterations` times, return {name: OperationResult};
+    mutations run in a transaction that is rolled back, cold clears the query cache before each run
+    """
+    rng = random.Random(seed)
+    sampler = VariableSampler(rng)
+    request_factory = RequestFactory()
+    results = {}
+    for name in operations or OPERATIONS:
+        query, variable_names = OPERATIONS[name]
+        result = results[name] = OperationResult(name)
+        for _ in range(iterations):
+            variables = sampler.variables(variable_names)
+            if cold:
+                get_query_cache().backend.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    execution = schema.execute(
+                        query, variable_values=variables, context_value=request_factory.post('/graphql/')
+                    )
+                    elapsed = time.perf_counter() - started
+                if name in MUTATIONS:
+                    transaction.set_rollback(True)
+            result.timings.append(elapsed)
+            result.queries.append(len(captured))
+            if execution.errors:
+                result.errors += 1
+    return results
+
+
+# connection settings of each mode, pooled keeps the configured POOL
+CONNECTION_MODES = {
+    'reconnect': {'CONN_MAX_AGE': 0, 'POOL': None},
+    'persistent': {'CONN_MAX_AGE': None, 'POOL': None},
+    'pooled': {'CONN_MAX_AGE': 0},
+}
+
+
+class QueryCounter:
+    """
+    execute wrapper counting queries
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def connection_modes():
+    """
+    modes the default database supports, pooled needs ENGINE = 'core.postgresql_pool' with a POOL
+    """
+    modes = ['reconnect', 'persistent']
+    if connection.settings_dict.get('POOL'):
+        modes.append('pooled')
+    return modes
+
+
+def run_connection_benchmark(schema, operation='task', modes=None, iterations=100, seed=None):
+    """
+    run the operation `iterations` times per connection mode, each run between the request_started
+    and request_finished signals that open and close Django's connections; return {mode: OperationResult}.
+    The query cache is cleared before every run so that each one reads from the database.
+    """
+    query, variable_names = OPERATIONS[operation]
+    if operation in MUTATIONS:
+        raise ValueError(f"{operation} is a mutation, pick a read operation")
+    modes = modes or connection_modes()
+    unsupported = set(modes) - set(connection_modes())
+    if unsupported:
+        raise ValueError(f"Connection modes not available with this database: {', '.join(sorted(unsupported))}")
+    rng = random.Random(seed)
+    sampler = VariableSampler(rng)
+    request_factory = RequestFactory()
+    settings_dict = connection.settings_dict
+    saved = {name: settings_dict.get(name) for name in ('CONN_MAX_AGE', 'POOL')}
+    results = {}
+    try:
+        for mode in modes:
+            settings_dict.update({**saved, **CONNECTION_MODES[mode]})
+            # the next connection picks the mode's settings up
+            connection.close()
+            result = results[mode] = OperationResult(mode)
+            for _ in range(iterations):
+                variables = sampler.variables(variable_names)
+                get_query_cache().backend.clear()
+                # CaptureQueriesContext would open the connection before the request
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    request_started.send(sender=__name__)
+                    try:
+                        execution = schema.execute(
+                            query, variable_values=variables, context_value=request_factory.post('/graphql/')
+                        )
+                    finally:
+                        request_finished.send(sender=__name__)
+                    elapsed = time.perf_counter() - started
+                result.timings.append(elapsed)
+                result.queries.append(counter.count)
+                if execution.errors:
+                    result.errors += 1
+    finally:
+        settings_dict.update(saved)
+        connection.close()
+    return results
@@ -0,0 +1,174 @@
+"""
+Bulk task and comment writes used by the bulk mutations.
+
+Each operation is scoped to one organization: parents are checked for
+ownership with a single query, items are validated one by one (invalid items
+are reported by their index and skipped) and the valid ones are written with
+bulk_create / bulk_update in a single transaction.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import activity, counters, subscriptions
+from .cache import get_query_cache
+from .models import Projects, Tasks, TaskComment
+
+BATCH_SIZE = 500
+MAX_ITEMS = 5000
+
+# UpdateTaskInput field -> applied when the value is truthy / not None (same rules as UpdateTask)
+TASK_UPDATE_FIELDS = (
+    ('title', bool),
+    ('description', lambda value: value is not None),
+    ('status', bool),
+    ('assignee_email', lambda value: value is not None),
+    ('due_date', lambda value: value is not None),
+)
+
+
+class BulkLimitError(Exception):
+    pass
+
+
+def _check_limit(items):
+    if len(items) > MAX_ITEMS:
+        raise BulkLimitError(f"At most {MAX_ITEMS} items per bulk mutation")
+
+
+def validation_messages(error):
+    if hasattr(error, 'message_dict'):
+        return [f"{field}: {message}" for field, messages in error.message_dict.items() for message in messages]
+    return list(error.messages)
+
+
+def _validate(instance, exclude, index, item_errors):
+    try:
+        # uniqueness is left to the database, it would cost one query per item
+        instance.full_clean(exclude=exclude, validate_unique=False)
+    except ValidationError as error:
+        item_errors.append((index, validation_messages(error)))
+        return False
+    return True
+
+
+def create_tasks(organization_id, items, actor=''):
+    """
+    return (created tasks, [(index, messages), ...])
+    """
+    _check_limit(items)
+    projects = Projects.objects.filter(
+        organization_id=organization_id, id__in={item.project_id for item in items}
+    ).only('id', 'name', 'organization_id').in_bulk()
+
+    tasks, item_errors = [], []
+    for index, item in enumerate(items):
+        project = projects.get(item.project_id)
+        if project is None:
+            item_errors.append((index, ["Project not found"]))
+            continue
+        task = Tasks(
+            project=project,
+            organization_id=organization_id,
+            title=item.title,
+            description=item.get('description') or '',
+            assignee_email=item.get('assignee_email') or '',
+            due_date=item.get('due_date'),
+        )
+        if _validate(task, ['project', 'slug'], index, item_errors):
+            tasks.append(task)
+
+    if tasks:
+        with transaction.atomic():
+            Tasks.objects.bulk_create(tasks, batch_size=BATCH_SIZE)
+            counters.tasks_created(tasks, organization_id)
+            get_query_cache().invalidate_on_commit(organization_id)
+            subscriptions.tasks_created(tasks, organization_id)
+            activity.tasks_created(tasks, organization_id, actor)
+    return tasks, item_errors
+
+
+def update_tasks(organization_id, items, actor=''):
+    """
+    return (updated tasks, [(index, messages), ...])
+    """
+    _check_limit(items)
+    with transaction.atomic():
+        tasks = (
+            Tasks.objects.select_for_update(of=('self',))
+            .filter(organization_id=organization_id, id__in={item.id for item in items})
+            .in_bulk()
+        )
+        old_statuses = {pk: task.status for pk, task in tasks.items()}
+
+        updated, changed_fields, item_errors = {}, set(), []
+        task_changes = defaultdict(set)
+        snapshots = {}
+        for index, item in enumerate(items):
+            task = tasks.get(item.id)
+            if task is None:
+                item_errors.append((index, ["Task not found"]))
+                continue
+            previous = {field: getattr(task, field) for field, _ in TASK_UPDATE_FIELDS}
+            changes = {
+                field: item.get(field) for field, applies in TASK_UPDATE_FIELDS if applies(item.get(field))
+            }
+            for field, value in changes.items():
+                setattr(task, field, value)
+            if not _validate(task, ['project', 'slug'], index, item_errors):
+                # leave the task as it was, an earlier valid item may still apply
+                for field, value in previous.items():
+                    setattr(task, field, value)
+                continue
+            changed_fields.update(changes)
+            task_changes[task.pk].update(field for field in changes if getattr(task, field) != previous[field])
+            # state before the first item on the task
+            snapshots.setdefault(task.pk, previous)
+            updated[task.pk] = task
+
+        if updated and changed_fields:
+            # bulk_update skips pre_save(), so auto_now has to be applied by hand
+            now = timezone.now()
+            for task in updated.values():
+                task.updated_at = now
+            Tasks.objects.bulk_update(updated.values(), [*changed_fields, 'updated_at'], batch_size=BATCH_SIZE)
+            counters.task_statuses_changed(
+                [(task, old_statuses[pk]) for pk, task in updated.items()], organization_id
+            )
+            get_query_cache().invalidate_on_commit(organization_id)
+            subscriptions.tasks_updated([(task, task_changes[pk]) for pk, task in updated.items()], organization_id)
+            activity.tasks_updated([(task, snapshots[pk]) for pk, task in updated.items()], organization_id, actor)
+    return list(updated.values()), item_errors
+
+
+def create_task_comments(organization_id, items, actor=''):
+    """
+    return (created comments, [(index, messages), ...])
+    """
+    _check_limit(items)
+    project_ids = dict(
+        Tasks.objects.filter(
+            organization_id=organization_id, id__in={item.task_id for item in items}
+        ).values_list('id', 'project_id')
+    )
+
+    comments, item_errors = [], []
+    for index, item in enumerate(items):
+        if item.task_id not in project_ids:
+            item_errors.append((index, ["Task not found"]))
+            continue
+        comment = TaskComment(
+            task_id=item.task_id, organization_id=organization_id, content=item.content, author_email=item.author_email
+        )
+        if _validate(comment, ['task'], index, item_errors):
+            comments.append(comment)
+
+    if comments:
+        with transaction.atomic():
+            TaskComment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+            get_query_cache().invalidate_on_commit(organization_id)
+            subscriptions.comments_created(comments, project_ids, organization_id)
+            activity.comments_created(comments, organization_id, actor)
+    return comments, item_errors
@@ -0,0 +1,364 @@
+"""
+Streaming bulk import of tasks and comments into one organization.
+
+Records are read one line at a time from NDJSON (a `type` of tasks or
+comments per line) or CSV (one kind per file) and handled in chunks:
+project and task references of a chunk are resolved with one query per kind,
+every record is validated like the bulk mutations (rejected records are
+reported by their number and skipped) and the valid ones are written in one
+transaction per chunk, through COPY on PostgreSQL (CopyWriter) and
+bulk_create elsewhere (BulkCreateWriter).
+
+Each committed chunk advances ImportJob.records_committed, so a failed
+import is resumed with the same input and job: the committed records are
+skipped. Tasks may carry a `ref` (their id in the source tool) that comments
+reference with `task_ref`, ImportedTask keeps them for later chunks and runs.
+"""
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import counters
+from .bulk import BATCH_SIZE, _validate
+from .cache import get_query_cache
+from .models import ImportedTask, ImportJob, Projects, Tasks, TaskComment
+
+KINDS = ('tasks', 'comments')
+FORMATS = ('ndjson', 'csv')
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFailed(Exception):
+
+    def __init__(self, job):
+        super().__init__(job.last_error)
+        self.job = job
+
+
+def import_settings():
+    options = getattr(settings, 'IMPORT', {})
+    return {
+        'CHUNK_SIZE': options.get('CHUNK_SIZE', 5000),
+        'TOKEN': options.get('TOKEN', ''),
+    }
+
+
+def read_records(lines, format='ndjson', kind=''):
+    """
+    yield (record number, record dict, error message) of every record of lines,
+    numbers start at 1 and skip blank ndjson lines and the csv header
+    """
+    if format == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, {'type': kind, **row}, None
+        return
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        record.setdefault('type', kind)
+        yield number, record, None
+
+
+def _int(record, field):
+    value = record.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: expected an integer, got {value!r}")
+
+
+def _copy_text(value):
+    # PostgreSQL COPY text format
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class BulkCreateWriter:
+    """
+    bulk_create(), for databases without COPY
+    """
+
+    def write(self, model, instances):
+        model.objects.bulk_create(instances, batch_size=BATCH_SIZE)
+
+
+class CopyWriter:
+    """
+    COPY ... FROM STDIN; primary keys are drawn from the table's sequence
+    first so that the rows can be referenced (counters, refs, comments)
+    """
+
+    def write(self, model, instances):
+        meta = model._meta
+        fields = meta.concrete_fields
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [meta.db_table, meta.pk.column, len(instances)],
+            )
+            for instance, (pk,) in zip(instances, cursor.fetchall()):
+                instance.pk = pk
+
+            data = io.StringIO()
+            for instance in instances:
+                # pre_save() fills auto_now(_add) timestamps and slugs, as an INSERT would
+                data.write('\t'.join(
+                    _copy_text(field.get_db_prep_save(field.pre_save(instance, True), connection))
+                    for field in fields
+                ) + '\n')
+                instance._state.adding = False
+                instance._state.db = connection.alias
+            data.seek(0)
+
+            columns = ', '.join(quote_name(field.column) for field in fields)
+            sql = f'COPY {quote_name(meta.db_table)} ({columns}) FROM STDIN'
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.cursor.copy_expert(sql, data)
+            else:
+                # psycopg 3
+                with cursor.cursor.copy(sql) as copy:
+                    copy.write(data.getvalue())
+
+
+def get_writer():
+    if connection.vendor == 'postgresql':
+        return CopyWriter()
+    return BulkCreateWriter()
+
+
+def start_import(organization, format='ndjson', kind='', source=''):
+    """
+    validate the options and create the job of a new import
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown import format {format}, expected one of {', '.join(FORMATS)}")
+    if kind and kind not in KINDS:
+        raise ValueError(f"Unknown import kind {kind}, expected one of {', '.join(KINDS)}")
+    if format == 'csv' and not kind:
+        raise ValueError(f"A csv import holds one kind, pick one of {', '.join(KINDS)}")
+    return ImportJob.objects.create(organization=organization, format=format, kind=kind, source=source[:255])
+
+
+def resume_import(job_id, organization_id):
+    job = ImportJob.objects.filter(pk=job_id, organization_id=organization_id).first()
+    if job is None:
+        raise ValueError(f"Import {job_id} of organization {organization_id} does not exist")
+    if job.status == 'COMPLETED':
+        raise ValueError(f"Import {job_id} is already completed")
+    job.status = 'RUNNING'
+    job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+class Importer:
+    """
+    runs (or resumes) one ImportJob over an iterable of input lines
+    """
+
+    def __init__(self, job, writer=None, chunk_size=None, on_chunk=None):
+        self.job = job
+        self.organization_id = job.organization_id
+        self.writer = writer or get_writer()
+        self.chunk_size = chunk_size or import_settings()['CHUNK_SIZE']
+        self.on_chunk = on_chunk
+        self.records = 0  # processed by this run
+        self.started = time.monotonic()
+
+    @property
+    def records_per_second(self):
+        return self.records / max(time.monotonic() - self.started, 1e-9)
+
+    def run(self, lines):
+        job = self.job
+        records = (
+            item for item in read_records(lines, job.format, job.kind)
+            if item[0] > job.records_committed
+        )
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            try:
+                self._import_chunk(chunk)
+            except Exception as e:
+                # drop the in-memory counts of the rolled back chunk
+                job.refresh_from_db()
+                job.status = 'FAILED'
+                job.last_error = f"record {chunk[0][0]}-{chunk[-1][0]}: {type(e).__name__}: {e}"
+                job.save(update_fields=['status', 'last_error', 'updated_at'])
+                raise ImportFailed(job) from e
+            self.records += len(chunk)
+            if self.on_chunk is not None:
+                self.on_chunk(self)
+        job.status = 'COMPLETED'
+        job.last_error = ''
+        job.save(update_fields=['status', 'last_error', 'updated_at'])
+        return job
+
+    def _import_chunk(self, chunk):
+        errors, task_items, comment_items = [], [], []
+        for number, record, error in chunk:
+            if error:
+                errors.append((number, [error]))
+            elif record.get('type') == 'tasks':
+                task_items.append((number, record))
+            elif record.get('type') == 'comments':
+                comment_items.append((number, record))
+            else:
+                errors.append((number, [f"Unknown record type {record.get('type')!r}, expected tasks or comments"]))
+
+        tasks, refs = self._build_tasks(task_items, errors)
+        with transaction.atomic():
+            if tasks:
+                self.writer.write(Tasks, tasks)
+                counters.tasks_created(tasks, self.organization_id)
+                if refs:
+                    self.writer.write(ImportedTask, [
+                        ImportedTask(job_id=self.job.pk, ref=ref, task_id=task.pk) for ref, task in refs.items()
+                    ])
+            comments = self._build_comments(comment_items, errors, {ref: task.pk for ref, task in refs.items()})
+            if comments:
+                self.writer.write(TaskComment, comments)
+            if tasks or comments:
+                get_query_cache().invalidate_on_commit(self.organization_id)
+
+            job = self.job
+            errors.sort()
+            job.records_committed = chunk[-1][0]
+            job.tasks_created += len(tasks)
+            job.comments_created += len(comments)
+            job.rejected += len(errors)
+            job.errors.extend([number, messages] for number, messages in errors[:MAX_REPORTED_ERRORS - len(job.errors)])
+            job.save(update_fields=[
+                'records_committed', 'tasks_created', 'comments_created', 'rejected', 'errors', 'updated_at',
+            ])
+
+    def _build_tasks(self, items, errors):
+        """
+        return (valid unsaved tasks, ref -> task)
+        """
+        references = []
+        for number, record in items:
+            try:
+                references.append((number, record, _int(record, 'project_id')))
+            except ValueError as e:
+                errors.append((number, [str(e)]))
+
+        project_ids = set(Projects.objects.filter(
+            organization_id=self.organization_id,
+            id__in={project_id for _, _, project_id in references if project_id is not None},
+        ).values_list('id', flat=True))
+        projects_by_name = dict(Projects.objects.filter(
+            organization_id=self.organization_id,
+            name__in={record.get('project') for _, record, project_id in references if project_id is None},
+        ).values_list('name', 'id'))
+        given_refs = {str(record['ref']) for _, record, _ in references if record.get('ref') not in (None, '')}
+        known_refs = set(ImportedTask.objects.filter(job=self.job, ref__in=given_refs).values_list('ref', flat=True))
+
+        tasks, refs = [], {}
+        for number, record, project_id in references:
+            if project_id is None:
+                project_id = projects_by_name.get(record.get('project'))
+            elif project_id not in project_ids:
+                project_id = None
+            if project_id is None:
+                errors.append((number, ["Project not found"]))
+                continue
+            ref = record.get('ref')
+            ref = None if ref in (None, '') else str(ref)
+            if ref is not None and (ref in known_refs or ref in refs):
+                errors.append((number, [f"Duplicate task ref {ref}"]))
+                continue
+            task = Tasks(
+                project_id=project_id,
+                organization_id=self.organization_id,
+                title=record.get('title') or '',
+                description=record.get('description') or '',
+                status=record.get('status') or 'TODO',
+                assignee_email=record.get('assignee_email') or '',
+                due_date=record.get('due_date') or None,
+            )
+            if _validate(task, ['project', 'slug'], number, errors):
+                tasks.append(task)
+                if ref is not None:
+                    refs[ref] = task
+        return tasks, refs
+
+    def _build_comments(self, items, errors, chunk_refs):
+        references = []
+        for number, record in items:
+            try:
+                references.append((number, record, _int(record, 'task_id')))
+            except ValueError as e:
+                errors.append((number, [str(e)]))
+
+        task_ids = set(Tasks.objects.filter(
+            organization_id=self.organization_id,
+            id__in={task_id for _, _, task_id in references if task_id is not None},
+        ).values_list('id', flat=True))
+        wanted_refs = {
+            str(record.get('task_ref')) for _, record, task_id in references
+            if task_id is None and record.get('task_ref') not in (None, '')
+        }
+        tasks_by_ref = dict(ImportedTask.objects.filter(
+            job=self.job, ref__in=wanted_refs - chunk_refs.keys()
+        ).values_list('ref', 'task_id'))
+        tasks_by_ref.update(chunk_refs)
+
+        comments = []
+        for number, record, task_id in references:
+            if task_id is None:
+                task_id = tasks_by_ref.get(str(record.get('task_ref')))
+            elif task_id not in task_ids:
+                task_id = None
+            if task_id is None:
+                errors.append((number, ["Task not found"]))
+                continue
+            comment = TaskComment(
+                task_id=task_id,
+                organization_id=self.organization_id,
+                content=record.get('content') or '',
+                author_email=record.get('author_email') or '',
+            )
+            if _validate(comment, ['task'], number, errors):
+                comments.append(comment)
+        return comments
+
+
+def job_report(job, importer=None):
+    """
+    json-able summary of a job, with the throughput of the current run
+    """
+    report = {
+        'job': job.pk,
+        'status': job.status,
+        'records_committed': job.records_committed,
+        'tasks_created': job.tasks_created,
+        'comments_created': job.comments_created,
+        'rejected': job.rejected,
+        'errors': job.errors,
+        'last_error': job.last_error,
+    }
+    if importer is not None:
+        report['records_this_run'] = importer.records
+        report['records_per_second'] = round(importer.records_per_second, 1)
+    return report
@@ -0,0 +1,278 @@
+"""
+Tenant scoped cache for Query resolver results.
+
+Keys are built from the organization, the resolver name and its arguments,
+plus a per-organization generation number. A mutation bumps the generation of
+its own organization only, which orphans that tenant's entries (left to LRU /
+TTL eviction) without touching any other tenant's.
+
+Results computed on a read replica (see core/routers.py) are not stored for
+a scope invalidated less than the replication lag bound ago: the replica may
+not have the write yet, and the stale result would outlive the lag under the
+new generation.
+
+The storage backend is pluggable through settings.GRAPHQL_CACHE:
+LocalMemoryBackend (per process LRU + TTL) or DjangoCacheBackend (any
+django.core.cache alias, e.g. Redis shared by every worker).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Organizations, Projects, tasks_with_owner
+from .routers import reading_from_replica, routing_settings
+
+GLOBAL_SCOPE = 'global'
+_MISSING = object()
+
+
+class LocalMemoryBackend:
+    """
+    Thread safe in-process LRU cache with per entry expiry
+    """
+
+    def __init__(self, timeout=60, max_entries=10000, **options):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires is not None and expires <= now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping, timeout=_MISSING):
+        timeout = self.timeout if timeout is _MISSING else timeout
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key, initial):
+        with self._lock:
+            expires, value = self._data.get(key, (None, initial))
+            self._data[key] = (None, value + 1)
+            self._data.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Adapter over a django.core.cache alias (LocMemCache, RedisCache, ...)
+    """
+
+    def __init__(self, timeout=60, alias='default', **options):
+        self.timeout = timeout
+        self.cache = caches[alias]
+
+    def get_many(self, keys):
+        return self.cache.get_many(list(keys))
+
+    def set_many(self, mapping, timeout=_MISSING):
+        self.cache.set_many(mapping, timeout=self.timeout if timeout is _MISSING else timeout)
+
+    def incr(self, key, initial):
+        self.cache.add(key, initial, timeout=None)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # evicted between add() and incr()
+            self.cache.set(key, initial + 1, timeout=None)
+            return initial + 1
+
+    def clear(self):
+        self.cache.clear()
+
+
+def _digest(resolver, arguments):
+    raw = repr((resolver, sorted(arguments.items())))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+class QueryCache:
+
+    def __init__(self, backend, prefix='gql'):
+        self.backend = backend
+        self.prefix = prefix
+
+    def _generation_key(self, scope):
+        return f'{self.prefix}:gen:{scope}'
+
+    def _generations(self, scopes):
+        keys = {scope: self._generation_key(scope) for scope in scopes}
+        found = self.backend.get_many(keys.values())
+        generations = {scope: found.get(key) for scope, key in keys.items()}
+        missing = {keys[scope]: time.time_ns() for scope, generation in generations.items() if generation is None}
+        if missing:
+            # never restart from a number an evicted generation may have used
+            self.backend.set_many(missing, timeout=None)
+            generations.update({scope: missing[keys[scope]] for scope in generations if keys[scope] in missing})
+        return generations
+
+    def _key(self, scope, generation, resolver, arguments):
+        return f'{self.prefix}:{scope}:{generation}:{resolver}:{_digest(resolver, arguments)}'
+
+    def fetch(self, scope, resolver, arguments, compute):
+        """
+        cached compute() result for resolver(**arguments) within the scope,
+        no caching without a scope (unknown owner)
+        """
+        if scope is None:
+            return compute()
+        key = self._key(scope, self._generations([scope])[scope], resolver, arguments)
+        value = self.backend.get_many([key]).get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            if self._storable([scope]):
+                self.backend.set_many({key: value})
+        return value
+
+    async def afetch(self, scope, resolver, arguments, compute):
+        """
+        fetch() for async resolvers, compute is a coroutine function;
+        backend calls stay synchronous (in-process memory or a single redis round trip)
+        """
+        if scope is None:
+            return await compute()
+        key = self._key(scope, self._generations([scope])[scope], resolver, arguments)
+        value = self.backend.get_many([key]).get(key, _MISSING)
+        if value is _MISSING:
+            value = await compute()
+            if self._storable([scope]):
+                self.backend.set_many({key: value})
+        return value
+
+    def fetch_many(self, resolver, arguments_by_scope, compute_missing):
+        """
+        {scope: value} for every scope, compute_missing(scopes) is called once
+        with the scopes that missed and must return {scope: value}
+        """
+        generations = self._generations(arguments_by_scope)
+        keys = {
+            scope: self._key(scope, generations[scope], resolver, arguments)
+            for scope, arguments in arguments_by_scope.items()
+        }
+        found = self.backend.get_many(keys.values())
+        results = {scope: found[key] for scope, key in keys.items() if key in found}
+        missing = [scope for scope in keys if scope not in results]
+        if missing:
+            computed = compute_missing(missing)
+            storable = self._storable(missing)
+            self.backend.set_many({keys[scope]: computed[scope] for scope in missing if scope in storable})
+            results.update(computed)
+        return results
+
+    def _invalidated_key(self, scope):
+        return f'{self.prefix}:invalidated:{scope}'
+
+    def _storable(self, scopes):
+        """
+        scopes whose freshly computed results may be stored
+        """
+        if not reading_from_replica():
+            return set(scopes)
+        keys = {scope: self._invalidated_key(scope) for scope in scopes}
+        recent = self.backend.get_many(keys.values())
+        return {scope for scope, key in keys.items() if key not in recent}
+
+    def invalidate(self, scope):
+        self.backend.incr(self._generation_key(scope), time.time_ns())
+        routing = routing_settings()
+        if routing['REPLICAS'] or routing['TENANT_DATABASES']:
+            self.backend.set_many({self._invalidated_key(scope): True}, timeout=routing['STICKY_SECONDS'])
+
+    def invalidate_on_commit(self, scope):
+        # readers must not cache pre-commit data under the new generation
+        transaction.on_commit(lambda: self.invalidate(scope))
+
+    def _owners(self, kind, pks, queryset, field):
+        """
+        pk -> organization id of the objects of kind among pks, one query for the ones not cached yet;
+        pks that do not exist are left out
+        """
+        # owners never change (no mutation moves a project or a task), cache them without expiry
+        keys = {pk: f'{self.prefix}:owner:{kind}:{pk}' for pk in set(pks)}
+        cached = self.backend.get_many(keys.values())
+        owners = {pk: cached[key] for pk, key in keys.items() if key in cached}
+        missing = keys.keys() - owners.keys()
+        if missing:
+            found = {
+                pk: organization_id
+                for pk, organization_id in queryset.filter(pk__in=missing).values_list('pk', field)
+                if organization_id is not None
+            }
+            if found:
+                self.backend.set_many({keys[pk]: found[pk] for pk in found}, timeout=None)
+            owners.update(found)
+        return owners
+
+    def _owner(self, kind, pk, queryset, field):
+        return self._owners(kind, [pk], queryset, field).get(pk)
+
+    async def _aowner(self, kind, pk, queryset, field):
+        key = f'{self.prefix}:owner:{kind}:{pk}'
+        organization_id = self.backend.get_many([key]).get(key)
+        if organization_id is None:
+            organization_id = await queryset.filter(pk=pk).values_list(field, flat=True).afirst()
+            if organization_id is not None:
+                self.backend.set_many({key: organization_id}, timeout=None)
+        return organization_id
+
+    def organization_of_project(self, project_id):
+        return self._owner('project', project_id, Projects.objects.all(), 'organization_id')
+
+    def organization_of_task(self, task_id):
+        return self._owner('task', task_id, tasks_with_owner(), 'owner')
+
+    def existing_organizations(self, organization_ids):
+        return set(self._owners('organization', organization_ids, Organizations.objects.all(), 'pk'))
+
+    def organizations_of_projects(self, project_ids):
+        return self._owners('project', project_ids, Projects.objects.all(), 'organization_id')
+
+    def organizations_of_tasks(self, task_ids):
+        return self._owners('task', task_ids, tasks_with_owner(), 'owner')
+
+    async def aorganization_of_project(self, project_id):
+        return await self._aowner('project', project_id, Projects.objects.all(), 'organization_id')
+
+    async def aorganization_of_task(self, task_id):
+        return await self._aowner('task', task_id, tasks_with_owner(), 'owner')
+
+
+_query_cache = None
+
+
+def get_query_cache():
+    global _query_cache
+    if _query_cache is None:
+        options = dict(getattr(settings, 'GRAPHQL_CACHE', {}))
+        backend_class = import_string(options.pop('BACKEND', 'core.cache.LocalMemoryBackend'))
+        backend = backend_class(**{name.lower(): value for name, value in options.items()})
+        _query_cache = QueryCache(backend)
+    return _query_cache
@@ -0,0 +1,350 @@
+"""
+Static cost analysis and per-tenant cost budgets for GraphQL operations.
+
+Before execution the view computes the cost of the operation from its
+document and variables: every field costs its weight (FIELD_WEIGHTS, objects
+default to 1 and scalars to 0) and the selections under a list are multiplied
+by its expected size (`first`/`last` for connections, the length of a list
+argument, or LIST_SIZES for unbounded lists). Operations deeper than
+MAX_DEPTH, costlier than MAX_COST or naming more than MAX_TARGETS distinct
+organizations, projects and tasks are rejected outright, before any owner
+is looked up.
+
+The cost is then charged to every organization the operation targets (read
+from its arguments, the owners of the named projects and tasks resolved
+with one query per kind) within a fixed window, and to GLOBAL_SCOPE when it
+selects a root field naming no organization or names ids that do not
+exist; an organization that has spent its budget is throttled until the
+window ends, while other tenants are unaffected.
+Window totals live in a django cache alias, shared by every worker with redis.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import (
+    FieldNode, FragmentSpreadNode, GraphQLError, GraphQLList, InlineFragmentNode, get_named_type,
+    get_nullable_type, value_from_ast_untyped,
+)
+
+from .cache import GLOBAL_SCOPE, get_query_cache
+from .loaders import COMMENTS_PER_TASK, TASKS_PER_PROJECT
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# "Type.field" -> cost of resolving the field once
+FIELD_WEIGHTS = {
+    'ProjectType.taskCount': 2,
+    'ProjectType.completedTasksCount': 2,
+    'ProjectType.completionRate': 2,
+    'ProjectType.tasks': 2,
+    'TaskType.comments': 2,
+    'Query.search': 5,
+    'Query.projectStats': 5,
+    'Query.organizationsProjectStats': 5,
+    'Query.changesSince': 5,
+    'Mutation.createProject': 10,
+    'Mutation.updateProject': 10,
+    'Mutation.createTask': 10,
+    'Mutation.updateTask': 10,
+    'Mutation.createTaskComment': 10,
+    'Mutation.bulkCreateTasks': 10,
+    'Mutation.bulkUpdateTasks': 10,
+    'Mutation.bulkCreateTaskComments': 10,
+}
+
+# expected length of lists that are neither connections nor sized by an argument
+LIST_SIZES = {
+    'Query.organizations': 100,
+    # nested lists are capped by their loaders
+    'ProjectType.tasks': TASKS_PER_PROJECT,
+    'TaskType.comments': COMMENTS_PER_TASK,
+    # a changesSince page holds PAGE_SIZE changes of every kind together
+    'ChangesType.projects': 50,
+    'ChangesType.tasks': 50,
+    'ChangesType.comments': 50,
+    'ChangesType.deleted': 50,
+}
+
+# list fields whose length is the length of one of their arguments
+LIST_ARGUMENTS = {
+    'Query.organizationsProjectStats': 'organizationIds',
+    'Mutation.bulkCreateTasks': 'tasks',
+    'Mutation.bulkUpdateTasks': 'tasks',
+    'Mutation.bulkCreateTaskComments': 'comments',
+}
+
+# arguments (at any depth of an input object) naming the organization, project or task an operation targets
+TENANT_ARGUMENTS = {
+    'organizationId': 'organization',
+    'organizationIds': 'organization',
+    'projectId': 'project',
+    'taskId': 'task',
+}
+
+# fields whose `id` argument (or input.id) targets an object of that kind
+ID_ARGUMENTS = {
+    'Query.organization': 'organization',
+    'Query.project': 'project',
+    'Query.task': 'task',
+    'Mutation.updateProject': 'project',
+    'Mutation.updateTask': 'task',
+}
+
+
+def complexity_settings():
+    options = getattr(settings, 'GRAPHQL_COMPLEXITY', {})
+    return {
+        'ENABLED': options.get('ENABLED', True),
+        'MAX_DEPTH': options.get('MAX_DEPTH', 10),
+        'MAX_COST': options.get('MAX_COST', 20000),
+        'MAX_TARGETS': options.get('MAX_TARGETS', 1000),
+        'BUDGET': options.get('BUDGET', 100000),
+        'TENANT_BUDGETS': options.get('TENANT_BUDGETS', {}),
+        'WINDOW': options.get('WINDOW', 60),
+        'CACHE_ALIAS': options.get('CACHE_ALIAS', 'default'),
+    }
+
+
+def complexity_error(message, code, **extensions):
+    return GraphQLError(message, extensions={'code': code, **extensions})
+
+
+class OperationAnalysis:
+    """
+    cost, depth and targeted objects of one operation, computed from its AST
+    """
+
+    def __init__(self, schema, document, operation, variables=None):
+        self.schema = schema
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions if definition.kind == 'fragment_definition'
+        }
+        self.variables = variables or {}
+        self.targets = set()  # (kind, id)
+        self.unscoped = False  # a root field names no target
+        self.unresolved = False  # a target does not exist
+        self.depth = 0
+        self._organizations = None
+        root_type = schema.get_root_type(operation.operation)
+        self.cost = self._selection_set_cost(root_type, operation.selection_set, 1)
+
+    def _fields(self, parent_type, selection_set, visited=()):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition is not None:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value)
+                yield from self._fields(fragment_type, selection.selection_set, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self._fields(fragment_type, fragment.selection_set, (*visited, name))
+
+    def _arguments(self, node):
+        return {
+            argument.name.value: value_from_ast_untyped(argument.value, self.variables)
+            for argument in node.arguments
+        }
+
+    def _collect_targets(self, key, arguments):
+        """
+        add the targets named by arguments, return whether there are any
+        """
+        found = []
+
+        def walk(value, id_kind=None):
+            if isinstance(value, dict):
+                for name, item in value.items():
+                    if name in TENANT_ARGUMENTS:
+                        walk_ids(TENANT_ARGUMENTS[name], item)
+                    elif name == 'id' and id_kind:
+                        walk_ids(id_kind, item)
+                    else:
+                        walk(item, id_kind)
+            elif isinstance(value, list):
+                for item in value:
+                    walk(item, id_kind)
+
+        def walk_ids(kind, value):
+            for pk in value if isinstance(value, list) else [value]:
+                if isinstance(pk, int):
+                    found.append((kind, pk))
+
+        walk(arguments, ID_ARGUMENTS.get(key))
+        self.targets.update(found)
+        return bool(found)
+
+    def _list_size(self, parent_type, key, field_type, arguments, item_count):
+        if parent_type.name.endswith('Connection'):
+            # the page size was applied by the connection field
+            return 1
+        if key in LIST_ARGUMENTS:
+            items = arguments.get(LIST_ARGUMENTS[key])
+            return len(items) if isinstance(items, list) else 1
+        if getattr(get_named_type(field_type), 'name', '').endswith('Connection'):
+            size = arguments.get('first') if arguments.get('first') is not None else arguments.get('last')
+            if not isinstance(size, int):
+                return DEFAULT_PAGE_SIZE
+            return max(0, min(size, MAX_PAGE_SIZE))
+        if isinstance(get_nullable_type(field_type), GraphQLList):
+            return item_count or LIST_SIZES.get(key, DEFAULT_PAGE_SIZE)
+        return 1
+
+    def _selection_set_cost(self, parent_type, selection_set, depth, item_count=None):
+        """
+        item_count: number of input items of a bulk mutation, the length of the lists of its payload
+        """
+        self.depth = max(self.depth, depth)
+        cost = 0
+        for field_parent, node in self._fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith('__'):
+                continue
+            field = field_parent.fields.get(name)
+            if field is None:
+                continue
+            key = f'{field_parent.name}.{name}'
+            arguments = self._arguments(node)
+            if not self._collect_targets(key, arguments) and depth == 1:
+                self.unscoped = True
+            if node.selection_set is None:
+                cost += FIELD_WEIGHTS.get(key, 0)
+                continue
+            size = self._list_size(field_parent, key, field.type, arguments, item_count)
+            field_type = get_named_type(field.type)
+            if key in LIST_ARGUMENTS and not isinstance(get_nullable_type(field.type), GraphQLList):
+                # bulk mutation: one unit per item, its payload lists hold one entry per item
+                cost += FIELD_WEIGHTS.get(key, 1) + size + self._selection_set_cost(
+                    field_type, node.selection_set, depth + 1, size
+                )
+                continue
+            cost += FIELD_WEIGHTS.get(key, 1) + size * self._selection_set_cost(
+                field_type, node.selection_set, depth + 1
+            )
+        return cost
+
+    def organizations(self):
+        """
+        existing organization ids targeted by the operation, project and task owners come from the query cache
+        """
+        if self._organizations is None:
+            query_cache = get_query_cache()
+            owners = {
+                'organization': lambda pks: {pk: pk for pk in query_cache.existing_organizations(pks)},
+                'project': query_cache.organizations_of_projects,
+                'task': query_cache.organizations_of_tasks,
+            }
+            organizations = set()
+            for kind, organizations_of in owners.items():
+                pks = {pk for target_kind, pk in self.targets if target_kind == kind}
+                if pks:
+                    found = organizations_of(pks)
+                    self.unresolved = self.unresolved or len(found) < len(pks)
+                    organizations.update(found.values())
+            self._organizations = organizations
+        return self._organizations
+
+    def scopes(self):
+        """
+        scopes the operation is admitted and charged against: the organizations it targets,
+        plus GLOBAL_SCOPE for root fields naming no organization and for ids that do not exist
+        """
+        organizations = self.organizations()
+        if self.unscoped or self.unresolved or not organizations:
+            return organizations | {GLOBAL_SCOPE}
+        return organizations
+
+
+class CostBudget:
+    """
+    fixed window cost counters per organization
+    """
+
+    def __init__(self, budget, tenant_budgets=None, window=60, cache_alias='default'):
+        self.budget = budget
+        self.tenant_budgets = {str(scope): value for scope, value in (tenant_budgets or {}).items()}
+        self.window = window
+        self.cache_alias = cache_alias
+
+    @property
+    def store(self):
+        return caches[self.cache_alias]
+
+    def budget_of(self, scope):
+        return self.tenant_budgets.get(str(scope), self.budget)
+
+    def charge(self, scopes, cost):
+        """
+        charge cost to every scope or to none of them,
+        raise GraphQLError when a scope would exceed its budget for the current window
+        """
+        now = time.time()
+        window_start = int(now // self.window) * self.window
+        charged = []
+        try:
+            for scope in sorted(scopes, key=str):
+                key = f'gqlcost:{scope}:{window_start}'
+                self.store.add(key, 0, timeout=self.window + 1)
+                try:
+                    spent = self.store.incr(key, cost)
+                except ValueError:
+                    # expired between add() and incr()
+                    self.store.set(key, cost, timeout=self.window + 1)
+                    spent = cost
+                charged.append(key)
+                if spent > self.budget_of(scope):
+                    raise complexity_error(
+                        f"Cost budget of organization {scope} exceeded, retry in {window_start + self.window - now:.0f}s",
+                        'COST_BUDGET_EXCEEDED',
+                        cost=cost, budget=self.budget_of(scope), retry_after=round(window_start + self.window - now, 3),
+                    )
+        except GraphQLError:
+            for key in charged:
+                try:
+                    self.store.decr(key, cost)
+                except ValueError:
+                    pass
+            raise
+
+
+def check_limits(analysis):
+    """
+    raise GraphQLError when the operation is too deep, too costly or names too many objects,
+    checked before its targets are resolved
+    """
+    options = complexity_settings()
+    if analysis.depth > options['MAX_DEPTH']:
+        raise complexity_error(
+            f"Query depth {analysis.depth} exceeds the maximum of {options['MAX_DEPTH']}", 'QUERY_TOO_DEEP',
+            depth=analysis.depth,
+        )
+    if analysis.cost > options['MAX_COST']:
+        raise complexity_error(
+            f"Query cost {analysis.cost} exceeds the maximum of {options['MAX_COST']}", 'QUERY_TOO_COMPLEX',
+            cost=analysis.cost,
+        )
+    if len(analysis.targets) > options['MAX_TARGETS']:
+        raise complexity_error(
+            f"Operation names {len(analysis.targets)} organizations, projects and tasks, "
+            f"the maximum is {options['MAX_TARGETS']}", 'TOO_MANY_TARGETS',
+            targets=len(analysis.targets),
+        )
+
+
+def check_operation(schema, document, operation, variables=None, analysis=None):
+    """
+    analyze the operation (unless given its analysis), check its limits and charge its cost,
+    raise GraphQLError when it is rejected; return the analysis
+    """
+    options = complexity_settings()
+    analysis = analysis or OperationAnalysis(schema, document, operation, variables)
+    check_limits(analysis)
+    budget = CostBudget(options['BUDGET'], options['TENANT_BUDGETS'], options['WINDOW'], options['CACHE_ALIAS'])
+    budget.charge(analysis.scopes(), analysis.cost)
+    return analysis
@@ -0,0 +1,258 @@
+"""
+Maintenance of the denormalized ProjectCounters / OrganizationCounters rows.
+
+Mutations call the *_created / *_changed hooks inside their transaction,
+the counters are bumped with F() expressions so concurrent writers never
+lose an increment. rebuild_counters() recomputes them from the source tables.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Organizations, Projects, Tasks, ProjectCounters, OrganizationCounters
+
+# task / project status -> counter column
+TASK_STATUS_FIELDS = {
+    'TODO': 'todo_tasks',
+    'IN_PROGRESS': 'in_progress_tasks',
+    'DONE': 'done_tasks',
+}
+PROJECT_STATUS_FIELDS = {
+    'ACTIVE': 'active_projects',
+    'COMPLETED': 'completed_projects',
+}
+
+PROJECT_COUNTER_FIELDS = ('total_tasks', 'todo_tasks', 'in_progress_tasks', 'done_tasks')
+ORGANIZATION_COUNTER_FIELDS = (
+    'total_projects', 'active_projects', 'completed_projects',
+    'total_tasks', 'todo_tasks', 'in_progress_tasks', 'done_tasks',
+)
+
+
+def _deltas(fields):
+    """
+    {'a': 1, 'b': -1} -> {'a': F('a') + 1, 'b': F('b') - 1}, zero deltas dropped
+    """
+    return {field: F(field) + delta for field, delta in fields.items() if delta}
+
+
+def _status_deltas(status_fields, old_status, new_status, deltas=None):
+    deltas = {} if deltas is None else deltas
+    if old_status in status_fields:
+        deltas[status_fields[old_status]] = deltas.get(status_fields[old_status], 0) - 1
+    if new_status in status_fields:
+        deltas[status_fields[new_status]] = deltas.get(status_fields[new_status], 0) + 1
+    return deltas
+
+
+def _bump_project(project_id, deltas):
+    expressions = _deltas(deltas)
+    if expressions and not ProjectCounters.objects.filter(project_id=project_id).update(**expressions):
+        # row missing (e.g. project created before counters existed), recount it
+        rebuild_project_counters([project_id])
+
+
+def _bump_organization(organization_id, deltas):
+    expressions = _deltas(deltas)
+    if expressions and not OrganizationCounters.objects.filter(organization_id=organization_id).update(**expressions):
+        rebuild_organization_counters([organization_id])
+
+
+def project_created(project):
+    ProjectCounters.objects.create(project_id=project.id)
+    deltas = _status_deltas(PROJECT_STATUS_FIELDS, None, project.status)
+    deltas['total_projects'] = 1
+    _bump_organization(project.organization_id, deltas)
+
+
+def project_status_changed(project, old_status):
+    if old_status != project.status:
+        _bump_organization(
+            project.organization_id,
+            _status_deltas(PROJECT_STATUS_FIELDS, old_status, project.status)
+        )
+
+
+def project_deleted(project):
+    # its ProjectCounters row goes with it
+    deltas = _status_deltas(PROJECT_STATUS_FIELDS, project.status, None)
+    deltas['total_projects'] = -1
+    _bump_organization(project.organization_id, deltas)
+
+
+def _bump_tasks(changes, organization_id):
+    """
+    apply (project_id, old_status, new_status) changes, old_status None for new tasks
+    and new_status None for deleted ones, with one update per project plus one for the organization
+    """
+    by_project = defaultdict(dict)
+    for project_id, old_status, new_status in changes:
+        deltas = _status_deltas(TASK_STATUS_FIELDS, old_status, new_status, by_project[project_id])
+        if old_status is None:
+            deltas['total_tasks'] = deltas.get('total_tasks', 0) + 1
+        if new_status is None:
+            deltas['total_tasks'] = deltas.get('total_tasks', 0) - 1
+
+    organization_deltas = defaultdict(int)
+    for project_id, deltas in by_project.items():
+        _bump_project(project_id, deltas)
+        for field, delta in deltas.items():
+            organization_deltas[field] += delta
+    _bump_organization(organization_id, organization_deltas)
+
+
+def task_created(task):
+    tasks_created([task], task.organization_id or task.project.organization_id)
+
+
+def tasks_created(tasks, organization_id):
+    _bump_tasks([(task.project_id, None, task.status) for task in tasks], organization_id)
+
+
+def tasks_deleted(rows, organization_id):
+    """
+    rows: (project_id, status) of the deleted tasks
+    """
+    _bump_tasks([(project_id, status, None) for project_id, status in rows], organization_id)
+
+
+def task_status_changed(task, old_status):
+    if old_status != task.status:
+        organization_id = task.organization_id
+        if organization_id is None:
+            # tasks written before organization_id was backfilled
+            organization_id = Projects.objects.values_list('organization_id', flat=True).get(pk=task.project_id)
+        task_statuses_changed([(task, old_status)], organization_id)
+
+
+def task_statuses_changed(changes, organization_id):
+    """
+    changes: (task, old_status) pairs of tasks from the same organization
+    """
+    _bump_tasks(
+        [(task.project_id, old_status, task.status) for task, old_status in changes if old_status != task.status],
+        organization_id
+    )
+
+
+def count_project_tasks(project_ids):
+    """
+    recount task counters of the given projects from core_tasks
+    """
+    counters = {project_id: dict.fromkeys(PROJECT_COUNTER_FIELDS, 0) for project_id in project_ids}
+    rows = (
+        Tasks.objects.filter(project_id__in=project_ids)
+        .order_by()
+        .values('project_id')
+        .annotate(
+            total_tasks=Count('pk'),
+            **{field: Count('pk', filter=Q(status=status)) for status, field in TASK_STATUS_FIELDS.items()}
+        )
+    )
+    for row in rows:
+        counters[row['project_id']] = {field: row[field] for field in PROJECT_COUNTER_FIELDS}
+    return counters
+
+
+def count_organizations(organization_ids):
+    """
+    recount project and task counters of the given organizations
+    """
+    counters = {organization_id: dict.fromkeys(ORGANIZATION_COUNTER_FIELDS, 0) for organization_id in organization_ids}
+    project_rows = (
+        Projects.objects.filter(organization_id__in=organization_ids)
+        .order_by()
+        .values('organization_id')
+        .annotate(
+            total_projects=Count('pk'),
+            **{field: Count('pk', filter=Q(status=status)) for status, field in PROJECT_STATUS_FIELDS.items()}
+        )
+    )
+    task_rows = (
+        Tasks.objects.filter(organization_id__in=organization_ids)
+        .order_by()
+        .values('organization_id')
+        .annotate(
+            total_tasks=Count('pk'),
+            **{field: Count('pk', filter=Q(status=status)) for status, field in TASK_STATUS_FIELDS.items()}
+        )
+    )
+    for row in project_rows:
+        counters[row['organization_id']].update(
+            {field: row[field] for field in ('total_projects', *PROJECT_STATUS_FIELDS.values())}
+        )
+    for row in task_rows:
+        counters[row['organization_id']].update(
+            {field: row[field] for field in PROJECT_COUNTER_FIELDS}
+        )
+    return counters
+
+
+def rebuild_project_counters(project_ids):
+    counters = count_project_tasks(project_ids)
+    ProjectCounters.objects.bulk_create(
+        [ProjectCounters(project_id=project_id, **values) for project_id, values in counters.items()],
+        update_conflicts=True,
+        unique_fields=['project'],
+        update_fields=PROJECT_COUNTER_FIELDS,
+    )
+
+
+def rebuild_organization_counters(organization_ids):
+    counters = count_organizations(organization_ids)
+    OrganizationCounters.objects.bulk_create(
+        [OrganizationCounters(organization_id=organization_id, **values) for organization_id, values in counters.items()],
+        update_conflicts=True,
+        unique_fields=['organization'],
+        update_fields=ORGANIZATION_COUNTER_FIELDS,
+    )
+
+
+def rebuild_counters(organization_ids, batch_size=500):
+    """
+    recompute counters of the given organizations (and all of their projects)
+    """
+    for start in range(0, len(organization_ids), batch_size):
+        batch = organization_ids[start:start + batch_size]
+        with transaction.atomic():
+            project_ids = list(
+                Projects.objects.filter(organization_id__in=batch).order_by().values_list('pk', flat=True)
+            )
+            for project_start in range(0, len(project_ids), batch_size):
+                rebuild_project_counters(project_ids[project_start:project_start + batch_size])
+            rebuild_organization_counters(batch)
+
+
+def verify_counters(organization_ids, batch_size=500):
+    """
+    yield (kind, id, stored, expected) for every counter row that is out of date
+    """
+    for start in range(0, len(organization_ids), batch_size):
+        batch = organization_ids[start:start + batch_size]
+        stored = {
+            row['organization_id']: row
+            for row in OrganizationCounters.objects.filter(organization_id__in=batch).values()
+        }
+        for organization_id, expected in count_organizations(batch).items():
+            current = stored.get(organization_id)
+            if current is None or any(current[field] != value for field, value in expected.items()):
+                yield 'organization', organization_id, current, expected
+
+        project_ids = list(
+            Projects.objects.filter(organization_id__in=batch).order_by().values_list('pk', flat=True)
+        )
+        for project_start in range(0, len(project_ids), batch_size):
+            project_batch = project_ids[project_start:project_start + batch_size]
+            stored = {
+                row['project_id']: row
+                for row in ProjectCounters.objects.filter(project_id__in=project_batch).values()
+            }
+            for project_id, expected in count_project_tasks(project_batch).items():
+                current = stored.get(project_id)
+                if current is None or any(current[field] != value for field, value in expected.items()):
+                    yield 'project', project_id, current, expected
+
+
+def all_organization_ids():
+    return list(Organizations.objects.order_by('pk').values_list('pk', flat=True))
@@ -0,0 +1,144 @@
+"""
+Streaming export of an organization's projects, tasks and comments.
+
+Rows are read table by table in primary key order with
+values_list().iterator(chunk_size), a server-side cursor on PostgreSQL, and
+written out one line at a time as NDJSON (every kind, one JSON object per
+line with its `type`) or CSV (one kind); lines are grouped in chunks of about
+BUFFER_SIZE characters, so memory stays flat whatever the size of the tenant.
+"""
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Projects, Tasks, TaskComment
+
+# kind -> exported columns, in output order
+EXPORT_FIELDS = {
+    'projects': (
+        'id', 'organization_id', 'name', 'description', 'status', 'due_date', 'slug', 'created_at', 'updated_at',
+    ),
+    'tasks': (
+        'id', 'project_id', 'title', 'description', 'status', 'assignee_email', 'due_date', 'slug',
+        'created_at', 'updated_at',
+    ),
+    'comments': ('id', 'task_id', 'content', 'author_email', 'created_at', 'updated_at'),
+}
+KINDS = tuple(EXPORT_FIELDS)
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+ORGANIZATION_FIELDS = ('id', 'name', 'contact_email', 'slug', 'created_at', 'updated_at')
+
+BUFFER_SIZE = 64 * 1024
+
+
+def export_settings():
+    options = getattr(settings, 'EXPORT', {})
+    return {
+        'CHUNK_SIZE': options.get('CHUNK_SIZE', 2000),
+        'TOKEN': options.get('TOKEN', ''),
+    }
+
+
+def organization_querysets(organization_id):
+    return {
+        'projects': Projects.objects.filter(organization_id=organization_id),
+        'tasks': Tasks.objects.filter(organization_id=organization_id),
+        'comments': TaskComment.objects.filter(organization_id=organization_id),
+    }
+
+
+def export_rows(organization_id, kinds=KINDS, chunk_size=None):
+    """
+    yield (kind, row dict) of every row of kinds, without loading a table in memory
+    """
+    chunk_size = chunk_size or export_settings()['CHUNK_SIZE']
+    querysets = organization_querysets(organization_id)
+    for kind in kinds:
+        fields = EXPORT_FIELDS[kind]
+        rows = querysets[kind].order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+        for values in rows:
+            yield kind, dict(zip(fields, values))
+
+
+def _json_value(value):
+    # full precision ISO dates, DjangoJSONEncoder would cut datetimes to milliseconds
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ndjson_lines(organization, kinds, chunk_size):
+    header = {field: getattr(organization, field) for field in ORGANIZATION_FIELDS}
+    yield json.dumps({'type': 'organization', **header}, default=_json_value) + '\n'
+    for kind, row in export_rows(organization.pk, kinds, chunk_size):
+        yield json.dumps({'type': kind, **row}, default=_json_value) + '\n'
+
+
+class _Echo:
+    """
+    file-like object handing back what csv.writer writes
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _csv_lines(organization, kind, chunk_size):
+    writer = csv.writer(_Echo())
+    fields = EXPORT_FIELDS[kind]
+    yield writer.writerow(fields)
+    for _, row in export_rows(organization.pk, [kind], chunk_size):
+        yield writer.writerow([_csv_value(row[field]) for field in fields])
+
+
+def _buffered(lines, size=BUFFER_SIZE):
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_chunks(organization, format='ndjson', kinds=None, chunk_size=None):
+    """
+    iterator of the text chunks of the export, raises ValueError for an unknown format or kind;
+    a csv export holds a single kind
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format}, expected one of {', '.join(FORMATS)}")
+    kinds = list(kinds or KINDS)
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown export kinds: {', '.join(sorted(unknown))}")
+    if format == 'csv':
+        if len(kinds) != 1:
+            raise ValueError(f"A csv export holds one kind, pick one of {', '.join(KINDS)}")
+        return _buffered(_csv_lines(organization, kinds[0], chunk_size))
+    return _buffered(_ndjson_lines(organization, kinds, chunk_size))
+
+
+async def aiterate(chunks):
+    """
+    async iterator over a sync export, every chunk is read in the thread that owns the database cursor
+    """
+    try:
+        while True:
+            chunk = await sync_to_async(next)(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,52 @@
+import uuid
+
+from autoslug.utils import slugify
+from django.db import models
+
+TOKEN_LENGTH = 12
+
+
+class TokenSlugField(models.SlugField):
+    """
+    Slug populated from `populate_from` (a model method name) plus a random token.
+
+    Unlike AutoSlugField(unique=True) it never probes the table for collisions
+    (48 random bits make them negligible, the unique index still guards them),
+    so it costs no queries and also works in bulk_create(), where pre_save()
+    is called for every row.
+    """
+
+    def __init__(self, *args, populate_from=None, **kwargs):
+        self.populate_from = populate_from
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['populate_from'] = self.populate_from
+        # only record what differs from this field's own defaults
+        if self.editable:
+            kwargs['editable'] = True
+        else:
+            kwargs.pop('editable', None)
+        if self.blank:
+            kwargs.pop('blank', None)
+        else:
+            kwargs['blank'] = False
+        return name, path, args, kwargs
+
+    def make_slug(self, instance):
+        base = slugify(getattr(instance, self.populate_from)())
+        base = base[:self.max_length - TOKEN_LENGTH - 1].strip('-')
+        token = uuid.uuid4().hex[:TOKEN_LENGTH]
+        return f"{base}-{token}" if base else token
+
+    def pre_save(self, instance, add):
+        value = getattr(instance, self.attname)
+        if value:
+            value = slugify(value)[:self.max_length]
+        else:
+            value = self.make_slug(instance)
+        setattr(instance, self.attname, value)
+        return value
@@ -0,0 +1,54 @@
+"""
+Server side filters and sort orders of the task lists.
+
+Every filter maps to a column of one of the composite Tasks indexes
+(project/status, assignee_email/status/due_date, project/due_date) so the
+filtered lists are index range scans in the order of the chosen KeysetOrder.
+"""
+from graphql import GraphQLError
+
+from .models import Tasks
+from .pagination import NEWEST, KeysetOrder
+
+# orderBy values of the task lists; a task without due date sorts after every due date
+TASK_ORDERS = {
+    'NEWEST': NEWEST,
+    'OLDEST': KeysetOrder('created_at', descending=False),
+    'DUE_DATE': KeysetOrder('due_date', descending=False, nullable=True),
+    'DUE_DATE_DESC': KeysetOrder('due_date', descending=True, nullable=True),
+}
+
+TASK_STATUSES = [status for status, label in Tasks.TASK_STATUS_CHOICES]
+
+
+def task_order(order_by=None):
+    if order_by is None:
+        return NEWEST
+    if order_by not in TASK_ORDERS:
+        raise GraphQLError(f"Unknown task order {order_by}, expected one of {', '.join(TASK_ORDERS)}")
+    return TASK_ORDERS[order_by]
+
+
+def filter_tasks(queryset, organization_id=None, project_id=None, status=None, assignee_email=None,
+                 due_after=None, due_before=None):
+    """
+    queryset narrowed to the given filters, due_after is inclusive and due_before exclusive
+    """
+    if organization_id is None and project_id is None:
+        raise GraphQLError("Pass an organizationId or a projectId")
+    if organization_id is not None:
+        queryset = queryset.filter(organization_id=organization_id)
+    if project_id is not None:
+        queryset = queryset.filter(project_id=project_id)
+    if status:
+        unknown = set(status) - set(TASK_STATUSES)
+        if unknown:
+            raise GraphQLError(f"Unknown task status: {', '.join(sorted(unknown))}")
+        queryset = queryset.filter(status__in=status)
+    if assignee_email is not None:
+        queryset = queryset.filter(assignee_email=assignee_email)
+    if due_after is not None:
+        queryset = queryset.filter(due_date__gte=due_after)
+    if due_before is not None:
+        queryset = queryset.filter(due_date__lt=due_before)
+    return queryset
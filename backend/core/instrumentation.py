@@ -0,0 +1,243 @@
+"""
+Per-operation instrumentation of GraphQL requests.
+
+The view opens an OperationProfile around each operation; while it is open
+every SQL query (on every database alias) is recorded together with the
+resolver that issued it, and InstrumentationMiddleware times each resolver.
+Queries whose shape (SQL with literals stripped) repeats GRAPHQL_INSTRUMENTATION
+['N_PLUS_ONE_THRESHOLD'] times or more in one operation are reported as N+1.
+
+With EXTENSIONS (default: DEBUG) the profile is returned in the response
+`extensions`; finished profiles are always folded into per-process histograms
+(operation duration, SQL queries per operation, time spent in each resolver
+per operation) served by the metrics view.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+# operation names come from clients, past this many distinct names the rest are counted as 'other'
+MAX_OPERATIONS = 500
+
+# resolver running in the current context, a context variable so that concurrent async resolvers
+# (and the ORM thread they await) each see their own
+_current_resolver = ContextVar('graphql_current_resolver', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)")
+
+
+def instrumentation_settings():
+    options = getattr(settings, 'GRAPHQL_INSTRUMENTATION', {})
+    return {
+        'ENABLED': options.get('ENABLED', True),
+        'EXTENSIONS': options.get('EXTENSIONS', settings.DEBUG),
+        'N_PLUS_ONE_THRESHOLD': options.get('N_PLUS_ONE_THRESHOLD', 5),
+    }
+
+
+def query_shape(sql):
+    """
+    sql with literals and IN lists collapsed, equal for queries that only differ by parameters
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('(...)', sql)
+
+
+class OperationProfile:
+    """
+    Resolver timings and SQL queries of one GraphQL operation
+    """
+
+    def __init__(self, operation_name=None, n_plus_one_threshold=5):
+        self.operation_name = operation_name or 'anonymous'
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.resolvers = defaultdict(lambda: [0, 0.0])  # "Type.field" -> [calls, seconds]
+        self.queries = []  # (alias, sql, seconds, resolver)
+        self.cost = None
+        self.started = None
+        self.duration = None
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._record_query(alias)))
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self.started
+        self._stack.close()
+        return False
+
+    def _record_query(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((alias, sql, time.perf_counter() - started, _current_resolver.get()))
+        return wrapper
+
+    def record_resolver(self, key, seconds):
+        entry = self.resolvers[key]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def duplicate_queries(self):
+        shapes = defaultdict(lambda: {'count': 0, 'resolvers': set()})
+        for alias, sql, seconds, resolver in self.queries:
+            shape = shapes[query_shape(sql)]
+            shape['count'] += 1
+            if resolver:
+                shape['resolvers'].add(resolver)
+        return [
+            {'sql': sql, 'count': shape['count'], 'resolvers': sorted(shape['resolvers'])}
+            for sql, shape in shapes.items()
+            if shape['count'] >= self.n_plus_one_threshold
+        ]
+
+    def as_extensions(self):
+        queries_by_resolver = defaultdict(lambda: [0, 0.0])
+        for alias, sql, seconds, resolver in self.queries:
+            entry = queries_by_resolver[resolver or 'operation']
+            entry[0] += 1
+            entry[1] += seconds
+        return {
+            'operation': self.operation_name,
+            'duration_ms': round(self.duration * 1000, 3),
+            'cost': self.cost,
+            'sql': {
+                'count': len(self.queries),
+                'duration_ms': round(sum(query[2] for query in self.queries) * 1000, 3),
+                'by_resolver': {
+                    resolver: {'count': count, 'duration_ms': round(seconds * 1000, 3)}
+                    for resolver, (count, seconds) in queries_by_resolver.items()
+                },
+            },
+            'resolvers': {
+                key: {'calls': calls, 'duration_ms': round(seconds * 1000, 3)}
+                for key, (calls, seconds) in sorted(self.resolvers.items(), key=lambda item: -item[1][1])
+            },
+            'n_plus_one': self.duplicate_queries(),
+        }
+
+
+class InstrumentationMiddleware:
+    """
+    graphene middleware timing every resolver of an operation profiled by the view
+    """
+
+    def resolve(self, next, root, info, **args):
+        profile = getattr(info.context, 'graphql_profile', None)
+        if profile is None:
+            return next(root, info, **args)
+        key = f'{info.parent_type.name}.{info.field_name}'
+        token = _current_resolver.set(key)
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            profile.record_resolver(key, time.perf_counter() - started)
+            raise
+        finally:
+            _current_resolver.reset(token)
+        if isawaitable(result):
+            return self._resolve_async(profile, key, started, result)
+        profile.record_resolver(key, time.perf_counter() - started)
+        return result
+
+    @staticmethod
+    async def _resolve_async(profile, key, started, result):
+        token = _current_resolver.set(key)
+        try:
+            return await result
+        finally:
+            _current_resolver.reset(token)
+            profile.record_resolver(key, time.perf_counter() - started)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, sum and count (Prometheus style)
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        cumulative, total = {}, 0
+        for bound, count in zip([*self.buckets, '+Inf'], self.counts):
+            total += count
+            cumulative[str(bound)] = total
+        return {'buckets': cumulative, 'sum': round(self.sum, 3), 'count': self.count}
+
+
+class MetricsRegistry:
+    """
+    Per-process histograms of finished operation profiles
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.operation_durations = defaultdict(lambda: Histogram(DURATION_BUCKETS_MS))
+        self.operation_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.resolver_durations = defaultdict(lambda: Histogram(DURATION_BUCKETS_MS))
+        self.n_plus_one = defaultdict(int)
+
+    def observe(self, profile):
+        duplicates = profile.duplicate_queries()
+        with self._lock:
+            name = profile.operation_name
+            if name not in self.operation_durations and len(self.operation_durations) >= MAX_OPERATIONS:
+                name = 'other'
+            self.operation_durations[name].observe(profile.duration * 1000)
+            self.operation_queries[name].observe(len(profile.queries))
+            for key, (calls, seconds) in profile.resolvers.items():
+                self.resolver_durations[key].observe(seconds * 1000)
+            if duplicates:
+                self.n_plus_one[name] += 1
+        for duplicate in duplicates:
+            logger.warning(
+                "N+1 in %s: %d x %s (%s)", profile.operation_name, duplicate['count'],
+                duplicate['sql'], ', '.join(duplicate['resolvers']),
+            )
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'operation_duration_ms': {name: h.as_dict() for name, h in self.operation_durations.items()},
+                'operation_sql_queries': {name: h.as_dict() for name, h in self.operation_queries.items()},
+                'resolver_duration_ms': {name: h.as_dict() for name, h in self.resolver_durations.items()},
+                'n_plus_one_operations': dict(self.n_plus_one),
+            }
+
+
+metrics = MetricsRegistry()
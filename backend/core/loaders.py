@@ -0,0 +1,247 @@
+"""
+Per-request batch loaders for GraphQL resolvers.
+
+List resolvers queue the ids they return; the first field that asks a
+loader for one of those ids fetches all queued ids in a single query, so
+nested fields cost the same number of queries for 1 or 1,000 parents.
+
+Nested lists are capped: a project lists its newest TASKS_PER_PROJECT
+tasks and a task its newest COMMENTS_PER_TASK comments, fetched for every
+parent of a batch by one ROW_NUMBER() window query; longer lists are paged
+through the tasks and taskComments connections.
+
+Under the async view (see AsyncQuery in core/schema.py) resolvers await
+load_async() instead: sibling resolvers queue their keys while the first one
+waits for a batch, which then runs once on the ORM thread.
+"""
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Tasks, TaskComment, ProjectCounters
+
+TASKS_PER_PROJECT = 50
+COMMENTS_PER_TASK = 20
+
+
+class BatchLoader:
+    """
+    Synchronous DataLoader: keys are queued while a list is resolved and
+    fetched together on the first load() that misses the cache
+    """
+    default = None
+
+    def __init__(self):
+        self._cache = {}
+        self._queue = set()
+        self._pending = None
+
+    def batch_load(self, keys):
+        """
+        return a dict mapping each found key to its value
+        """
+        raise NotImplementedError
+
+    def queue(self, keys):
+        self._queue.update(key for key in keys if key not in self._cache)
+
+    def prime(self, key, value):
+        self._cache[key] = value
+        self._queue.discard(key)
+
+    def clear(self, key):
+        self._cache.pop(key, None)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue.add(key)
+            self._dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        self.queue(keys)
+        if self._queue:
+            self._dispatch()
+        return [self._cache[key] for key in keys]
+
+    def _dispatch(self):
+        keys = list(self._queue)
+        self._queue.clear()
+        results = self.batch_load(keys)
+        for key in keys:
+            self._cache[key] = results.get(key, self.default)
+
+    async def load_async(self, key):
+        while key not in self._cache:
+            self._queue.add(key)
+            if self._pending is None:
+                self._pending = asyncio.ensure_future(self._dispatch_async())
+            await asyncio.shield(self._pending)
+        return self._cache[key]
+
+    async def _dispatch_async(self):
+        try:
+            # one turn of the event loop lets the sibling resolvers queue their keys
+            await asyncio.sleep(0)
+            await sync_to_async(self._dispatch)()
+        finally:
+            self._pending = None
+
+
+def newest_per_parent(queryset, parent_field, limit):
+    """
+    the first limit rows of every parent in Meta.ordering (newest first), with one window query
+    """
+    return queryset.annotate(
+        position=Window(RowNumber(), partition_by=F(parent_field), order_by=queryset.model._meta.ordering),
+    ).filter(position__lte=limit)
+
+
+class TaskCounters:
+    """
+    Task totals of a single project
+    """
+    __slots__ = ('task_count', 'completed_tasks_count')
+
+    def __init__(self, task_count=0, completed_tasks_count=0):
+        self.task_count = task_count
+        self.completed_tasks_count = completed_tasks_count
+
+    @property
+    def completion_rate(self):
+        if self.task_count == 0:
+            return 0
+        return (self.completed_tasks_count / self.task_count) * 100
+
+
+class ProjectCountersLoader(BatchLoader):
+    """
+    project id -> TaskCounters, read from the ProjectCounters rows;
+    projects without a row are counted with one grouped aggregate
+    """
+    default = TaskCounters()
+
+    def batch_load(self, keys):
+        results = {
+            counter.project_id: TaskCounters(counter.total_tasks, counter.done_tasks)
+            for counter in ProjectCounters.objects.filter(project_id__in=keys)
+        }
+        missing = [key for key in keys if key not in results]
+        if missing:
+            results.update(self.count_tasks(missing))
+        return results
+
+    @staticmethod
+    def count_tasks(keys):
+        rows = (
+            Tasks.objects.filter(project_id__in=keys)
+            .order_by()  # drop Meta.ordering so it stays out of GROUP BY
+            .values('project_id')
+            .annotate(total=Count('id'), done=Count('id', filter=Q(status='DONE')))
+        )
+        return {
+            row['project_id']: TaskCounters(row['total'], row['done'])
+            for row in rows
+        }
+
+
+class ProjectTasksLoader(BatchLoader):
+    """
+    project id -> list of its newest TASKS_PER_PROJECT tasks; loaded task ids are queued for comments
+    """
+
+    def __init__(self, task_comments):
+        super().__init__()
+        self.task_comments = task_comments
+
+    def batch_load(self, keys):
+        grouped = defaultdict(list)
+        tasks = list(newest_per_parent(Tasks.objects.filter(project_id__in=keys), 'project_id', TASKS_PER_PROJECT))
+        for task in tasks:
+            grouped[task.project_id].append(task)
+        self.task_comments.queue([task.id for task in tasks])
+        return grouped
+
+    def load(self, key):
+        return super().load(key) or []
+
+    async def load_async(self, key):
+        return await super().load_async(key) or []
+
+
+class TaskCommentsLoader(BatchLoader):
+    """
+    task id -> list of its newest COMMENTS_PER_TASK comments
+    """
+
+    def batch_load(self, keys):
+        grouped = defaultdict(list)
+        comments = newest_per_parent(TaskComment.objects.filter(task_id__in=keys), 'task_id', COMMENTS_PER_TASK)
+        for comment in comments:
+            grouped[comment.task_id].append(comment)
+        return grouped
+
+    def load(self, key):
+        return super().load(key) or []
+
+    async def load_async(self, key):
+        return await super().load_async(key) or []
+
+
+class Loaders:
+    """
+    All loaders of a single request
+    """
+
+    def __init__(self):
+        self.project_counters = ProjectCountersLoader()
+        self.task_comments = TaskCommentsLoader()
+        self.project_tasks = ProjectTasksLoader(self.task_comments)
+
+    def queue_projects(self, projects):
+        ids = [project.id for project in projects]
+        self.project_counters.queue(ids)
+        self.project_tasks.queue(ids)
+
+    def queue_tasks(self, tasks):
+        self.task_comments.queue([task.id for task in tasks])
+
+
+def get_loaders(info):
+    """
+    return the loaders bound to the current request, creating them on first use
+    """
+    context = info.context
+    loaders = getattr(context, '_core_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        try:
+            context._core_loaders = loaders
+        except AttributeError:
+            # no request object (e.g. schema.execute without context), no batching across fields
+            pass
+    return loaders
+
+
+def is_async(info):
+    """
+    whether the operation is executed by the async view
+    """
+    return getattr(info.context, 'graphql_async', False)
+
+
+def load(info, loader, key, attribute=None):
+    """
+    loader value of key (or one of its attributes) for sync and async execution alike
+    """
+    if not is_async(info):
+        value = loader.load(key)
+        return getattr(value, attribute) if attribute else value
+
+    async def load_async():
+        value = await loader.load_async(key)
+        return getattr(value, attribute) if attribute else value
+    return load_async()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from ...archive import Remover, cold_projects
+
+
+class Command(BaseCommand):
+    help = 'Move cold projects (COMPLETED and idle past the retention window) with their tasks and comments ' \
+           'to the archive tables, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, default=None, help='only archive this organization')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='days without activity (default: ARCHIVE["RETENTION_DAYS"])')
+        parser.add_argument('--status', action='append', default=None, dest='statuses',
+                            help='project status to archive, repeatable (default: ARCHIVE["STATUSES"])')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='tasks per transaction (default: ARCHIVE["BATCH_SIZE"])')
+        parser.add_argument('--dry-run', action='store_true', help='only count the projects to archive')
+
+    def handle(self, *args, **options):
+        projects = cold_projects(options['retention_days'], options['statuses'], options['organization'])
+        if options['dry_run']:
+            self.stdout.write(f'{projects.count()} projects to archive')
+            return
+
+        remover = Remover(archive=True, batch_size=options['batch_size'], on_batch=self.report_batch)
+        remover.remove_projects(projects)
+        removed = remover.removed
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {removed['projects']} projects, {removed['tasks']} tasks and {removed['comments']} comments, "
+            f'{remover.rows_per_second:.0f} rows/s'
+        ))
+
+    def report_batch(self, remover):
+        removed = remover.removed
+        self.stdout.write(
+            f"{removed['projects']} projects, {removed['tasks']} tasks, {removed['comments']} comments, "
+            f'{remover.rows_per_second:.0f} rows/s'
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...partitioning import BATCH_SIZE, backfill_organization_ids, missing_organization_ids
+
+
+class Command(BaseCommand):
+    help = 'Fill in the denormalized organization_id of tasks and comments written without one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per UPDATE, by id range')
+        parser.add_argument('--verify', action='store_true',
+                            help='only report rows without an organization_id, write nothing')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            missing = {kind: count for kind, count in missing_organization_ids().items() if count}
+            if missing:
+                raise CommandError(
+                    f"{', '.join(f'{count} {kind}' for kind, count in missing.items())} without organization_id"
+                )
+            self.stdout.write(self.style.SUCCESS('Every task and comment has its organization_id'))
+            return
+
+        updated = backfill_organization_ids(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated['tasks']} tasks and {updated['comments']} comments"
+        ))
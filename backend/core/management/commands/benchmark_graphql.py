@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import CONNECTION_MODES, MUTATIONS, OPERATIONS, run_benchmarks, run_connection_benchmark
+from ...schema import schema
+
+
+class Command(BaseCommand):
+    help = 'Replay representative GraphQL operations and report latency percentiles and queries per operation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operation', action='append', dest='operations', choices=sorted(OPERATIONS),
+                            help='operation to run, repeatable (default: every read operation)')
+        parser.add_argument('--include-mutations', action='store_true',
+                            help='also run the mutations (each one is rolled back)')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--cold', action='store_true', help='clear the query cache before every run')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+        parser.add_argument('--connections', action='store_true',
+                            help='compare per request connection modes on one operation (default: task)')
+        parser.add_argument('--connection-mode', action='append', dest='connection_modes',
+                            choices=list(CONNECTION_MODES), help='connection mode to run, repeatable (default: all)')
+
+    def handle(self, *args, **options):
+        if options['connections']:
+            return self.handle_connections(options)
+
+        operations = options['operations'] or [
+            name for name in OPERATIONS if options['include_mutations'] or name not in MUTATIONS
+        ]
+        try:
+            results = run_benchmarks(schema, operations, options['iterations'], options['cold'], options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.report([result.summary() for result in results.values()], options)
+
+    def handle_connections(self, options):
+        operation = (options['operations'] or ['task'])[0]
+        try:
+            results = run_connection_benchmark(
+                schema, operation, options['connection_modes'], options['iterations'], options['seed']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        summaries = [result.summary() for result in results.values()]
+        self.report(summaries, options)
+        if options['json'] or 'reconnect' not in results:
+            return
+        baseline = results['reconnect'].percentile(50)
+        for mode, result in results.items():
+            if mode != 'reconnect':
+                self.stdout.write(
+                    f"{mode} saves {(baseline - result.percentile(50)) * 1000:.2f} ms per {operation} request (p50)"
+                )
+
+    def report(self, summaries, options):
+        if options['json']:
+            self.stdout.write(json.dumps(summaries, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'operation':<16}{'runs':>6}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+            f"{'max ms':>10}{'queries':>9}{'max q':>7}"
+        )
+        for summary in summaries:
+            self.stdout.write(
+                f"{summary['operation']:<16}{summary['runs']:>6}{summary['errors']:>8}"
+                f"{summary['p50_ms']:>10.2f}{summary['p90_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+                f"{summary['max_ms']:>10.2f}{summary['queries_avg']:>9.1f}{summary['queries_max']:>7}"
+            )
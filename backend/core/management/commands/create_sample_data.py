@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from datetime import date, datetime, timedelta
 
+from ...counters import rebuild_counters
 from ...models import Organizations, Projects, Tasks, TaskComment
 
 class Command(BaseCommand):
@@ -133,6 +134,9 @@ class Command(BaseCommand):
             author_email='product@startupxyz.com'
         )
 
+        # the rows above are created without the counter hooks
+        rebuild_counters([org1.id, org2.id])
+
         self.stdout.write(
             self.style.SUCCESS('Successfully created sample data!')
         )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...archive import Remover
+from ...models import Organizations, Projects
+
+
+class Command(BaseCommand):
+    help = 'Delete an organization, or one of its projects, bottom-up in batches instead of one cascade'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', type=int, help='organization id')
+        parser.add_argument('--project', type=int, default=None, help='only delete this project')
+        parser.add_argument('--archive', action='store_true', help='move the rows to the archive tables')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='tasks per transaction (default: ARCHIVE["BATCH_SIZE"])')
+
+    def handle(self, *args, **options):
+        organization = Organizations.objects.filter(pk=options['organization']).first()
+        if organization is None:
+            raise CommandError(f"Organization {options['organization']} does not exist")
+        remover = Remover(archive=options['archive'], batch_size=options['batch_size'], on_batch=self.report_batch)
+        if options['project'] is not None:
+            project = Projects.objects.filter(pk=options['project'], organization=organization).first()
+            if project is None:
+                raise CommandError(f"Project {options['project']} does not exist in organization {organization.pk}")
+            remover.remove_project(project)
+            target = f'Project {project.pk}'
+        else:
+            remover.remove_organization(organization)
+            target = f'Organization {organization.pk}'
+
+        removed = remover.removed
+        self.stdout.write(self.style.SUCCESS(
+            f"{target} {'archived' if options['archive'] else 'deleted'}: {removed['projects']} projects, "
+            f"{removed['tasks']} tasks, {removed['comments']} comments, {remover.rows_per_second:.0f} rows/s"
+        ))
+
+    def report_batch(self, remover):
+        removed = remover.removed
+        self.stdout.write(
+            f"{removed['projects']} projects, {removed['tasks']} tasks, {removed['comments']} comments, "
+            f'{remover.rows_per_second:.0f} rows/s'
+        )
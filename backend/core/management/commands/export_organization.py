@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...export import FORMATS, KINDS, export_chunks
+from ...models import Organizations
+
+
+class Command(BaseCommand):
+    help = "Stream an organization's projects, tasks and comments as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', type=int, help='organization id')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--kind', choices=KINDS, action='append', dest='kinds',
+                            help='kind to export, repeatable (default: all, csv takes exactly one)')
+        parser.add_argument('--output', default='-', help='file to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='rows fetched per round trip (default: EXPORT["CHUNK_SIZE"])')
+
+    def handle(self, *args, **options):
+        organization = Organizations.objects.filter(pk=options['organization']).first()
+        if organization is None:
+            raise CommandError(f"Organization {options['organization']} does not exist")
+        try:
+            chunks = export_chunks(organization, options['format'], options['kinds'], options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+        newline = '' if options['format'] == 'csv' else None
+        with open(options['output'], 'w', encoding='utf-8', newline=newline) as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported organization {organization.pk} to {options['output']}"))
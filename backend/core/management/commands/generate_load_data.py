@@ -0,0 +1,133 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...counters import rebuild_counters
+from ...models import Organizations, Projects, Tasks, TaskComment
+
+TASK_STATUSES = ['TODO', 'IN_PROGRESS', 'DONE']
+PROJECT_STATUSES = ['ACTIVE', 'ACTIVE', 'ACTIVE', 'COMPLETED', 'ON_HOLD']
+
+
+def zipf_allocation(total, buckets, skew, rng):
+    """
+    split total over buckets with zipf(skew) weights in random order,
+    skew 0 is a uniform split
+    """
+    if buckets == 0:
+        return []
+    weights = [1 / (rank ** skew) for rank in range(1, buckets + 1)]
+    rng.shuffle(weights)
+    weight_sum = sum(weights)
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    # largest remainder so the counts add up to total
+    remainders = sorted(range(buckets), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in remainders[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic data set with skewed tenant sizes for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=10)
+        parser.add_argument('--projects', type=int, default=100, help='total projects')
+        parser.add_argument('--tasks', type=int, default=10000, help='total tasks')
+        parser.add_argument('--comments', type=int, default=20000, help='total comments')
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='zipf exponent of the project/task/comment distributions, 0 = uniform')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['organizations'] < 1:
+            raise CommandError('--organizations must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        for name in ('projects', 'tasks', 'comments'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} must not be negative')
+        # every row needs a parent, nothing is dropped silently
+        if options['tasks'] and not options['projects']:
+            raise CommandError('--tasks need at least one project')
+        if options['comments'] and not options['tasks']:
+            raise CommandError('--comments need at least one task')
+        rng = random.Random(options['seed'])
+        skew = options['skew']
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        run = f"{int(time.time())}"
+
+        organizations = Organizations.objects.bulk_create(
+            [
+                Organizations(name=f'Load Org {run}-{n}', contact_email=f'admin{n}@load-{run}.example.com')
+                for n in range(options['organizations'])
+            ],
+            batch_size=batch_size,
+        )
+        self.stdout.write(f'Organizations: {len(organizations)}')
+
+        projects_per_org = zipf_allocation(options['projects'], len(organizations), skew, rng)
+        projects = []
+        for organization, count in zip(organizations, projects_per_org):
+            projects.extend(
+                Projects(
+                    organization=organization,
+                    name=f'Project {n}',
+                    description=f'Synthetic project {n} of {organization.name}',
+                    status=rng.choice(PROJECT_STATUSES),
+                )
+                for n in range(count)
+            )
+        Projects.objects.bulk_create(projects, batch_size=batch_size)
+        self.stdout.write(f'Projects: {len(projects)}')
+
+        tasks_per_project = zipf_allocation(options['tasks'], len(projects), skew, rng)
+        comments_per_task = options['comments'] / options['tasks'] if options['tasks'] else 0
+        task_total = comment_total = 0
+        batch = []
+
+        def flush():
+            nonlocal task_total, comment_total
+            with transaction.atomic():
+                Tasks.objects.bulk_create(batch, batch_size=batch_size)
+                comment_counts = zipf_allocation(round(len(batch) * comments_per_task), len(batch), skew, rng)
+                comments = (
+                    TaskComment(
+                        task=task, organization_id=task.organization_id,
+                        content=f'Comment {n} on {task.title}', author_email=f'user{n % 50}@example.com',
+                    )
+                    for task, count in zip(batch, comment_counts)
+                    for n in range(count)
+                )
+                comment_total += len(TaskComment.objects.bulk_create(list(comments), batch_size=batch_size))
+            task_total += len(batch)
+            batch.clear()
+            self.stdout.write(f'  {task_total} tasks, {comment_total} comments', ending='\r')
+
+        # tasks are streamed project by project, at most batch_size rows are kept in memory
+        for project, count in zip(projects, tasks_per_project):
+            for n in range(count):
+                batch.append(Tasks(
+                    project=project,
+                    organization_id=project.organization_id,
+                    title=f'Task {n}',
+                    description=f'Synthetic task {n} of {project.name}',
+                    status=rng.choice(TASK_STATUSES),
+                    assignee_email=f'user{rng.randrange(200)}@example.com',
+                ))
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+        self.stdout.write(f'Tasks: {task_total}')
+        self.stdout.write(f'Comments: {comment_total}')
+
+        rebuild_counters([organization.id for organization in organizations])
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated load data in {time.monotonic() - started:.1f}s'
+        ))
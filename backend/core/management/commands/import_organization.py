@@ -0,0 +1,63 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...bulk_import import FORMATS, KINDS, ImportFailed, Importer, resume_import, start_import
+from ...models import Organizations
+
+
+class Command(BaseCommand):
+    help = 'Stream NDJSON or CSV tasks and comments into an organization, resumable after a failure'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization', type=int, help='organization id')
+        parser.add_argument('input', help='file to read, - for stdin')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--kind', choices=KINDS, default='', help='record type of a csv file')
+        parser.add_argument('--resume', type=int, default=None, metavar='JOB',
+                            help='continue a failed import job with the same input')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='records per transaction (default: IMPORT["CHUNK_SIZE"])')
+
+    def handle(self, *args, **options):
+        organization = Organizations.objects.filter(pk=options['organization']).first()
+        if organization is None:
+            raise CommandError(f"Organization {options['organization']} does not exist")
+        try:
+            if options['resume']:
+                job = resume_import(options['resume'], organization.pk)
+            else:
+                job = start_import(organization, options['format'], options['kind'], source=options['input'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if job.records_committed:
+            self.stdout.write(f'Resuming import {job.pk} after record {job.records_committed}')
+
+        importer = Importer(job, chunk_size=options['chunk_size'], on_chunk=self.report_chunk)
+        source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8', newline='')
+        try:
+            with source:
+                importer.run(source)
+        except ImportFailed as e:
+            raise CommandError(f'Import {job.pk} failed at {e.job.last_error}, '
+                               f'fix the cause and continue with --resume {job.pk}')
+        finally:
+            self.report_rejects(job)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Import {job.pk} completed: {job.tasks_created} tasks, {job.comments_created} comments, '
+            f'{job.rejected} rejected, {importer.records_per_second:.0f} records/s'
+        ))
+
+    def report_chunk(self, importer):
+        job = importer.job
+        self.stdout.write(
+            f'record {job.records_committed}: {job.tasks_created} tasks, {job.comments_created} comments, '
+            f'{job.rejected} rejected, {importer.records_per_second:.0f} records/s'
+        )
+
+    def report_rejects(self, job):
+        for number, messages in job.errors:
+            self.stderr.write(self.style.WARNING(f"record {number}: {'; '.join(messages)}"))
+        if job.rejected > len(job.errors):
+            self.stderr.write(self.style.WARNING(f'... {job.rejected - len(job.errors)} more rejected records'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...partitioning import partition_tables
+
+
+class Command(BaseCommand):
+    help = ('Hash partition the tasks and comments tables by organization (PostgreSQL); '
+            'copies the tables under an exclusive lock')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=16, help='number of hash partitions per table')
+
+    def handle(self, *args, **options):
+        try:
+            partitioned = partition_tables(options['partitions'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not partitioned:
+            self.stdout.write('The tenant tables are already partitioned')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Partitioned {', '.join(partitioned)} in {options['partitions']} partitions"
+        ))
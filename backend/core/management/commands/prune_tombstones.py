@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...sync import prune_tombstones, sync_settings
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of removed rows older than SYNC["TOMBSTONE_DAYS"]'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='tombstones per DELETE')
+
+    def handle(self, *args, **options):
+        pruned = prune_tombstones(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {pruned} tombstones older than {sync_settings()['TOMBSTONE_DAYS']} days"
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...counters import all_organization_ids, rebuild_counters, verify_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or only verify) the denormalized project and organization counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, action='append', dest='organizations',
+                            help='organization id to process, repeatable (default: all)')
+        parser.add_argument('--verify', action='store_true',
+                            help='only report counters that are out of date, write nothing')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        organization_ids = options['organizations'] or all_organization_ids()
+        batch_size = options['batch_size']
+
+        if options['verify']:
+            mismatches = 0
+            for kind, pk, stored, expected in verify_counters(organization_ids, batch_size):
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(f'{kind} {pk}: stored {stored}, expected {expected}'))
+            if mismatches:
+                raise CommandError(f'{mismatches} counter rows out of date')
+            self.stdout.write(self.style.SUCCESS('All counters are up to date'))
+            return
+
+        rebuild_counters(organization_ids, batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt counters of {len(organization_ids)} organizations')
+        )
@@ -0,0 +1,82 @@
+# Generated by Django 4.2 on 2026-10-18 13:56
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+TASK_STATUS_FIELDS = {'TODO': 'todo_tasks', 'IN_PROGRESS': 'in_progress_tasks', 'DONE': 'done_tasks'}
+PROJECT_STATUS_FIELDS = {'ACTIVE': 'active_projects', 'COMPLETED': 'completed_projects'}
+
+
+def backfill_counters(apps, schema_editor):
+    Organizations = apps.get_model('core', 'Organizations')
+    Projects = apps.get_model('core', 'Projects')
+    ProjectCounters = apps.get_model('core', 'ProjectCounters')
+    OrganizationCounters = apps.get_model('core', 'OrganizationCounters')
+
+    task_counts = {
+        field: Count('tasks', filter=Q(tasks__status=status)) for status, field in TASK_STATUS_FIELDS.items()
+    }
+    project_rows = (
+        Projects.objects.order_by()
+        .values('pk', 'organization_id')
+        .annotate(total_tasks=Count('tasks'), **task_counts)
+    )
+    organizations = {
+        pk: OrganizationCounters(organization_id=pk)
+        for pk in Organizations.objects.values_list('pk', flat=True)
+    }
+    project_counters = []
+    for row in project_rows.iterator():
+        project_counters.append(ProjectCounters(
+            project_id=row['pk'],
+            total_tasks=row['total_tasks'],
+            **{field: row[field] for field in TASK_STATUS_FIELDS.values()}
+        ))
+        organization = organizations[row['organization_id']]
+        organization.total_projects += 1
+        for field in ('total_tasks', *TASK_STATUS_FIELDS.values()):
+            setattr(organization, field, getattr(organization, field) + row[field])
+
+    for row in Projects.objects.order_by().values('organization_id', 'status').annotate(count=Count('pk')):
+        if row['status'] in PROJECT_STATUS_FIELDS:
+            organization = organizations[row['organization_id']]
+            setattr(organization, PROJECT_STATUS_FIELDS[row['status']], row['count'])
+
+    ProjectCounters.objects.bulk_create(project_counters, batch_size=1000)
+    OrganizationCounters.objects.bulk_create(organizations.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationCounters',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='core.organizations')),
+                ('total_projects', models.PositiveIntegerField(default=0)),
+                ('active_projects', models.PositiveIntegerField(default=0)),
+                ('completed_projects', models.PositiveIntegerField(default=0)),
+                ('total_tasks', models.PositiveIntegerField(default=0)),
+                ('todo_tasks', models.PositiveIntegerField(default=0)),
+                ('in_progress_tasks', models.PositiveIntegerField(default=0)),
+                ('done_tasks', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProjectCounters',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='core.projects')),
+                ('total_tasks', models.PositiveIntegerField(default=0)),
+                ('todo_tasks', models.PositiveIntegerField(default=0)),
+                ('in_progress_tasks', models.PositiveIntegerField(default=0)),
+                ('done_tasks', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,130 @@
+# Turns BaseModel from a concrete parent (multi-table inheritance) into an
+# abstract base: created_at / updated_at are copied into every model's own
+# table and the basemodel_ptr parent link becomes a plain BigAutoField "id",
+# keeping every existing primary key (and therefore every foreign key).
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+MODELS = ('organizations', 'projects', 'tasks', 'taskcomment')
+
+
+class DetachFromBaseModel(migrations.operations.base.Operation):
+    """
+    State only: drop core.BaseModel from the bases of a model, its
+    basemodel_ptr field stays a regular one-to-one primary key until altered
+    """
+    reduces_to_sql = False
+    reversible = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        model_state = state.models[app_label, self.name]
+        model_state.bases = (models.Model,)
+        state.reload_model(app_label, self.name, delay=True)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        pass
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        raise NotImplementedError('flattening BaseModel cannot be reversed')
+
+    def describe(self):
+        return f'Detach {self.name} from BaseModel'
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.name], {}
+
+
+def copy_timestamps(apps, schema_editor):
+    BaseModel = apps.get_model('core', 'BaseModel')
+    for name in MODELS:
+        model = apps.get_model('core', name)
+        parent = BaseModel.objects.filter(pk=OuterRef('basemodel_ptr'))
+        model.objects.update(
+            created_at=Subquery(parent.values('created_at')[:1]),
+            updated_at=Subquery(parent.values('updated_at')[:1]),
+        )
+
+
+def reset_id_sequences(apps, schema_editor):
+    # ADD GENERATED AS IDENTITY starts at 1, continue after the copied ids
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in MODELS:
+        table = apps.get_model('core', name)._meta.db_table
+        schema_editor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) "
+            f"FROM {schema_editor.quote_name(table)}"
+        )
+
+
+def detach(name):
+    return [
+        DetachFromBaseModel(name),
+        migrations.AddField(
+            model_name=name,
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name=name,
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
+
+
+def promote_id(name):
+    return [
+        migrations.RenameField(model_name=name, old_name='basemodel_ptr', new_name='id'),
+        migrations.AlterField(
+            model_name=name,
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_counters'),
+    ]
+
+    operations = [
+        *[operation for name in MODELS for operation in detach(name)],
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        *[operation for name in MODELS for operation in promote_id(name)],
+        migrations.RunPython(reset_id_sequences, migrations.RunPython.noop),
+        migrations.DeleteModel(name='BaseModel'),
+        migrations.AlterModelOptions(
+            name='projects',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='tasks',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='taskcomment',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='projects',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='project_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['project', '-created_at', '-id'], name='task_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=models.Index(fields=['task', '-created_at', '-id'], name='comment_task_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 14:03
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_flatten_basemodel'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='organizations',
+            name='slug',
+            field=core.fields.TokenSlugField(populate_from='get_org_slug', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='projects',
+            name='slug',
+            field=core.fields.TokenSlugField(populate_from='get_project_slug', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='tasks',
+            name='slug',
+            field=core.fields.TokenSlugField(populate_from='get_task_slug'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# must match core.search.SEARCH_CONFIG
+SEARCH_CONFIG = 'english'
+
+# model -> weighted columns of its search document
+SEARCH_DOCUMENTS = {
+    'Projects': (('name', 'A'), ('description', 'B')),
+    'Tasks': (('title', 'A'), ('description', 'B')),
+    'TaskComment': (('content', 'A'),),
+}
+
+
+def _document(columns, row):
+    return ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({row}{column}, '')), '{weight}')"
+        for column, weight in columns
+    )
+
+
+def create_search_vectors(apps, schema_editor):
+    # tsvector columns only exist on postgresql, they are kept out of the models so that
+    # regular reads never fetch them; other databases use core.search.BasicSearchEngine
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, columns in SEARCH_DOCUMENTS.items():
+        table = apps.get_model('core', name)._meta.db_table
+        quoted = schema_editor.quote_name(table)
+        watched = ', '.join(column for column, weight in columns)
+        schema_editor.execute(f"ALTER TABLE {quoted} ADD COLUMN search_vector tsvector")
+        schema_editor.execute(f"""
+            CREATE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {_document(columns, 'NEW.')};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        schema_editor.execute(
+            f"CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF {watched} ON {quoted} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()"
+        )
+        schema_editor.execute(f"UPDATE {quoted} SET search_vector = {_document(columns, '')}")
+        schema_editor.execute(f"CREATE INDEX {table}_search_idx ON {quoted} USING gin (search_vector)")
+
+
+def drop_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_DOCUMENTS:
+        table = apps.get_model('core', name)._meta.db_table
+        quoted = schema_editor.quote_name(table)
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_search_vector ON {quoted}")
+        schema_editor.execute(f"DROP FUNCTION IF EXISTS {table}_search_vector()")
+        schema_editor.execute(f"ALTER TABLE {quoted} DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_token_slugs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vectors, drop_search_vectors),
+    ]
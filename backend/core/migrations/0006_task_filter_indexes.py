@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['project', 'status', '-created_at', '-id'], name='task_project_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['project', 'due_date', 'id'], name='task_project_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['assignee_email', 'status', 'due_date', 'id'], name='task_assignee_due_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-18 14:35
+
+from django.db import migrations, models
+from django.db.models import Max, Min, OuterRef, Subquery
+import django.db.models.deletion
+
+BATCH_SIZE = 10000
+
+
+def _backfill(model, owners):
+    # primary key ranges keep every UPDATE small on large tables
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        model.objects.filter(pk__gte=start, pk__lt=start + BATCH_SIZE, organization__isnull=True).update(
+            organization_id=Subquery(owners.values('organization_id')[:1])
+        )
+
+
+def backfill_organizations(apps, schema_editor):
+    # rows written by older code later on are fixed by the backfill_organization_ids command
+    Projects = apps.get_model('core', 'Projects')
+    Tasks = apps.get_model('core', 'Tasks')
+    TaskComment = apps.get_model('core', 'TaskComment')
+    _backfill(Tasks, Projects.objects.filter(pk=OuterRef('project_id')))
+    _backfill(TaskComment, Tasks.objects.filter(pk=OuterRef('task_id')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskcomment',
+            name='organization',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.organizations'),
+        ),
+        migrations.AddField(
+            model_name='tasks',
+            name='organization',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.organizations'),
+        ),
+        migrations.RunPython(backfill_organizations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='task_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasks',
+            index=models.Index(fields=['organization', 'status'], name='task_org_status_idx'),
+        ),
+    ]
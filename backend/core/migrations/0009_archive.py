@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_tenant_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProject',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('organization_id', models.BigIntegerField(db_index=True)),
+                ('name', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(max_length=20)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('slug', models.SlugField(db_index=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-archived_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('organization_id', models.BigIntegerField(db_index=True, null=True)),
+                ('project_id', models.BigIntegerField(db_index=True)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(max_length=20)),
+                ('assignee_email', models.EmailField(blank=True, max_length=254)),
+                ('due_date', models.DateTimeField(blank=True, null=True)),
+                ('slug', models.SlugField(db_index=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-archived_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTaskComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('organization_id', models.BigIntegerField(db_index=True, null=True)),
+                ('task_id', models.BigIntegerField(db_index=True)),
+                ('content', models.TextField()),
+                ('author_email', models.EmailField(max_length=254)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-archived_at', '-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('organization_id', models.BigIntegerField()),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Project'), (2, 'Task'), (3, 'Comment')])),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'Created'), (2, 'Updated')])),
+                ('actor', models.CharField(blank=True, max_length=150)),
+                ('changes', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'activity entries',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activityentry',
+            index=models.Index(fields=['organization_id', '-created_at', '-id'], name='activity_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activityentry',
+            index=models.Index(fields=['object_id', 'kind', '-created_at', '-id'], name='activity_object_idx'),
+        ),
+    ]
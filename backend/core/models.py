@@ -1,9 +1,12 @@
 from django.db import models
-from autoslug import AutoSlugField
+from django.db.models.functions import Coalesce
+
+from .fields import TokenSlugField
 
 class BaseModel(models.Model):
     """
     Base model as parent model
+    abstract, so every model keeps its timestamps in its own table
     """
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -18,6 +21,9 @@ class BaseModel(models.Model):
     #     verbose_name='Created by'
     # )
 
+    class Meta:
+        abstract = True
+
 class Organizations(BaseModel):
     """
     Organization model for multi-tenancy
@@ -25,14 +31,14 @@ class Organizations(BaseModel):
     """
     name = models.CharField(max_length=100)
     contact_email = models.EmailField()
-    slug = AutoSlugField(populate_from='get_org_slug', unique=True, blank=True)
+    slug = TokenSlugField(populate_from='get_org_slug', unique=True)
 
     class Meta:
         ordering = ['name'] # object ordering
 
-    # generates slug
+    # generates slug, TokenSlugField appends a unique token
     def get_org_slug(self):
-        return f"{self.name}_{self.contact_email}_{self.created_at}"
+        return self.name
 
     def __str__(self):
         return self.slug
@@ -60,18 +66,24 @@ class Projects(BaseModel):
     description = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
     due_date = models.DateField(null=True, blank=True)
-    slug = AutoSlugField(populate_from="get_project_slug", unique=True, blank=True)
+    slug = TokenSlugField(populate_from="get_project_slug", unique=True)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
         unique_together = [['organization', 'name']]
+        indexes = [
+            # backs keyset pagination of an organization's projects
+            models.Index(fields=['organization', '-created_at', '-id'], name='project_org_created_idx'),
+            # backs changesSince (core/sync.py)
+            models.Index(fields=['organization', 'updated_at', 'id'], name='project_org_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.organization.name} - {self.name}"
 
-    # generate custom project slug
+    # generate custom project slug, own fields only so no organization is loaded
     def get_project_slug(self):
-        return f"{self.name}_{self.organization.name}"
+        return self.name
 
     @property
     def task_count(self):
@@ -83,9 +95,36 @@ class Projects(BaseModel):
 
     @property
     def completion_rate(self):
-        if self.task_count == 0:
+        task_count = self.task_count
+        if task_count == 0:
             return 0
-        return (self.completed_tasks_count / self.task_count) * 100
+        return (self.completed_tasks_count / task_count) * 100
+
+
+def _project_organization(task):
+    """
+    organization id of a task's project, without a query when the project is loaded
+    """
+    if Tasks.project.is_cached(task):
+        return task.project.organization_id
+    return Projects.objects.filter(pk=task.project_id).values_list('organization_id', flat=True).first()
+
+
+def tasks_with_owner():
+    """
+    tasks annotated with owner: their organization_id, or their project's for the rows not backfilled yet
+    (see backfill_organization_ids); COALESCE only runs the subquery for those
+    """
+    project_organization = Projects.objects.filter(pk=models.OuterRef('project_id')).values('organization_id')
+    return Tasks.objects.annotate(
+        owner=Coalesce('organization_id', models.Subquery(project_organization), output_field=models.BigIntegerField()),
+    )
+
+
+def _task_organization(comment):
+    if TaskComment.task.is_cached(comment) and comment.task.organization_id is not None:
+        return comment.task.organization_id
+    return tasks_with_owner().filter(pk=comment.task_id).values_list('owner', flat=True).first()
 
 
 class Tasks(BaseModel):
@@ -106,19 +145,47 @@ class Tasks(BaseModel):
         on_delete=models.CASCADE,
         related_name='tasks'
     )
+    # project.organization denormalized, tenant scans and partitions need no join (see core/partitioning.py);
+    # null only for rows written before it existed, until backfill_organization_ids
+    organization = models.ForeignKey(
+        Organizations,
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        editable=False,
+        db_index=False,
+    )
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=TASK_STATUS_CHOICES, default='TODO')
     assignee_email = models.EmailField(blank=True)
     due_date = models.DateTimeField(null=True, blank=True)
-    slug = AutoSlugField(populate_from="get_task_slug")
+    slug = TokenSlugField(populate_from="get_task_slug")
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # backs keyset pagination of a project's tasks
+            models.Index(fields=['project', '-created_at', '-id'], name='task_project_created_idx'),
+            # back the filters and orders of core/filters.py
+            models.Index(fields=['project', 'status', '-created_at', '-id'], name='task_project_status_idx'),
+            models.Index(fields=['project', 'due_date', 'id'], name='task_project_due_idx'),
+            models.Index(fields=['assignee_email', 'status', 'due_date', 'id'], name='task_assignee_due_idx'),
+            # tenant scans: task lists and counts of an organization
+            models.Index(fields=['organization', '-created_at', '-id'], name='task_org_created_idx'),
+            models.Index(fields=['organization', 'status'], name='task_org_status_idx'),
+            models.Index(fields=['organization', 'updated_at', 'id'], name='task_org_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # bulk writers set the organization themselves, bulk_create() skips save()
+        if self.organization_id is None:
+            self.organization_id = _project_organization(self)
+        super().save(*args, **kwargs)
 
-    # generate custom task slug
+    # generate custom task slug, own fields only so no project is loaded
     def get_task_slug(self):
-        return f"{self.title}_{self.project.name}"
+        return self.title
 
     def __str__(self):
         return f"{self.project.name} - {self.title}"
@@ -135,11 +202,245 @@ class TaskComment(BaseModel):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    # task.organization denormalized, as on Tasks
+    organization = models.ForeignKey(
+        Organizations,
+        on_delete=models.CASCADE,
+        related_name='+',
+        null=True,
+        editable=False,
+    )
+    content = models.TextField()
+    author_email = models.EmailField()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # backs keyset pagination of a task's comments
+            models.Index(fields=['task', '-created_at', '-id'], name='comment_task_created_idx'),
+            models.Index(fields=['organization', 'updated_at', 'id'], name='comment_org_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.organization_id is None:
+            self.organization_id = _task_organization(self)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Comment on {self.task.title} by {self.author_email}"
+
+class ProjectCounters(models.Model):
+    """
+    Denormalized task counters of a project,
+    maintained by core.counters in the same transaction as task writes
+    """
+    project = models.OneToOneField(
+        Projects,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters'
+    )
+    total_tasks = models.PositiveIntegerField(default=0)
+    todo_tasks = models.PositiveIntegerField(default=0)
+    in_progress_tasks = models.PositiveIntegerField(default=0)
+    done_tasks = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Counters of project {self.project_id}"
+
+
+class OrganizationCounters(models.Model):
+    """
+    Denormalized project and task counters rolled up per organization
+    """
+    organization = models.OneToOneField(
+        Organizations,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters'
+    )
+    total_projects = models.PositiveIntegerField(default=0)
+    active_projects = models.PositiveIntegerField(default=0)
+    completed_projects = models.PositiveIntegerField(default=0)
+    total_tasks = models.PositiveIntegerField(default=0)
+    todo_tasks = models.PositiveIntegerField(default=0)
+    in_progress_tasks = models.PositiveIntegerField(default=0)
+    done_tasks = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Counters of organization {self.organization_id}"
+
+
+class ImportJob(BaseModel):
+    """
+    One bulk import of tasks and comments into an organization (core/bulk_import.py),
+    records_committed is the checkpoint a failed import resumes from
+    """
+
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('FAILED', 'Failed'),
+        ('COMPLETED', 'Completed'),
+    ]
+
+    organization = models.ForeignKey(
+        Organizations,
+        on_delete=models.CASCADE,
+        related_name='import_jobs'
+    )
+    source = models.CharField(max_length=255, blank=True)
+    format = models.CharField(max_length=10)
+    kind = models.CharField(max_length=10, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    records_committed = models.PositiveBigIntegerField(default=0)
+    tasks_created = models.PositiveIntegerField(default=0)
+    comments_created = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    # [record number, messages] of the first rejected records
+    errors = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"Import {self.pk} into organization {self.organization_id}"
+
+
+class ImportedTask(models.Model):
+    """
+    Task created by an import job under the reference (`ref`) it had in the imported data,
+    so that comments of later chunks or of a resumed run can point at it
+    """
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='imported_tasks')
+    ref = models.CharField(max_length=255)
+    task = models.ForeignKey(Tasks, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = [['job', 'ref']]
+
+    def __str__(self):
+        return f"{self.ref} -> task {self.task_id}"
+
+
+class ArchivedProject(models.Model):
+    """
+    Project moved out of core_projects by core/archive.py, under its original id;
+    plain ids instead of foreign keys, archived rows outlive their organization's hot rows
+    """
+    id = models.BigIntegerField(primary_key=True)
+    organization_id = models.BigIntegerField(db_index=True)
+    name = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=20)
+    due_date = models.DateField(null=True, blank=True)
+    slug = models.SlugField(db_index=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-archived_at', '-id']
+
+    def __str__(self):
+        return f"Archived project {self.name}"
+
+
+class ArchivedTask(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    organization_id = models.BigIntegerField(null=True, db_index=True)
+    project_id = models.BigIntegerField(db_index=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=20)
+    assignee_email = models.EmailField(blank=True)
+    due_date = models.DateTimeField(null=True, blank=True)
+    slug = models.SlugField(db_index=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-archived_at', '-id']
+
+    def __str__(self):
+        return f"Archived task {self.title}"
+
+
+class ArchivedTaskComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    organization_id = models.BigIntegerField(null=True, db_index=True)
+    task_id = models.BigIntegerField(db_index=True)
     content = models.TextField()
     author_email = models.EmailField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-archived_at', '-id']
+
+    def __str__(self):
+        return f"Archived comment on task {self.task_id}"
+
+
+class Tombstone(models.Model):
+    """
+    Removal of a project, task or comment (deleted or archived by core/archive.py),
+    served by changesSince (core/sync.py) until pruned
+    """
+    organization_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    # pruned by age, see core.sync.prune_tombstones
+    deleted_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization_id', 'deleted_at', 'id'], name='tombstone_org_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Removed {self.kind} {self.object_id}"
+
+
+class ActivityEntry(models.Model):
+    """
+    One object created or changed by a mutation, append-only (core/activity.py);
+    changes holds the new values of a creation, [old, new] per changed field of an update
+    """
+    PROJECT = 1
+    TASK = 2
+    COMMENT = 3
+    KIND_CHOICES = [
+        (PROJECT, 'Project'),
+        (TASK, 'Task'),
+        (COMMENT, 'Comment'),
+    ]
+    CREATED = 1
+    UPDATED = 2
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+    ]
+
+    organization_id = models.BigIntegerField()
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.PositiveSmallIntegerField(choices=ACTION_CHOICES)
+    actor = models.CharField(max_length=150, blank=True)
+    changes = models.JSONField(default=dict)
+    # time of the mutation, entries are inserted later and in batches
+    created_at = models.DateTimeField()
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        verbose_name_plural = 'activity entries'
+        indexes = [
+            # back the activityFeed of an organization and of one object
+            models.Index(fields=['organization_id', '-created_at', '-id'], name='activity_org_created_idx'),
+            models.Index(fields=['object_id', 'kind', '-created_at', '-id'], name='activity_object_idx'),
+        ]
 
     def __str__(self):
-        return f"Comment on {self.task.title} by {self.author_email}"
\ No newline at end of file
+        return f"{self.get_kind_display()} {self.object_id} {self.get_action_display().lower()}"
@@ -0,0 +1,159 @@
+"""
+Keyset (cursor) pagination for Relay connections.
+
+Lists are ordered by (-created_at, -id), or by the (column, id) of another
+KeysetOrder, and a cursor encodes the (column value, id) of an edge, so every
+page is a bounded range scan on a (parent, ..., column) index whatever its
+position in the list.
+"""
+import base64
+import binascii
+
+import graphene
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from graphql import GraphQLError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class KeysetOrder:
+    """
+    order on (field, pk) with pk as tie breaker, both in the same direction;
+    a null field (nullable=True) sorts as the greatest value, as in a postgresql btree index
+    """
+
+    def __init__(self, field, descending=True, nullable=False):
+        self.field = field
+        self.descending = descending
+        self.nullable = nullable
+
+    def order_by(self, reverse=False):
+        descending = self.descending != reverse
+        field = F(self.field).desc(nulls_first=True) if descending else F(self.field).asc(nulls_last=True)
+        if not self.nullable:
+            field = f'-{self.field}' if descending else self.field
+        return field, '-pk' if descending else 'pk'
+
+    def cursor(self, instance):
+        value = getattr(instance, self.field)
+        value = value.isoformat() if value is not None else ''
+        return base64.urlsafe_b64encode(f"{value}|{instance.pk}".encode()).decode()
+
+    def _greater(self, value, pk):
+        field = self.field
+        if value is None:
+            return Q(**{f'{field}__isnull': True, 'pk__gt': pk})
+        # the __gte is redundant but gives the database an index range to start from
+        condition = Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(pk__gt=pk))
+        if self.nullable:
+            condition |= Q(**{f'{field}__isnull': True})
+        return condition
+
+    def _less(self, value, pk):
+        field = self.field
+        if value is None:
+            return Q(**{f'{field}__isnull': False}) | Q(**{f'{field}__isnull': True, 'pk__lt': pk})
+        return Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(pk__lt=pk))
+
+    def after(self, cursor):
+        value, pk = decode_cursor(cursor, self.nullable)
+        return self._less(value, pk) if self.descending else self._greater(value, pk)
+
+    def before(self, cursor):
+        value, pk = decode_cursor(cursor, self.nullable)
+        return self._greater(value, pk) if self.descending else self._less(value, pk)
+
+
+# default order of every list, newest first
+NEWEST = KeysetOrder('created_at')
+
+
+def encode_cursor(instance):
+    return NEWEST.cursor(instance)
+
+
+def decode_cursor(cursor, nullable=False):
+    try:
+        value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        pk = int(pk)
+        if value or not nullable:
+            value = parse_datetime(value)
+            if value is None:
+                raise ValueError(cursor)
+        else:
+            value = None
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+    return value, pk
+
+
+def page_size(first=None, last=None):
+    size = first if first is not None else last
+    if size is None:
+        return DEFAULT_PAGE_SIZE
+    if size < 0:
+        raise GraphQLError("first and last must be positive")
+    return min(size, MAX_PAGE_SIZE)
+
+
+def _page_queryset(queryset, first=None, after=None, last=None, before=None, order=NEWEST):
+    """
+    return (queryset of size + 1 rows, size, backwards)
+    """
+    if first is not None and last is not None:
+        raise GraphQLError("Pass either first or last, not both")
+    size = page_size(first, last)
+
+    if after:
+        queryset = queryset.filter(order.after(after))
+    if before:
+        queryset = queryset.filter(order.before(before))
+
+    if last is not None:
+        # walk backwards from the end (or from `before`), the order is restored by _page()
+        return queryset.order_by(*order.order_by(reverse=True))[:size + 1], size, True
+    return queryset.order_by(*order.order_by())[:size + 1], size, False
+
+
+def _page(nodes, size, backwards, after=None, before=None):
+    if backwards:
+        has_previous_page = len(nodes) > size
+        return nodes[:size][::-1], has_previous_page, bool(before)
+    has_next_page = len(nodes) > size
+    return nodes[:size], bool(after), has_next_page
+
+
+def paginate(queryset, first=None, after=None, last=None, before=None, order=NEWEST):
+    """
+    return (nodes, has_previous_page, has_next_page) of one page of queryset,
+    in order (newest first by default); only page size + 1 rows are fetched
+    """
+    queryset, size, backwards = _page_queryset(queryset, first, after, last, before, order)
+    return _page(list(queryset), size, backwards, after, before)
+
+
+async def apaginate(queryset, first=None, after=None, last=None, before=None, order=NEWEST):
+    """
+    async paginate()
+    """
+    queryset, size, backwards = _page_queryset(queryset, first, after, last, before, order)
+    return _page([node async for node in queryset], size, backwards, after, before)
+
+
+def connection_from_page(connection_type, page, cursor=encode_cursor):
+    """
+    build a connection from the (nodes, has_previous_page, has_next_page) of paginate()
+    """
+    nodes, has_previous_page, has_next_page = page
+    edges = [connection_type.Edge(node=node, cursor=cursor(node)) for node in nodes]
+    return connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
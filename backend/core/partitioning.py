@@ -0,0 +1,161 @@
+"""
+Tenant partitioned storage of tasks and comments.
+
+Tasks and TaskComment carry their organization_id (denormalized from the
+project, set on create), so tenant scans filter on it without joining
+projects. Rows written before the column existed, or by older code during a
+rolling deploy, are filled in by backfill_organization_ids().
+
+On PostgreSQL both tables can then be turned into declarative partitioned
+tables, PARTITION BY HASH (organization_id), with partition_tables(): a
+tenant's scans and deletes touch a single partition and its indexes. Keys
+of a partitioned table must hold the partition key, so the primary keys
+become (id, organization_id) and the foreign keys pointing at tasks
+(comments, import refs) are dropped; ids stay unique through the table's
+sequence and deletes cascade in Django as before. The tables are copied
+under an exclusive lock, run it in a maintenance window.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from .models import Projects, Tasks, TaskComment
+
+BATCH_SIZE = 10000
+
+# in partitioning order, comments reference tasks
+PARTITIONED_MODELS = (Tasks, TaskComment)
+
+
+def _backfill(model, owners, batch_size):
+    bounds = model.objects.filter(organization__isnull=True).aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        updated += model.objects.filter(
+            pk__gte=start, pk__lt=start + batch_size, organization__isnull=True
+        ).update(organization_id=Subquery(owners.values('organization_id')[:1]))
+    return updated
+
+
+def backfill_organization_ids(batch_size=BATCH_SIZE):
+    """
+    fill in organization_id of the tasks and comments that miss it, one primary key range
+    per statement; return {model name: updated rows}
+    """
+    return {
+        'tasks': _backfill(Tasks, Projects.objects.filter(pk=OuterRef('project_id')), batch_size),
+        'comments': _backfill(TaskComment, Tasks.objects.filter(pk=OuterRef('task_id')), batch_size),
+    }
+
+
+def missing_organization_ids():
+    return {
+        'tasks': Tasks.objects.filter(organization__isnull=True).count(),
+        'comments': TaskComment.objects.filter(organization__isnull=True).count(),
+    }
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [table]
+        )
+        return cursor.fetchone()[0]
+
+
+def _fetch(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def partition_table(cursor, model, partitions):
+    """
+    replace model's table by a copy hash partitioned on organization_id, keeping its indexes,
+    triggers and outgoing foreign keys
+    """
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    old_table = f'{table}_unpartitioned'
+    sequence = f'{table}_pk_seq'
+
+    # keys pointing at the table cannot be kept, they would need (id, organization_id)
+    for referencing, name in _fetch(cursor, """
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = to_regclass(%s)
+    """, [table]):
+        cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT {quote(name)}')
+
+    foreign_keys = _fetch(cursor, """
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE contype = 'f' AND conrelid = to_regclass(%s)
+    """, [table])
+    indexes = _fetch(cursor, """
+        SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid), indisunique FROM pg_index
+        WHERE indrelid = to_regclass(%s) AND NOT indisprimary
+    """, [table])
+    triggers = [definition for definition, in _fetch(cursor, """
+        SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal
+    """, [table])]
+    unique = [name for name, definition, is_unique in indexes if is_unique]
+    if unique:
+        raise ValueError(f"Unique indexes of {table} do not hold the partition key: {', '.join(unique)}")
+
+    cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+    cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}')
+    cursor.execute(
+        f'CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY HASH (organization_id)'
+    )
+    for remainder in range(partitions):
+        cursor.execute(
+            f'CREATE TABLE {quote(f"{table}_p{remainder}")} PARTITION OF {quote(table)} '
+            f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+        )
+    cursor.execute(f'ALTER TABLE {quote(table)} ALTER COLUMN organization_id SET NOT NULL')
+    # the identity sequence goes with the old table, new rows draw from a sequence owned by the new one
+    cursor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id')
+    cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+    cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}')
+    cursor.execute(
+        f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {quote(table)}), 0) + 1, false)', [sequence]
+    )
+    # frees the names of the primary key, indexes and constraints
+    cursor.execute(f'DROP TABLE {quote(old_table)}')
+
+    cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, organization_id)')
+    # CREATE INDEX / TRIGGER ... ON [schema.]<old table> ...
+    on_old_table = re.compile(rf' ON ((?:\S+\.)?){re.escape(old_table)} ')
+    for definition in [definition for _, definition, _ in indexes] + triggers:
+        cursor.execute(on_old_table.sub(rf' ON \g<1>{table} ', definition, count=1))
+    for name, definition in foreign_keys:
+        if not is_partitioned(definition.split('REFERENCES ', 1)[1].split('(', 1)[0].strip()):
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+
+
+def partition_tables(partitions):
+    """
+    hash partition the tenant tables that are not partitioned yet, in one transaction;
+    return the names of the tables partitioned
+    """
+    if connection.vendor != 'postgresql':
+        raise ValueError("Declarative partitioning needs PostgreSQL")
+    if partitions < 2:
+        raise ValueError("Partition the tables in 2 partitions at least")
+    missing = {kind: count for kind, count in missing_organization_ids().items() if count}
+    if missing:
+        raise ValueError(
+            f"{', '.join(f'{count} {kind}' for kind, count in missing.items())} have no organization_id, "
+            f"run backfill_organization_ids first"
+        )
+    partitioned = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(table):
+                partition_table(cursor, model, partitions)
+                partitioned.append(table)
+    return partitioned
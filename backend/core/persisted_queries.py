@@ -0,0 +1,144 @@
+"""
+Automatic persisted queries (APQ) and a cache of parsed, validated documents.
+
+Clients send {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": ...}}}
+without the query text; the text is only sent once, after the server answered
+PersistedQueryNotFound. Parsed and validated documents are kept in an
+in-process LRU keyed by the same hash, so known operations skip parse() and
+validate() entirely.
+
+With ALLOW_LIST_ONLY only the operations of the MANIFEST file are executed,
+the manifest is either {"<sha256>": "<query>"} or an Apollo persisted query
+manifest ({"operations": [{"id": "<sha256>", "body": "<query>"}, ...]}).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import GraphQLError, parse, validate
+
+NOT_FOUND = 'PersistedQueryNotFound'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def persisted_query_error(message, code):
+    return GraphQLError(message, extensions={'code': code})
+
+
+class DocumentCache:
+    """
+    Thread safe LRU of hash -> (document, validation errors)
+    """
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def load_manifest(path):
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if 'operations' in manifest:
+        return {operation['id']: operation['body'] for operation in manifest['operations']}
+    return manifest
+
+
+class PersistedQueries:
+    """
+    hash -> query text store (shared cache alias) and document cache
+    """
+
+    def __init__(self, allow_list_only=False, manifest=None, document_cache_size=500, cache_alias='default'):
+        self.allow_list = load_manifest(manifest) if manifest else {}
+        self.allow_list_only = allow_list_only
+        self.documents = DocumentCache(document_cache_size)
+        self.cache_alias = cache_alias
+
+    @property
+    def store(self):
+        return caches[self.cache_alias]
+
+    def _query_text(self, sha256_hash):
+        query = self.allow_list.get(sha256_hash)
+        if query is None and not self.allow_list_only:
+            query = self.store.get(f'apq:{sha256_hash}')
+        return query
+
+    def get_document(self, schema, query, sha256_hash, validation_rules=None, max_errors=None):
+        """
+        return (document, errors) for the query text and/or its hash,
+        raise GraphQLError when the operation can not be resolved or is not allowed
+        """
+        registering = query is not None and sha256_hash is not None
+        if query is not None:
+            computed_hash = query_hash(query)
+            if sha256_hash is not None and sha256_hash != computed_hash:
+                raise persisted_query_error('provided sha does not match query', 'PERSISTED_QUERY_HASH_MISMATCH')
+            sha256_hash = computed_hash
+
+        if self.allow_list_only and sha256_hash not in self.allow_list:
+            raise persisted_query_error(
+                'Operation is not in the persisted query allow-list', 'PERSISTED_QUERY_NOT_ALLOWED'
+            )
+
+        entry = self.documents.get(sha256_hash)
+        if entry is not None:
+            return entry
+
+        if query is None:
+            query = self._query_text(sha256_hash)
+            if query is None:
+                raise persisted_query_error(NOT_FOUND, 'PERSISTED_QUERY_NOT_FOUND')
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            # syntax errors are not cached, they are cheap to reproduce and unbounded
+            return None, [error]
+        if registering and not self.allow_list_only:
+            self.store.set(f'apq:{sha256_hash}', query, timeout=None)
+        errors = validate(schema, document, validation_rules, max_errors)
+        entry = (document, errors)
+        self.documents.set(sha256_hash, entry)
+        return entry
+
+
+_persisted_queries = None
+
+
+def get_persisted_queries():
+    global _persisted_queries
+    if _persisted_queries is None:
+        options = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {})
+        _persisted_queries = PersistedQueries(
+            allow_list_only=options.get('ALLOW_LIST_ONLY', False),
+            manifest=options.get('MANIFEST') or None,
+            document_cache_size=options.get('DOCUMENT_CACHE_SIZE', 500),
+            cache_alias=options.get('CACHE_ALIAS', 'default'),
+        )
+    return _persisted_queries
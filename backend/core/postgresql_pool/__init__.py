@@ -0,0 +1,4 @@
+"""
+PostgreSQL database engine drawing its connections from a per process pool,
+ENGINE = 'core.postgresql_pool' (see base.py).
+"""
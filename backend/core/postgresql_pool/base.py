@@ -0,0 +1,143 @@
+"""
+django.db.backends.postgresql with an in-process connection pool.
+
+Django keeps one connection per thread: CONN_MAX_AGE reuses it across the
+requests of a WSGI worker thread, but an ASGI server runs every request in
+its own thread, which then pays for a new PostgreSQL connection (TCP, TLS,
+authentication, backend fork). With this engine closing a connection hands
+it back to a bounded pool shared by the threads of the process, and
+connecting takes an idle one from it.
+
+Configured with the database's POOL dict (no POOL: plain connections):
+MAX_SIZE connections at most per process and alias, waiting up to TIMEOUT
+seconds for one to be handed back; connections older than MAX_LIFETIME
+seconds are closed instead of reused. With CONN_HEALTH_CHECKS an idle
+connection is pinged before it is handed out. Use it with CONN_MAX_AGE = 0 so
+connections go back to the pool at the end of every request.
+
+A returned connection is rolled back; session state set with SET (other than
+the time zone and role Django sets on every checkout) is not reset.
+"""
+import os
+import threading
+import time
+
+from django.db.backends.postgresql import base
+from psycopg2 import OperationalError, extensions
+
+
+class ConnectionPool:
+    """
+    bounded LIFO pool of psycopg2 connections
+    """
+
+    def __init__(self, max_size=20, timeout=10, max_lifetime=1800, **options):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []  # (connection, isolation level, created at)
+        self._lock = threading.Lock()
+
+    def checkout(self, connect, health_check=False):
+        """
+        (connection, isolation level, created at) of an idle connection,
+        or of connect() when there is none
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f"Connection pool exhausted: {self.max_size} connections in use for {self.timeout}s"
+            )
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    connection, isolation_level = connect()
+                    return connection, isolation_level, time.monotonic()
+                if self._usable(entry, health_check):
+                    return entry
+                self._discard(entry[0])
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def checkin(self, connection, isolation_level, created_at, reusable=True):
+        try:
+            if reusable and connection.closed == 0 and time.monotonic() - created_at < self.max_lifetime:
+                status = connection.info.transaction_status
+                if status in (extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR):
+                    connection.rollback()
+                    status = connection.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_IDLE:
+                    with self._lock:
+                        self._idle.append((connection, isolation_level, created_at))
+                    return
+            self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def _usable(self, entry, health_check):
+        connection, _, created_at = entry
+        if connection.closed or time.monotonic() - created_at >= self.max_lifetime:
+            return False
+        if health_check:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except Exception:
+                return False
+        return True
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    # connections must not cross a fork
+    key = (alias, os.getpid())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**{name.lower(): value for name, value in options.items()})
+        return _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        return get_pool(self.alias, options) if options else None
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        self.pool_entry = None
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        def connect():
+            connection = super(DatabaseWrapper, self).get_new_connection(conn_params)
+            return connection, self.isolation_level
+
+        connection, self.isolation_level, created_at = pool.checkout(connect, self.settings_dict['CONN_HEALTH_CHECKS'])
+        self.pool_entry = (pool, created_at)
+        return connection
+
+    def _close(self):
+        pool_entry = getattr(self, 'pool_entry', None)
+        if self.connection is None or pool_entry is None:
+            return super()._close()
+        self.pool_entry = None
+        pool, created_at = pool_entry
+        # a connection closed inside atomic() stays referenced by this wrapper until the block exits
+        reusable = not self.in_atomic_block and not (self.errors_occurred and not self.is_usable())
+        with self.wrap_database_errors:
+            pool.checkin(self.connection, self.isolation_level, created_at, reusable)
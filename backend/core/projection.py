@@ -0,0 +1,128 @@
+"""
+Column projection of root resolvers from the GraphQL selection.
+
+Projection.from_info() walks the selection set of the current field (through
+fragments and down a path such as ('edges', 'node')) and maps the selected
+fields of a DjangoObjectType onto its model: plain columns go to only(),
+forward relations exposed by the type to select_related() and reverse
+relations to prefetch_related() with their own projection. Fields with a
+custom resolve_* method (counters, loader backed lists) only need the pk,
+which is always fetched.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+
+
+def _selected_fields(info, selection_sets, visited=()):
+    """
+    yield the FieldNodes of selection_sets, fragments flattened
+    """
+    for selection_set in selection_sets:
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection
+            elif isinstance(selection, InlineFragmentNode):
+                yield from _selected_fields(info, [selection.selection_set], visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = info.fragments.get(name)
+                if fragment is not None and name not in visited:
+                    yield from _selected_fields(info, [fragment.selection_set], (*visited, name))
+
+
+def _group(info, selection_sets):
+    """
+    field name -> [selection sets] of every selection of that field
+    """
+    grouped = {}
+    for node in _selected_fields(info, selection_sets):
+        grouped.setdefault(node.name.value, []).append(node.selection_set)
+    return grouped
+
+
+class Projection:
+    """
+    only() / select_related() / prefetch_related() arguments of one queryset
+    """
+
+    def __init__(self, only, select_related=(), prefetch=()):
+        self.only = set(only)
+        self.select_related = set(select_related)
+        self.prefetch = dict(prefetch)  # lookup -> (related model, Projection)
+
+    @property
+    def key(self):
+        """
+        hashable description, part of the query cache arguments of projected results
+        """
+        return (
+            tuple(sorted(self.only)),
+            tuple(sorted(self.select_related)),
+            tuple((lookup, projection.key) for lookup, (model, projection) in sorted(self.prefetch.items())),
+        )
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        for lookup, (model, projection) in sorted(self.prefetch.items()):
+            queryset = queryset.prefetch_related(
+                Prefetch(lookup, queryset=projection.apply(model._default_manager.all()))
+            )
+        return queryset.only(*sorted(self.only))
+
+    @classmethod
+    def from_info(cls, info, path=(), required=()):
+        """
+        projection of the object type found at path below the current field,
+        required: columns needed whatever the selection (ordering, cursors)
+        """
+        graphql_type = get_named_type(info.return_type)
+        selection_sets = [node.selection_set for node in info.field_nodes]
+        for name in path:
+            selection_sets = _group(info, selection_sets).get(name, [])
+            graphql_type = get_named_type(graphql_type.fields[name].type)
+        return cls.for_type(info, graphql_type, selection_sets, required)
+
+    @classmethod
+    def for_type(cls, info, graphql_type, selection_sets, required=()):
+        object_type = graphql_type.graphene_type
+        model = object_type._meta.model
+        only = {model._meta.pk.attname, *required}
+        select_related = set()
+        prefetch = {}
+        for name, nested_sets in _group(info, selection_sets).items():
+            if name not in graphql_type.fields:
+                continue
+            attname = to_snake_case(name)
+            if hasattr(object_type, f'resolve_{attname}'):
+                continue
+            try:
+                field = model._meta.get_field(attname)
+            except FieldDoesNotExist:
+                continue
+            # plain columns, and foreign keys exposed by their id (projectId)
+            if not field.is_relation or attname == getattr(field, 'attname', None):
+                only.add(field.attname)
+                continue
+            nested_type = get_named_type(graphql_type.fields[name].type)
+            nested_meta = getattr(getattr(nested_type, 'graphene_type', None), '_meta', None)
+            if getattr(nested_meta, 'model', None) is None:
+                continue
+            if field.concrete and (field.many_to_one or field.one_to_one):
+                nested = cls.for_type(info, nested_type, nested_sets)
+                only.add(field.name)
+                only.update(f'{attname}__{column}' for column in nested.only)
+                select_related.add(attname)
+                select_related.update(f'{attname}__{lookup}' for lookup in nested.select_related)
+                prefetch.update({f'{attname}__{lookup}': value for lookup, value in nested.prefetch.items()})
+            elif field.one_to_many or field.one_to_one:
+                # reverse relation, the prefetch matches rows on their foreign key
+                nested = cls.for_type(info, nested_type, nested_sets, [field.field.attname])
+                prefetch[attname] = (field.related_model, nested)
+            else:
+                prefetch[attname] = (field.related_model, cls.for_type(info, nested_type, nested_sets))
+        return cls(only, select_related, prefetch)
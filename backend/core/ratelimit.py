@@ -0,0 +1,253 @@
+"""
+Per tenant admission of GraphQL operations.
+
+Before an operation runs, every organization it targets (read from its
+organizationId / projectId / taskId arguments, see core.complexity) must
+have a token in its bucket, refilled at RATE tokens per second up to BURST,
+and fewer than CONCURRENCY operations in flight. Operations selecting a root
+field that targets no organization (organizations) or naming ids that do not
+exist are admitted against the GLOBAL_SCOPE limits as well. A rejected
+operation fails at once with a RATE_LIMITED or TOO_MANY_CONCURRENT_OPERATIONS
+error and its retry_after, served with HTTP 429 and Retry-After, so one
+noisy tenant queues neither behind itself nor in front of the others.
+
+LocalRateLimiter keeps exact buckets per process and drops the ones refilled
+to BURST, no different from a missing bucket, as they pile up.
+CacheRateLimiter shares them through a django.core.cache alias (redis)
+between every worker; there the bucket is approximated by a sliding
+window of BURST operations per BURST / RATE seconds, as the cache only
+offers atomic counters.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from .cache import GLOBAL_SCOPE
+from .complexity import complexity_error
+
+
+def ratelimit_settings():
+    options = getattr(settings, 'GRAPHQL_RATE_LIMIT', {})
+    return {
+        'ENABLED': options.get('ENABLED', True),
+        'RATE': options.get('RATE', 100),
+        'BURST': options.get('BURST', 200),
+        'CONCURRENCY': options.get('CONCURRENCY', 16),
+        'TENANT_LIMITS': options.get('TENANT_LIMITS', {}),
+        'BACKEND': options.get('BACKEND', 'core.ratelimit.LocalRateLimiter'),
+        'CACHE_ALIAS': options.get('CACHE_ALIAS', 'default'),
+    }
+
+
+class RateLimited(Exception):
+
+    def __init__(self, error, retry_after):
+        super().__init__(error.message)
+        self.error = error
+        self.retry_after = retry_after
+
+
+def rate_limited(scope, retry_after):
+    retry_after = round(max(retry_after, 0.001), 3)
+    return RateLimited(complexity_error(
+        f"Rate limit of organization {scope} exceeded, retry in {retry_after:.2f}s", 'RATE_LIMITED',
+        retry_after=retry_after,
+    ), retry_after)
+
+
+def too_many_concurrent(scope, concurrency):
+    return RateLimited(complexity_error(
+        f"Organization {scope} already runs {concurrency} operations, retry shortly",
+        'TOO_MANY_CONCURRENT_OPERATIONS', concurrency=concurrency, retry_after=1,
+    ), 1)
+
+
+class BaseRateLimiter:
+
+    def __init__(self, rate=100, burst=200, concurrency=16, tenant_limits=None, **options):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tenant_limits = {str(scope): limits for scope, limits in (tenant_limits or {}).items()}
+
+    def limits_of(self, scope):
+        """
+        (rate, burst, concurrency) of a scope
+        """
+        limits = self.tenant_limits.get(str(scope), {})
+        return (
+            limits.get('RATE', self.rate),
+            limits.get('BURST', self.burst),
+            limits.get('CONCURRENCY', self.concurrency),
+        )
+
+    def admit(self, scopes):
+        """
+        take a token and an operation slot of every scope, or of none of them;
+        raise RateLimited, return the Admission to release once the operation is done
+        """
+        scopes = sorted({str(scope) for scope in scopes}) or [GLOBAL_SCOPE]
+        acquired = []
+        try:
+            for scope in scopes:
+                self.acquire(scope)
+                acquired.append(scope)
+            self.take_tokens(scopes)
+        except RateLimited:
+            for scope in acquired:
+                self.release(scope)
+            raise
+        return Admission(self, scopes)
+
+
+class Admission:
+
+    def __init__(self, limiter, scopes):
+        self.limiter = limiter
+        self.scopes = scopes
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            for scope in self.scopes:
+                self.limiter.release(scope)
+
+
+class LocalRateLimiter(BaseRateLimiter):
+    """
+    token buckets and in-flight counters of this process
+    """
+
+    # full buckets are dropped once there are this many buckets, or twice as many as left by the last sweep
+    SWEEP_AT = 1000
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._buckets = {}  # scope -> (tokens, updated at)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._sweep_at = 0
+
+    def acquire(self, scope):
+        concurrency = self.limits_of(scope)[2]
+        with self._lock:
+            in_flight = self._in_flight.get(scope, 0)
+            if in_flight >= concurrency:
+                raise too_many_concurrent(scope, concurrency)
+            self._in_flight[scope] = in_flight + 1
+
+    def release(self, scope):
+        with self._lock:
+            in_flight = self._in_flight.get(scope, 0) - 1
+            if in_flight > 0:
+                self._in_flight[scope] = in_flight
+            else:
+                self._in_flight.pop(scope, None)
+
+    def take_tokens(self, scopes):
+        now = time.monotonic()
+        with self._lock:
+            buckets = {}
+            for scope in scopes:
+                rate, burst, _ = self.limits_of(scope)
+                tokens, updated_at = self._buckets.get(scope, (burst, now))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                if tokens < 1:
+                    raise rate_limited(scope, (1 - tokens) / rate)
+                buckets[scope] = (tokens - 1, now)
+            self._buckets.update(buckets)
+            if len(self._buckets) >= max(self.SWEEP_AT, self._sweep_at):
+                self._sweep(now)
+
+    def _sweep(self, now):
+        for scope, (tokens, updated_at) in list(self._buckets.items()):
+            rate, burst, _ = self.limits_of(scope)
+            if tokens + (now - updated_at) * rate >= burst:
+                del self._buckets[scope]
+        self._sweep_at = 2 * len(self._buckets)
+
+
+class CacheRateLimiter(BaseRateLimiter):
+    """
+    windows and in-flight counters shared through a django.core.cache alias
+    """
+
+    # an in-flight counter left behind by a dead worker resets after this many seconds without an acquire
+    IN_FLIGHT_TIMEOUT = 60
+
+    def __init__(self, cache_alias='default', **options):
+        super().__init__(**options)
+        self.cache_alias = cache_alias
+
+    @property
+    def store(self):
+        return caches[self.cache_alias]
+
+    def _incr(self, key, timeout):
+        self.store.add(key, 0, timeout=timeout)
+        try:
+            return self.store.incr(key)
+        except ValueError:
+            # expired between add() and incr()
+            self.store.set(key, 1, timeout=timeout)
+            return 1
+
+    def _decr(self, key):
+        try:
+            if self.store.decr(key) < 0:
+                # the key expired and came back while its operations were in flight, never count below 0
+                self.store.incr(key)
+        except ValueError:
+            pass
+
+    def acquire(self, scope):
+        concurrency = self.limits_of(scope)[2]
+        key = f'ratelimit:inflight:{scope}'
+        in_flight = self._incr(key, self.IN_FLIGHT_TIMEOUT)
+        # incr() keeps the expiry set by add(), the counter lives on while operations keep coming
+        self.store.touch(key, self.IN_FLIGHT_TIMEOUT)
+        if in_flight > concurrency:
+            self._decr(key)
+            raise too_many_concurrent(scope, concurrency)
+
+    def release(self, scope):
+        self._decr(f'ratelimit:inflight:{scope}')
+
+    def take_tokens(self, scopes):
+        now = time.time()
+        taken = []
+        try:
+            for scope in scopes:
+                rate, burst, _ = self.limits_of(scope)
+                window = burst / rate
+                index, elapsed = divmod(now, window)
+                key = f'ratelimit:{scope}:{int(index)}'
+                count = self._incr(key, int(2 * window) + 1)
+                taken.append(key)
+                previous = self.store.get(f'ratelimit:{scope}:{int(index) - 1}', 0)
+                # the previous window's operations still count for the part of it the sliding window covers
+                if previous * (1 - elapsed / window) + count > burst:
+                    raise rate_limited(scope, window - elapsed if count > burst else 1 / rate)
+        except RateLimited:
+            for key in taken:
+                self._decr(key)
+            raise
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        options = ratelimit_settings()
+        backend_class = import_string(options['BACKEND'])
+        _rate_limiter = backend_class(
+            rate=options['RATE'], burst=options['BURST'], concurrency=options['CONCURRENCY'],
+            tenant_limits=options['TENANT_LIMITS'], cache_alias=options['CACHE_ALIAS'],
+        )
+    return _rate_limiter
@@ -0,0 +1,123 @@
+"""
+Read replica routing.
+
+GraphQL query operations read from a replica: the GraphQL views enter
+read_from() around their execution with the alias picked by replica_for().
+Everything else (mutations, reads inside a transaction, admin, commands)
+stays on the primary `default` database.
+
+Read-your-writes: a mutation marks the request and
+ReplicaStickinessMiddleware answers with a short-lived cookie; while it is
+sent back the client's queries read from the primary, until replicas have
+caught up (STICKY_SECONDS, the replication lag bound). The query cache does
+not store results read from a replica in that window after an invalidation
+either (see core/cache.py).
+
+Large tenants are pinned to dedicated replicas with TENANT_DATABASES, a dict
+organization id -> [aliases] or the dotted path of a function taking an
+organization id and returning its aliases (or None for the shared replicas).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+_read_database = ContextVar('read_database', default=None)
+
+
+def routing_settings():
+    options = getattr(settings, 'DATABASE_ROUTING', {})
+    return {
+        'REPLICAS': options.get('REPLICAS', []),
+        'TENANT_DATABASES': options.get('TENANT_DATABASES', {}),
+        'STICKY_SECONDS': options.get('STICKY_SECONDS', 5),
+        'STICKY_COOKIE': options.get('STICKY_COOKIE', 'db_primary'),
+    }
+
+
+def tenant_databases(organization_id, option=None):
+    option = routing_settings()['TENANT_DATABASES'] if option is None else option
+    if isinstance(option, str):
+        return import_string(option)(organization_id)
+    return option.get(organization_id)
+
+
+def replica_for(organization_ids=()):
+    """
+    alias an operation on organization_ids reads from, None for the primary;
+    the tenant's dedicated replicas when every organization shares them
+    """
+    options = routing_settings()
+    pool = options['REPLICAS']
+    if organization_ids and options['TENANT_DATABASES']:
+        pools = {tuple(tenant_databases(pk, options['TENANT_DATABASES']) or ()) for pk in organization_ids}
+        if len(pools) == 1 and () not in pools:
+            pool = pools.pop()
+    return random.choice(pool) if pool else None
+
+
+def reading_from_replica():
+    return _read_database.get() is not None
+
+
+@contextmanager
+def read_from(alias):
+    """
+    route the reads of the block to alias (None: the primary)
+    """
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def is_sticky(request):
+    return routing_settings()['STICKY_COOKIE'] in request.COOKIES
+
+
+def mark_written(request):
+    request.database_written = True
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = _read_database.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are declared as test mirrors of the primary and follow its schema
+        if connections.settings[db].get('TEST', {}).get('MIRROR'):
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """
+    sends the read-from-primary cookie after a request that wrote
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, 'database_written', False):
+            options = routing_settings()
+            response.set_cookie(
+                options['STICKY_COOKIE'], '1', max_age=options['STICKY_SECONDS'], httponly=True, samesite='Lax'
+            )
+        return response
@@ -1,6 +1,17 @@
 import graphene
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from graphene_django import DjangoObjectType
-from .models import Organizations, Projects, Tasks, TaskComment
+from graphql import GraphQLError
+from . import activity, bulk, counters, search, subscriptions, sync
+from .cache import GLOBAL_SCOPE, get_query_cache
+from .filters import filter_tasks, task_order
+from .loaders import get_loaders, load
+from .models import ActivityEntry, Organizations, Projects, Tasks, TaskComment
+from .pagination import apaginate, connection_from_page, paginate
+from .projection import Projection
+from .stats import read_project_stats
 
 # GraphQL Types
 class OrganizationType(DjangoObjectType):
@@ -13,35 +24,140 @@ class ProjectType(DjangoObjectType):
     task_count = graphene.Int()
     completed_tasks_count = graphene.Int()
     completion_rate = graphene.Float()
+    tasks = graphene.List(lambda: TaskType)
 
     class Meta:
         model = Projects
-        fields = ('id', 'name', 'description', 'status', 'due_date', 'created_at')
+        fields = ('id', 'name', 'description', 'status', 'due_date', 'created_at', 'updated_at')
 
+    # counters and nested lists go through the per-request loaders (see core/loaders.py)
     def resolve_task_count(self, info):
-        return self.task_count
+        return load(info, get_loaders(info).project_counters, self.id, 'task_count')
 
     def resolve_completed_tasks_count(self, info):
-        return self.completed_tasks_count
+        return load(info, get_loaders(info).project_counters, self.id, 'completed_tasks_count')
 
     def resolve_completion_rate(self, info):
-        return self.completion_rate
+        return load(info, get_loaders(info).project_counters, self.id, 'completion_rate')
+
+    def resolve_tasks(self, info):
+        return load(info, get_loaders(info).project_tasks, self.id)
 
 
 class TaskType(DjangoObjectType):
+    project_id = graphene.Int()
+    comments = graphene.List(lambda: TaskCommentType)
+
     class Meta:
         model = Tasks
-        fields = ('id', 'title', 'description', 'status', 'assignee_email', 'due_date', 'created_at')
+        fields = ('id', 'title', 'description', 'status', 'assignee_email', 'due_date', 'created_at', 'updated_at')
+
+    def resolve_comments(self, info):
+        return load(info, get_loaders(info).task_comments, self.id)
 
 
 class TaskCommentType(DjangoObjectType):
+    task_id = graphene.Int()
+
     class Meta:
         model = TaskComment
-        fields = ('id', 'content', 'author_email', 'created_at')
+        fields = ('id', 'content', 'author_email', 'created_at', 'updated_at')
+
+
+class ActivityEntryType(DjangoObjectType):
+    """
+    changes: new values of a created object, [old, new] of each changed field of an updated one
+    """
+    kind = graphene.String()
+    action = graphene.String()
+
+    class Meta:
+        model = ActivityEntry
+        fields = ('id', 'object_id', 'actor', 'changes', 'created_at')
+
+    def resolve_kind(self, info):
+        return activity.KIND_NAMES[self.kind]
+
+    def resolve_action(self, info):
+        return activity.ACTION_NAMES[self.action]
+
+
+# Relay connections, paginated with keyset cursors (see core/pagination.py)
+class ProjectConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProjectType
+
+
+class TaskConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskType
+
+
+class TaskCommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = TaskCommentType
+
+
+class ActivityEntryConnection(graphene.relay.Connection):
+    class Meta:
+        node = ActivityEntryType
+
+
+# Search (see core/search.py)
+class SearchResultType(graphene.ObjectType):
+    """
+    one search match, the field of its kind is set
+    """
+    kind = graphene.String()
+    rank = graphene.Float()
+    project = graphene.Field(ProjectType)
+    task = graphene.Field(TaskType)
+    comment = graphene.Field(TaskCommentType)
+
+    def resolve_project(self, info):
+        return self.instance if self.kind == search.PROJECT else None
+
+    def resolve_task(self, info):
+        return self.instance if self.kind == search.TASK else None
+
+    def resolve_comment(self, info):
+        return self.instance if self.kind == search.COMMENT else None
+
+
+class SearchResultConnection(graphene.relay.Connection):
+    class Meta:
+        node = SearchResultType
+
+
+# Incremental sync (see core/sync.py)
+class TombstoneType(graphene.ObjectType):
+    """
+    a project, task or comment removed (deleted or archived)
+    """
+    kind = graphene.String()
+    id = graphene.Int()
+    deleted_at = graphene.DateTime()
+
+    def resolve_id(self, info):
+        return self.object_id
+
+
+class ChangesType(graphene.ObjectType):
+    """
+    one page of changes, oldest first; query again with cursor while has_more,
+    then keep cursor for the next sync (see core/sync.py)
+    """
+    projects = graphene.List(ProjectType)
+    tasks = graphene.List(TaskType)
+    comments = graphene.List(TaskCommentType)
+    deleted = graphene.List(TombstoneType)
+    cursor = graphene.String()
+    has_more = graphene.Boolean()
 
 
 # Project Statistics Type
 class ProjectStatsType(graphene.ObjectType):
+    organization_id = graphene.Int()
     total_projects = graphene.Int()
     active_projects = graphene.Int()
     completed_projects = graphene.Int()
@@ -57,59 +173,204 @@ class Query(graphene.ObjectType):
     organization = graphene.Field(OrganizationType, id=graphene.Int())
 
     # Project queries
-    projects = graphene.List(ProjectType, organization_id=graphene.Int(required=True))
+    projects = graphene.relay.ConnectionField(ProjectConnection, organization_id=graphene.Int(required=True))
     project = graphene.Field(ProjectType, id=graphene.Int(required=True))
 
     # Task queries
-    tasks = graphene.List(TaskType, project_id=graphene.Int(required=True))
+    tasks = graphene.relay.ConnectionField(
+        TaskConnection,
+        organization_id=graphene.Int(),
+        project_id=graphene.Int(),
+        status=graphene.List(graphene.NonNull(graphene.String)),
+        assignee_email=graphene.String(),
+        due_after=graphene.DateTime(),
+        due_before=graphene.DateTime(),
+        order_by=graphene.String(),
+    )
     task = graphene.Field(TaskType, id=graphene.Int(required=True))
 
     # Comment queries
-    task_comments = graphene.List(TaskCommentType, task_id=graphene.Int(required=True))
+    task_comments = graphene.relay.ConnectionField(TaskCommentConnection, task_id=graphene.Int(required=True))
+
+    # Search
+    search = graphene.relay.ConnectionField(
+        SearchResultConnection,
+        organization_id=graphene.Int(required=True),
+        query=graphene.String(required=True),
+        kinds=graphene.List(graphene.NonNull(graphene.String)),
+    )
 
     # Statistics
     project_stats = graphene.Field(ProjectStatsType, organization_id=graphene.Int(required=True))
-
+    organizations_project_stats = graphene.List(
+        ProjectStatsType,
+        organization_ids=graphene.List(graphene.NonNull(graphene.Int), required=True)
+    )
+
+    # Activity log, newest first; kind: project, task or comment
+    activity_feed = graphene.relay.ConnectionField(
+        ActivityEntryConnection,
+        organization_id=graphene.Int(required=True),
+        kind=graphene.String(),
+        object_id=graphene.Int(),
+    )
+
+    # Incremental sync
+    changes_since = graphene.Field(
+        ChangesType, organization_id=graphene.Int(required=True), cursor=graphene.String(), first=graphene.Int()
+    )
+
+    # results are cached per organization, see core/cache.py;
+    # only the selected columns are fetched (core/projection.py) so they are part of the cache arguments
     def resolve_organizations(self, info):
-        return Organizations.objects.all()
+        projection = Projection.from_info(info)
+        return get_query_cache().fetch(
+            GLOBAL_SCOPE, 'organizations', {'fields': projection.key},
+            lambda: list(projection.apply(Organizations.objects.all()))
+        )
 
     def resolve_organization(self, info, id):
-        return Organizations.objects.get(id=id)
+        projection = Projection.from_info(info)
+        return get_query_cache().fetch(
+            id, 'organization', {'id': id, 'fields': projection.key},
+            lambda: projection.apply(Organizations.objects.all()).get(id=id)
+        )
 
-    def resolve_projects(self, info, organization_id):
-        return Projects.objects.filter(organization_id=organization_id)
+    def resolve_projects(self, info, organization_id, **page):
+        projection = Projection.from_info(info, ('edges', 'node'), ['created_at'])
+        cached_page = get_query_cache().fetch(
+            organization_id, 'projects', {'organization_id': organization_id, 'fields': projection.key, **page},
+            lambda: paginate(projection.apply(Projects.objects.filter(organization_id=organization_id)), **page)
+        )
+        connection = connection_from_page(ProjectConnection, cached_page)
+        get_loaders(info).queue_projects(edge.node for edge in connection.edges)
+        return connection
 
     def resolve_project(self, info, id):
-        return Projects.objects.get(id=id)
+        query_cache = get_query_cache()
+        projection = Projection.from_info(info)
+        return query_cache.fetch(
+            query_cache.organization_of_project(id), 'project', {'id': id, 'fields': projection.key},
+            lambda: projection.apply(Projects.objects.all()).get(id=id)
+        )
 
-    def resolve_tasks(self, info, project_id):
-        return Tasks.objects.filter(project_id=project_id)
+    # filters and orders are described in core/filters.py
+    def resolve_tasks(self, info, order_by=None, first=None, after=None, last=None, before=None, **filters):
+        query_cache = get_query_cache()
+        order = task_order(order_by)
+        projection = Projection.from_info(info, ('edges', 'node'), [order.field])
+        queryset = filter_tasks(projection.apply(Tasks.objects.all()), **filters)
+        scope = filters.get('organization_id')
+        if scope is None:
+            scope = query_cache.organization_of_project(filters['project_id'])
+        page = {'first': first, 'after': after, 'last': last, 'before': before}
+        cached_page = query_cache.fetch(
+            scope, 'tasks', {'order_by': order_by, 'fields': projection.key, **filters, **page},
+            lambda: paginate(queryset, order=order, **page)
+        )
+        connection = connection_from_page(TaskConnection, cached_page, order.cursor)
+        get_loaders(info).queue_tasks(edge.node for edge in connection.edges)
+        return connection
 
     def resolve_task(self, info, id):
-        return Tasks.objects.get(id=id)
+        query_cache = get_query_cache()
+        projection = Projection.from_info(info)
+        return query_cache.fetch(
+            query_cache.organization_of_task(id), 'task', {'id': id, 'fields': projection.key},
+            lambda: projection.apply(Tasks.objects.all()).get(id=id)
+        )
 
-    def resolve_task_comments(self, info, task_id):
-        return TaskComment.objects.filter(task_id=task_id)
+    def resolve_task_comments(self, info, task_id, **page):
+        query_cache = get_query_cache()
+        projection = Projection.from_info(info, ('edges', 'node'), ['created_at'])
+        cached_page = query_cache.fetch(
+            query_cache.organization_of_task(task_id), 'task_comments',
+            {'task_id': task_id, 'fields': projection.key, **page},
+            lambda: paginate(projection.apply(TaskComment.objects.filter(task_id=task_id)), **page)
+        )
+        return connection_from_page(TaskCommentConnection, cached_page)
+
+    def resolve_search(self, info, organization_id, query, kinds=None, **page):
+        arguments = search_arguments(organization_id, query, kinds, **page)
+        projections = search_projections(info)
+        page = get_query_cache().fetch(
+            organization_id, 'search', {**arguments, 'fields': search_projection_keys(projections)},
+            lambda: search.get_search_engine().search(**arguments, projections=projections)
+        )
+        return search_connection(info, page)
 
     def resolve_project_stats(self, info, organization_id):
-        projects = Projects.objects.filter(organization_id=organization_id)
-        tasks = Tasks.objects.filter(project__organization_id=organization_id)
-        completed_tasks = tasks.filter(status='DONE')
-
-        total_tasks_count = tasks.count()
-        completed_tasks_count = completed_tasks.count()
-
-        return ProjectStatsType(
-            total_projects=projects.count(),
-            active_projects=projects.filter(status='ACTIVE').count(),
-            completed_projects=projects.filter(status='COMPLETED').count(),
-            total_tasks=total_tasks_count,
-            completed_tasks=completed_tasks_count,
-            overall_completion_rate=(
-                (completed_tasks_count / total_tasks_count) * 100
-                if total_tasks_count > 0 else 0
-            )
+        stats = get_query_cache().fetch_many('project_stats', {organization_id: {}}, read_project_stats)
+        return ProjectStatsType(**stats[organization_id])
+
+    def resolve_organizations_project_stats(self, info, organization_ids):
+        stats = get_query_cache().fetch_many(
+            'project_stats', {organization_id: {} for organization_id in organization_ids}, read_project_stats
         )
+        return [ProjectStatsType(**stats[organization_id]) for organization_id in dict.fromkeys(organization_ids)]
+
+    # not cached: entries are written after the commit that invalidates the organization's results
+    def resolve_activity_feed(self, info, organization_id, kind=None, object_id=None, **page):
+        projection = Projection.from_info(info, ('edges', 'node'), ACTIVITY_REQUIRED_FIELDS)
+        entries = projection.apply(activity.feed(organization_id, kind, object_id))
+        return connection_from_page(ActivityEntryConnection, paginate(entries, **page))
+
+    # not cached, every cursor is a new range and a page costs a few index range scans
+    def resolve_changes_since(self, info, organization_id, cursor=None, first=None):
+        return changes_type(info, sync.changes_since(organization_id, cursor, first, changes_projections(info)))
+
+
+# the cursor column and the codes resolve_kind / resolve_action name
+ACTIVITY_REQUIRED_FIELDS = ['created_at', 'kind', 'action']
+
+
+def changes_projections(info):
+    return {
+        sync.PROJECT: Projection.from_info(info, ('projects',), ['updated_at']),
+        sync.TASK: Projection.from_info(info, ('tasks',), ['updated_at', 'project_id']),
+        sync.COMMENT: Projection.from_info(info, ('comments',), ['updated_at', 'task_id']),
+    }
+
+
+def changes_type(info, changes):
+    loaders = get_loaders(info)
+    loaders.queue_projects(changes['projects'])
+    loaders.queue_tasks(changes['tasks'])
+    return ChangesType(**changes)
+
+
+def search_arguments(organization_id, query, kinds=None, first=None, after=None, last=None, before=None):
+    if last is not None or before:
+        raise GraphQLError("search is paginated forward only, use first and after")
+    unknown = set(kinds or ()) - set(search.KINDS)
+    if unknown:
+        raise GraphQLError(f"Unknown search kinds: {', '.join(sorted(unknown))}")
+    return {
+        'organization_id': organization_id, 'query': query,
+        'kinds': tuple(kinds) if kinds else None, 'first': first, 'after': after,
+    }
+
+
+SEARCH_RESULT_FIELDS = {search.PROJECT: 'project', search.TASK: 'task', search.COMMENT: 'comment'}
+
+
+def search_projections(info):
+    return {
+        kind: Projection.from_info(info, ('edges', 'node', field))
+        for kind, field in SEARCH_RESULT_FIELDS.items()
+    }
+
+
+def search_projection_keys(projections):
+    return tuple((kind, projection.key) for kind, projection in projections.items())
+
+
+def search_connection(info, page):
+    results = page[0]
+    loaders = get_loaders(info)
+    loaders.queue_projects(result.instance for result in results if result.kind == search.PROJECT)
+    loaders.queue_tasks(result.instance for result in results if result.kind == search.TASK)
+    return connection_from_page(SearchResultConnection, page, search.encode_cursor)
 
 
 # Mutation Input Types
@@ -152,6 +413,14 @@ class CreateTaskCommentInput(graphene.InputObjectType):
 
 
 # Mutations
+def validate_changes(instance, changed):
+    """
+    validate the changed fields of instance (e.g. status against its choices), raise ValidationError
+    """
+    exclude = [field.name for field in instance._meta.fields if field.attname not in changed]
+    instance.full_clean(exclude=exclude, validate_unique=False)
+
+
 class CreateProject(graphene.Mutation):
     class Arguments:
         input = CreateProjectInput(required=True)
@@ -163,12 +432,16 @@ class CreateProject(graphene.Mutation):
     def mutate(self, info, input):
         try:
             organization = Organizations.objects.get(id=input.organization_id)
-            project = Projects.objects.create(
-                organization=organization,
-                name=input.name,
-                description=input.get('description', ''),
-                due_date=input.get('due_date')
-            )
+            with transaction.atomic():
+                project = Projects.objects.create(
+                    organization=organization,
+                    name=input.name,
+                    description=input.get('description', ''),
+                    due_date=input.get('due_date')
+                )
+                counters.project_created(project)
+                get_query_cache().invalidate_on_commit(project.organization_id)
+                activity.projects_created([project], project.organization_id, activity.actor_of(info.context))
             return CreateProject(project=project, success=True, errors=[])
         except Organizations.DoesNotExist:
             return CreateProject(project=None, success=False, errors=["Organization not found"])
@@ -186,21 +459,36 @@ class UpdateProject(graphene.Mutation):
 
     def mutate(self, info, input):
         try:
-            project = Projects.objects.get(id=input.id)
-
-            if input.get('name'):
-                project.name = input.name
-            if input.get('description') is not None:
-                project.description = input.description
-            if input.get('status'):
-                project.status = input.status
-            if input.get('due_date') is not None:
-                project.due_date = input.due_date
-
-            project.save()
+            # row lock keeps the old status stable until the counters are bumped
+            with transaction.atomic():
+                project = Projects.objects.select_for_update().get(id=input.id)
+                old_status = project.status
+                previous = activity.snapshot(project, activity.PROJECT_FIELDS)
+
+                if input.get('name'):
+                    project.name = input.name
+                if input.get('description') is not None:
+                    project.description = input.description
+                if input.get('status'):
+                    project.status = input.status
+                if input.get('due_date') is not None:
+                    project.due_date = input.due_date
+
+                changed = activity.changed_fields(project, previous)
+                if changed:
+                    validate_changes(project, changed)
+                    # only the changed columns are written
+                    project.save(update_fields=[*changed, 'updated_at'])
+                    counters.project_status_changed(project, old_status)
+                    get_query_cache().invalidate_on_commit(project.organization_id)
+                    activity.projects_updated(
+                        [(project, previous)], project.organization_id, activity.actor_of(info.context)
+                    )
             return UpdateProject(project=project, success=True, errors=[])
         except Projects.DoesNotExist:
             return UpdateProject(project=None, success=False, errors=["Project not found"])
+        except ValidationError as e:
+            return UpdateProject(project=None, success=False, errors=bulk.validation_messages(e))
         except Exception as e:
             return UpdateProject(project=None, success=False, errors=[str(e)])
 
@@ -216,13 +504,19 @@ class CreateTask(graphene.Mutation):
     def mutate(self, info, input):
         try:
             project = Projects.objects.get(id=input.project_id)
-            task = Tasks.objects.create(
-                project=project,
-                title=input.title,
-                description=input.get('description', ''),
-                assignee_email=input.get('assignee_email', ''),
-                due_date=input.get('due_date')
-            )
+            with transaction.atomic():
+                task = Tasks.objects.create(
+                    project=project,
+                    organization_id=project.organization_id,
+                    title=input.title,
+                    description=input.get('description', ''),
+                    assignee_email=input.get('assignee_email', ''),
+                    due_date=input.get('due_date')
+                )
+                counters.task_created(task)
+                get_query_cache().invalidate_on_commit(project.organization_id)
+                subscriptions.tasks_created([task], project.organization_id)
+                activity.tasks_created([task], project.organization_id, activity.actor_of(info.context))
             return CreateTask(task=task, success=True, errors=[])
         except Projects.DoesNotExist:
             return CreateTask(task=None, success=False, errors=["Project not found"])
@@ -240,23 +534,39 @@ class UpdateTask(graphene.Mutation):
 
     def mutate(self, info, input):
         try:
-            task = Tasks.objects.get(id=input.id)
-
-            if input.get('title'):
-                task.title = input.title
-            if input.get('description') is not None:
-                task.description = input.description
-            if input.get('status'):
-                task.status = input.status
-            if input.get('assignee_email') is not None:
-                task.assignee_email = input.assignee_email
-            if input.get('due_date') is not None:
-                task.due_date = input.due_date
-
-            task.save()
+            # row lock keeps the old status stable until the counters are bumped
+            with transaction.atomic():
+                task = Tasks.objects.select_for_update().get(id=input.id)
+                old_status = task.status
+                previous = activity.snapshot(task, activity.TASK_FIELDS)
+
+                if input.get('title'):
+                    task.title = input.title
+                if input.get('description') is not None:
+                    task.description = input.description
+                if input.get('status'):
+                    task.status = input.status
+                if input.get('assignee_email') is not None:
+                    task.assignee_email = input.assignee_email
+                if input.get('due_date') is not None:
+                    task.due_date = input.due_date
+
+                changed = activity.changed_fields(task, previous)
+                if changed:
+                    validate_changes(task, changed)
+                    # only the changed columns are written
+                    task.save(update_fields=[*changed, 'updated_at'])
+                    counters.task_status_changed(task, old_status)
+                    query_cache = get_query_cache()
+                    organization_id = task.organization_id or query_cache.organization_of_project(task.project_id)
+                    query_cache.invalidate_on_commit(organization_id)
+                    subscriptions.tasks_updated([(task, changed)], organization_id)
+                    activity.tasks_updated([(task, previous)], organization_id, activity.actor_of(info.context))
             return UpdateTask(task=task, success=True, errors=[])
         except Tasks.DoesNotExist:
             return UpdateTask(task=None, success=False, errors=["Task not found"])
+        except ValidationError as e:
+            return UpdateTask(task=None, success=False, errors=bulk.validation_messages(e))
         except Exception as e:
             return UpdateTask(task=None, success=False, errors=[str(e)])
 
@@ -272,11 +582,18 @@ class CreateTaskComment(graphene.Mutation):
     def mutate(self, info, input):
         try:
             task = Tasks.objects.get(id=input.task_id)
-            comment = TaskComment.objects.create(
-                task=task,
-                content=input.content,
-                author_email=input.author_email
-            )
+            query_cache = get_query_cache()
+            organization_id = task.organization_id or query_cache.organization_of_project(task.project_id)
+            with transaction.atomic():
+                comment = TaskComment.objects.create(
+                    task=task,
+                    organization_id=organization_id,
+                    content=input.content,
+                    author_email=input.author_email
+                )
+                query_cache.invalidate_on_commit(organization_id)
+                subscriptions.comments_created([comment], {task.id: task.project_id}, organization_id)
+                activity.comments_created([comment], organization_id, activity.actor_of(info.context))
             return CreateTaskComment(comment=comment, success=True, errors=[])
         except Tasks.DoesNotExist:
             return CreateTaskComment(comment=None, success=False, errors=["Task not found"])
@@ -284,13 +601,268 @@ class CreateTaskComment(graphene.Mutation):
             return CreateTaskComment(comment=None, success=False, errors=[str(e)])
 
 
+# Bulk mutations, scoped to one organization (see core/bulk.py)
+class BulkItemErrorType(graphene.ObjectType):
+    index = graphene.Int()
+    messages = graphene.List(graphene.String)
+
+
+def item_error_types(item_errors):
+    return [BulkItemErrorType(index=index, messages=messages) for index, messages in item_errors]
+
+
+class BulkCreateTasks(graphene.Mutation):
+    class Arguments:
+        organization_id = graphene.Int(required=True)
+        tasks = graphene.List(graphene.NonNull(CreateTaskInput), required=True)
+
+    tasks = graphene.List(TaskType)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+    item_errors = graphene.List(BulkItemErrorType)
+
+    def mutate(self, info, organization_id, tasks):
+        try:
+            created, item_errors = bulk.create_tasks(organization_id, tasks, activity.actor_of(info.context))
+            return BulkCreateTasks(
+                tasks=created, success=not item_errors, errors=[], item_errors=item_error_types(item_errors)
+            )
+        except Exception as e:
+            return BulkCreateTasks(tasks=[], success=False, errors=[str(e)], item_errors=[])
+
+
+class BulkUpdateTasks(graphene.Mutation):
+    class Arguments:
+        organization_id = graphene.Int(required=True)
+        tasks = graphene.List(graphene.NonNull(UpdateTaskInput), required=True)
+
+    tasks = graphene.List(TaskType)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+    item_errors = graphene.List(BulkItemErrorType)
+
+    def mutate(self, info, organization_id, tasks):
+        try:
+            updated, item_errors = bulk.update_tasks(organization_id, tasks, activity.actor_of(info.context))
+            return BulkUpdateTasks(
+                tasks=updated, success=not item_errors, errors=[], item_errors=item_error_types(item_errors)
+            )
+        except Exception as e:
+            return BulkUpdateTasks(tasks=[], success=False, errors=[str(e)], item_errors=[])
+
+
+class BulkCreateTaskComments(graphene.Mutation):
+    class Arguments:
+        organization_id = graphene.Int(required=True)
+        comments = graphene.List(graphene.NonNull(CreateTaskCommentInput), required=True)
+
+    comments = graphene.List(TaskCommentType)
+    success = graphene.Boolean()
+    errors = graphene.List(graphene.String)
+    item_errors = graphene.List(BulkItemErrorType)
+
+    def mutate(self, info, organization_id, comments):
+        try:
+            created, item_errors = bulk.create_task_comments(
+                organization_id, comments, activity.actor_of(info.context)
+            )
+            return BulkCreateTaskComments(
+                comments=created, success=not item_errors, errors=[], item_errors=item_error_types(item_errors)
+            )
+        except Exception as e:
+            return BulkCreateTaskComments(comments=[], success=False, errors=[str(e)], item_errors=[])
+
+
+# Subscription payloads: deltas of the changed objects, served over websocket (see core/websocket.py)
+class TaskDeltaType(graphene.ObjectType):
+    """
+    id, project and updated_at of a task plus its changed fields (every field on creation),
+    the other fields are null; dates are ISO 8601 strings
+    """
+    id = graphene.ID()
+    project_id = graphene.Int()
+    title = graphene.String()
+    description = graphene.String()
+    status = graphene.String()
+    assignee_email = graphene.String()
+    due_date = graphene.String()
+    created_at = graphene.String()
+    updated_at = graphene.String()
+
+
+class TaskEventType(graphene.ObjectType):
+    kind = graphene.String()
+    organization_id = graphene.Int()
+    project_id = graphene.Int()
+    changed_fields = graphene.List(graphene.String)
+    task = graphene.Field(TaskDeltaType)
+
+
+class CommentDeltaType(graphene.ObjectType):
+    id = graphene.ID()
+    task_id = graphene.Int()
+    content = graphene.String()
+    author_email = graphene.String()
+    created_at = graphene.String()
+
+
+class CommentEventType(graphene.ObjectType):
+    organization_id = graphene.Int()
+    project_id = graphene.Int()
+    task_id = graphene.Int()
+    comment = graphene.Field(CommentDeltaType)
+
+
+def subscription_topic(kind, organization_id=None, project_id=None, task_id=None):
+    # the narrowest scope given wins
+    if task_id is not None:
+        return subscriptions.task_topic(task_id, kind)
+    if project_id is not None:
+        return subscriptions.project_topic(project_id, kind)
+    if organization_id is not None:
+        return subscriptions.organization_topic(organization_id, kind)
+    raise GraphQLError("Pass an organizationId, projectId or taskId")
+
+
+class Subscription(graphene.ObjectType):
+    task_changed = graphene.Field(TaskEventType, organization_id=graphene.Int(), project_id=graphene.Int())
+    comment_added = graphene.Field(
+        CommentEventType, organization_id=graphene.Int(), project_id=graphene.Int(), task_id=graphene.Int()
+    )
+
+    # plain functions returning the event stream, so argument errors are raised on subscribe
+    def subscribe_task_changed(root, info, organization_id=None, project_id=None):
+        return subscriptions.get_broker().subscribe([subscription_topic('tasks', organization_id, project_id)])
+
+    def subscribe_comment_added(root, info, organization_id=None, project_id=None, task_id=None):
+        return subscriptions.get_broker().subscribe(
+            [subscription_topic('comments', organization_id, project_id, task_id)]
+        )
+
+
 class Mutation(graphene.ObjectType):
     create_project = CreateProject.Field()
     update_project = UpdateProject.Field()
     create_task = CreateTask.Field()
     update_task = UpdateTask.Field()
     create_task_comment = CreateTaskComment.Field()
+    bulk_create_tasks = BulkCreateTasks.Field()
+    bulk_update_tasks = BulkUpdateTasks.Field()
+    bulk_create_task_comments = BulkCreateTaskComments.Field()
+
+
+async def _alist(queryset):
+    return [instance async for instance in queryset]
+
+
+class AsyncQuery(Query):
+    """
+    Query with async resolvers on the Django async ORM, served by AsyncGraphQLView;
+    sibling fields are resolved concurrently and share the same cache entries as Query
+    """
+
+    class Meta:
+        name = 'Query'
+
+    async def resolve_organizations(self, info):
+        projection = Projection.from_info(info)
+        return await get_query_cache().afetch(
+            GLOBAL_SCOPE, 'organizations', {'fields': projection.key},
+            lambda: _alist(projection.apply(Organizations.objects.all()))
+        )
+
+    async def resolve_organization(self, info, id):
+        projection = Projection.from_info(info)
+        return await get_query_cache().afetch(
+            id, 'organization', {'id': id, 'fields': projection.key},
+            lambda: projection.apply(Organizations.objects.all()).aget(id=id)
+        )
+
+    async def resolve_projects(self, info, organization_id, **page):
+        projection = Projection.from_info(info, ('edges', 'node'), ['created_at'])
+        cached_page = await get_query_cache().afetch(
+            organization_id, 'projects', {'organization_id': organization_id, 'fields': projection.key, **page},
+            lambda: apaginate(projection.apply(Projects.objects.filter(organization_id=organization_id)), **page)
+        )
+        connection = connection_from_page(ProjectConnection, cached_page)
+        get_loaders(info).queue_projects(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_project(self, info, id):
+        query_cache = get_query_cache()
+        projection = Projection.from_info(info)
+        return await query_cache.afetch(
+            await query_cache.aorganization_of_project(id), 'project', {'id': id, 'fields': projection.key},
+            lambda: projection.apply(Projects.objects.all()).aget(id=id)
+        )
+
+    async def resolve_tasks(self, info, order_by=None, first=None, after=None, last=None, before=None, **filters):
+        query_cache = get_query_cache()
+        order = task_order(order_by)
+        projection = Projection.from_info(info, ('edges', 'node'), [order.field])
+        queryset = filter_tasks(projection.apply(Tasks.objects.all()), **filters)
+        scope = filters.get('organization_id')
+        if scope is None:
+            scope = await query_cache.aorganization_of_project(filters['project_id'])
+        page = {'first': first, 'after': after, 'last': last, 'before': before}
+        cached_page = await query_cache.afetch(
+            scope, 'tasks', {'order_by': order_by, 'fields': projection.key, **filters, **page},
+            lambda: apaginate(queryset, order=order, **page)
+        )
+        connection = connection_from_page(TaskConnection, cached_page, order.cursor)
+        get_loaders(info).queue_tasks(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_task(self, info, id):
+        query_cache = get_query_cache()
+        projection = Projection.from_info(info)
+        return await query_cache.afetch(
+            await query_cache.aorganization_of_task(id), 'task', {'id': id, 'fields': projection.key},
+            lambda: projection.apply(Tasks.objects.all()).aget(id=id)
+        )
+
+    async def resolve_task_comments(self, info, task_id, **page):
+        query_cache = get_query_cache()
+        projection = Projection.from_info(info, ('edges', 'node'), ['created_at'])
+        cached_page = await query_cache.afetch(
+            await query_cache.aorganization_of_task(task_id), 'task_comments',
+            {'task_id': task_id, 'fields': projection.key, **page},
+            lambda: apaginate(projection.apply(TaskComment.objects.filter(task_id=task_id)), **page)
+        )
+        return connection_from_page(TaskCommentConnection, cached_page)
+
+    async def resolve_search(self, info, organization_id, query, kinds=None, **page):
+        arguments = search_arguments(organization_id, query, kinds, **page)
+        projections = search_projections(info)
+        page = await sync_to_async(get_query_cache().fetch)(
+            organization_id, 'search', {**arguments, 'fields': search_projection_keys(projections)},
+            lambda: search.get_search_engine().search(**arguments, projections=projections)
+        )
+        return search_connection(info, page)
+
+    async def resolve_project_stats(self, info, organization_id):
+        stats = await sync_to_async(get_query_cache().fetch_many)(
+            'project_stats', {organization_id: {}}, read_project_stats
+        )
+        return ProjectStatsType(**stats[organization_id])
+
+    async def resolve_organizations_project_stats(self, info, organization_ids):
+        stats = await sync_to_async(get_query_cache().fetch_many)(
+            'project_stats', {organization_id: {} for organization_id in organization_ids}, read_project_stats
+        )
+        return [ProjectStatsType(**stats[organization_id]) for organization_id in dict.fromkeys(organization_ids)]
+
+    async def resolve_activity_feed(self, info, organization_id, kind=None, object_id=None, **page):
+        projection = Projection.from_info(info, ('edges', 'node'), ACTIVITY_REQUIRED_FIELDS)
+        entries = projection.apply(activity.feed(organization_id, kind, object_id))
+        return connection_from_page(ActivityEntryConnection, await apaginate(entries, **page))
+
+    async def resolve_changes_since(self, info, organization_id, cursor=None, first=None):
+        changes = await sync_to_async(sync.changes_since)(organization_id, cursor, first, changes_projections(info))
+        return changes_type(info, changes)
 
 
 # Schema
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
+# same types for the async view and the websocket server, mutations are run on the ORM thread there
+async_schema = graphene.Schema(query=AsyncQuery, mutation=Mutation, subscription=Subscription)
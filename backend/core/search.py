@@ -0,0 +1,165 @@
+"""
+Organization scoped full-text search over projects, tasks and comments.
+
+On PostgreSQL every searchable table has a weighted `search_vector` tsvector
+column with a GIN index, kept current by a trigger on insert and on update of
+the indexed columns (migration 0005). The column is not declared on the
+models so that regular reads never fetch it; PostgresSearchEngine reaches it
+with raw SQL. BasicSearchEngine gives the same API on other databases (every
+term must appear in one of the fields, ranked by field weight) for
+development and tests.
+
+Results of all kinds are merged by rank and paginated with keyset cursors on
+(rank, kind, id), each kind contributing at most one page per request.
+"""
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.db.models import BooleanField, Case, ExpressionWrapper, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from graphql import GraphQLError
+
+from .models import Projects, Tasks, TaskComment
+from .pagination import page_size
+
+# must match the trigger functions of migration 0005
+SEARCH_CONFIG = 'english'
+
+PROJECT = 'PROJECT'
+TASK = 'TASK'
+COMMENT = 'COMMENT'
+KINDS = (PROJECT, TASK, COMMENT)
+
+# kind -> (field, weight) of its search document, the weights mirror setweight() A / B
+SEARCH_FIELDS = {
+    PROJECT: (('name', 1.0), ('description', 0.4)),
+    TASK: (('title', 1.0), ('description', 0.4)),
+    COMMENT: (('content', 1.0),),
+}
+MAX_TERMS = 10
+
+
+class SearchResult:
+    __slots__ = ('kind', 'rank', 'instance')
+
+    def __init__(self, kind, rank, instance):
+        self.kind = kind
+        self.rank = rank
+        self.instance = instance
+
+    @property
+    def sort_key(self):
+        return -self.rank, KINDS.index(self.kind), self.instance.pk
+
+
+def encode_cursor(result):
+    value = json.dumps([result.rank, result.kind, result.instance.pk])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, kind, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if kind not in KINDS:
+            raise ValueError(kind)
+        return float(rank), kind, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def _after(kind, cursor):
+    """
+    rows of kind that sort after the cursor on (-rank, kind, pk)
+    """
+    rank, cursor_kind, pk = cursor
+    if KINDS.index(kind) > KINDS.index(cursor_kind):
+        return Q(search_rank__lte=rank)
+    if kind == cursor_kind:
+        return Q(search_rank__lt=rank) | Q(search_rank=rank, pk__gt=pk)
+    return Q(search_rank__lt=rank)
+
+
+def organization_querysets(organization_id):
+    return {
+        PROJECT: Projects.objects.filter(organization_id=organization_id),
+        TASK: Tasks.objects.filter(organization_id=organization_id),
+        COMMENT: TaskComment.objects.filter(organization_id=organization_id),
+    }
+
+
+class BasicSearchEngine:
+    """
+    icontains matching, for databases without full-text indexes
+    """
+    indexed = False
+
+    def annotate(self, kind, queryset, query):
+        """
+        queryset with search_rank and search_match annotations for query
+        """
+        fields = SEARCH_FIELDS[kind]
+        terms = query.split()[:MAX_TERMS]
+        match = Q()
+        rank = Value(0.0)
+        for term in terms:
+            term_match = Q()
+            for field, weight in fields:
+                term_match |= Q(**{f'{field}__icontains': term})
+                rank = rank + Case(
+                    When(**{f'{field}__icontains': term}, then=Value(weight)),
+                    default=Value(0.0), output_field=FloatField(),
+                )
+            match &= term_match
+        return queryset.annotate(
+            search_rank=ExpressionWrapper(rank, output_field=FloatField()),
+            search_match=ExpressionWrapper(match, output_field=BooleanField()),
+        )
+
+    def search(self, organization_id, query, kinds=None, first=None, after=None, projections=None):
+        """
+        return ([SearchResult], has_previous_page, has_next_page) of one page, best match first,
+        projections: kind -> core.projection.Projection of its instances
+        """
+        size = page_size(first)
+        query = query.strip()
+        if not query:
+            return [], False, False
+        cursor = decode_cursor(after) if after else None
+        querysets = organization_querysets(organization_id)
+        results = []
+        for kind in kinds or KINDS:
+            queryset = querysets[kind]
+            if projections:
+                queryset = projections[kind].apply(queryset)
+            queryset = self.annotate(kind, queryset, query).filter(search_match=True)
+            if cursor is not None:
+                queryset = queryset.filter(_after(kind, cursor))
+            results.extend(
+                SearchResult(kind, instance.search_rank, instance)
+                for instance in queryset.order_by('-search_rank', 'pk')[:size + 1]
+            )
+        results.sort(key=lambda result: result.sort_key)
+        return results[:size], bool(after), len(results) > size
+
+
+class PostgresSearchEngine(BasicSearchEngine):
+    """
+    tsvector @@ websearch_to_tsquery() on the GIN indexed search_vector columns, ranked by ts_rank_cd()
+    """
+    indexed = True
+
+    def annotate(self, kind, queryset, query):
+        vector = f'"{queryset.model._meta.db_table}"."search_vector"'
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        return queryset.annotate(
+            search_rank=RawSQL(f'ts_rank_cd({vector}, {tsquery})', (SEARCH_CONFIG, query), FloatField()),
+            search_match=RawSQL(f'{vector} @@ {tsquery}', (SEARCH_CONFIG, query), BooleanField()),
+        )
+
+
+def get_search_engine():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchEngine()
+    return BasicSearchEngine()
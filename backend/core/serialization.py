@@ -0,0 +1,9 @@
+"""
+JSON representation of model field values shared by the websocket payloads
+(core/subscriptions.py) and the activity log (core/activity.py).
+"""
+
+
+def json_value(value):
+    # dates travel as the ISO strings the DateTime/Date scalars would send
+    return value.isoformat() if hasattr(value, 'isoformat') else value
@@ -0,0 +1,95 @@
+"""
+Organization level project statistics.
+
+read_project_stats() serves the API from the OrganizationCounters rows,
+compute_project_stats() is the live engine: every ProjectStatsType field is
+computed with conditional aggregation, one query on projects and one on tasks
+grouped by their own organization_id (no join), for one or many
+organizations at once.
+"""
+from django.db.models import Count, Q
+
+from .models import Projects, OrganizationCounters, Tasks
+
+STATS_FIELDS = (
+    'total_projects',
+    'active_projects',
+    'completed_projects',
+    'total_tasks',
+    'completed_tasks',
+)
+
+
+def empty_stats(organization_id):
+    stats = dict.fromkeys(STATS_FIELDS, 0)
+    stats['organization_id'] = organization_id
+    stats['overall_completion_rate'] = 0
+    return stats
+
+
+def _set_completion_rate(stats):
+    if stats['total_tasks'] > 0:
+        stats['overall_completion_rate'] = (stats['completed_tasks'] / stats['total_tasks']) * 100
+
+
+def compute_project_stats(organization_ids):
+    """
+    return {organization_id: stats dict} for every requested organization,
+    organizations without projects get zeroed stats
+    """
+    organization_ids = list(dict.fromkeys(organization_ids))
+    results = {organization_id: empty_stats(organization_id) for organization_id in organization_ids}
+    if not organization_ids:
+        return results
+
+    project_rows = (
+        Projects.objects.filter(organization_id__in=organization_ids)
+        .order_by()
+        .values('organization_id')
+        .annotate(
+            total_projects=Count('pk'),
+            active_projects=Count('pk', filter=Q(status='ACTIVE')),
+            completed_projects=Count('pk', filter=Q(status='COMPLETED')),
+        )
+    )
+    task_rows = (
+        Tasks.objects.filter(organization_id__in=organization_ids)
+        .order_by()
+        .values('organization_id')
+        .annotate(total_tasks=Count('pk'), completed_tasks=Count('pk', filter=Q(status='DONE')))
+    )
+    for row in [*project_rows, *task_rows]:
+        results[row.pop('organization_id')].update(row)
+    for stats in results.values():
+        _set_completion_rate(stats)
+    return results
+
+
+def read_project_stats(organization_ids):
+    """
+    same result as compute_project_stats() read from the counter rows,
+    organizations without a counter row fall back to the live engine
+    """
+    organization_ids = list(dict.fromkeys(organization_ids))
+    results = {}
+    counters = OrganizationCounters.objects.filter(organization_id__in=organization_ids)
+    for counter in counters:
+        stats = empty_stats(counter.organization_id)
+        stats.update(
+            total_projects=counter.total_projects,
+            active_projects=counter.active_projects,
+            completed_projects=counter.completed_projects,
+            total_tasks=counter.total_tasks,
+            completed_tasks=counter.done_tasks,
+        )
+        _set_completion_rate(stats)
+        results[counter.organization_id] = stats
+
+    missing = [organization_id for organization_id in organization_ids if organization_id not in results]
+    if missing:
+        results.update(compute_project_stats(missing))
+    return {organization_id: results[organization_id] for organization_id in organization_ids}
+
+
+def project_stats(organization_id):
+    return read_project_stats([organization_id])[organization_id]
@@ -0,0 +1,250 @@
+"""
+Task and comment events for GraphQL subscriptions.
+
+Mutations publish small deltas (only the fields that changed) once their
+transaction commits, on one topic per organization and one per project (and
+per task for comments). The Broker fans events out to the subscriptions of
+this process through one bounded asyncio queue each; a slow subscriber drops
+events instead of holding the others back.
+
+With a channel layer (GRAPHQL_SUBSCRIPTIONS['CHANNEL_LAYER']) events are
+published to it instead and every process receives them from the layer, so
+mutations served by any worker or node reach every subscriber.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+from graphene.utils.str_converters import to_camel_case
+
+from .serialization import json_value
+
+TASK_CREATED = 'CREATED'
+TASK_UPDATED = 'UPDATED'
+
+TASK_FIELDS = ('title', 'description', 'status', 'assignee_email', 'due_date')
+
+
+def organization_topic(organization_id, kind):
+    return f'organization:{organization_id}:{kind}'
+
+
+def project_topic(project_id, kind):
+    return f'project:{project_id}:{kind}'
+
+
+def task_topic(task_id, kind):
+    return f'task:{task_id}:{kind}'
+
+
+class Broker:
+    """
+    Topic -> subscriber queues of this process
+    """
+
+    def __init__(self, channel_layer=None, queue_size=1000):
+        self.channel_layer = channel_layer
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)  # topic -> {(loop, queue)}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, message):
+        if self.channel_layer is not None:
+            self.channel_layer.publish(topic, message)
+        else:
+            self.deliver(topic, message)
+
+    def deliver(self, topic, message):
+        """
+        hand message to the subscribers of topic in this process, from any thread
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, message)
+            except RuntimeError:
+                # the subscriber's event loop is closed, its generator will never unsubscribe
+                self._remove(topic, (loop, queue))
+
+    @staticmethod
+    def _put(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def _remove(self, topic, subscriber):
+        with self._lock:
+            self._subscribers[topic].discard(subscriber)
+            if not self._subscribers[topic]:
+                del self._subscribers[topic]
+
+    async def subscribe(self, topics):
+        """
+        async iterator of the messages published on any of topics
+        """
+        if self.channel_layer is not None:
+            await self.channel_layer.listen(self)
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            for topic in topics:
+                self._subscribers[topic].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            for topic in topics:
+                self._remove(topic, subscriber)
+
+
+class RedisChannelLayer:
+    """
+    Redis pub/sub between processes: one connection per process and event loop
+    listens to every topic and delivers to the local Broker
+    """
+
+    def __init__(self, url, prefix='gqlsub'):
+        import redis  # only needed with this layer
+
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._listeners = {}  # loop -> task
+
+    def publish(self, topic, message):
+        self._client.publish(f'{self.prefix}:{topic}', json.dumps(message, cls=DjangoJSONEncoder))
+
+    async def listen(self, broker):
+        loop = asyncio.get_running_loop()
+        listener = self._listeners.get(loop)
+        if listener is None or listener.done():
+            self._listeners[loop] = loop.create_task(self._listen(broker))
+
+    async def _listen(self, broker):
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.psubscribe(f'{self.prefix}:*')
+        try:
+            async for raw in pubsub.listen():
+                if raw['type'] != 'pmessage':
+                    continue
+                topic = raw['channel'].decode().split(':', 1)[1]
+                broker.deliver(topic, json.loads(raw['data']))
+        finally:
+            await pubsub.close()
+            await client.close()
+
+
+def subscription_settings():
+    options = getattr(settings, 'GRAPHQL_SUBSCRIPTIONS', {})
+    return {
+        'CHANNEL_LAYER': options.get('CHANNEL_LAYER') or None,
+        'REDIS_URL': options.get('REDIS_URL', ''),
+        'QUEUE_SIZE': options.get('QUEUE_SIZE', 1000),
+        'CONNECTION_INIT_TIMEOUT': options.get('CONNECTION_INIT_TIMEOUT', 10),
+        'MAX_SUBSCRIPTIONS': options.get('MAX_SUBSCRIPTIONS', 100),
+    }
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        options = subscription_settings()
+        channel_layer = None
+        if options['CHANNEL_LAYER']:
+            channel_layer = import_string(options['CHANNEL_LAYER'])(options['REDIS_URL'])
+        _broker = Broker(channel_layer, options['QUEUE_SIZE'])
+    return _broker
+
+
+def task_message(kind, task, organization_id, fields=TASK_FIELDS):
+    delta = {'id': task.pk, 'project_id': task.project_id, 'updated_at': json_value(task.updated_at)}
+    if kind == TASK_CREATED:
+        delta['created_at'] = json_value(task.created_at)
+    delta.update({field: json_value(getattr(task, field)) for field in fields})
+    return {
+        'kind': kind,
+        'organization_id': organization_id,
+        'project_id': task.project_id,
+        'changed_fields': [to_camel_case(field) for field in fields],
+        'task': delta,
+    }
+
+
+def comment_message(comment, project_id, organization_id):
+    return {
+        'organization_id': organization_id,
+        'project_id': project_id,
+        'task_id': comment.task_id,
+        'comment': {
+            'id': comment.pk,
+            'task_id': comment.task_id,
+            'content': comment.content,
+            'author_email': comment.author_email,
+            'created_at': json_value(comment.created_at),
+        },
+    }
+
+
+def _publish_on_commit(events):
+    """
+    events: [(topics, message)], published once the current transaction commits
+    """
+    def publish():
+        broker = get_broker()
+        for topics, message in events:
+            for topic in topics:
+                broker.publish(topic, message)
+    if events:
+        transaction.on_commit(publish)
+
+
+def tasks_created(tasks, organization_id):
+    _publish_on_commit([
+        (
+            (organization_topic(organization_id, 'tasks'), project_topic(task.project_id, 'tasks')),
+            task_message(TASK_CREATED, task, organization_id),
+        )
+        for task in tasks
+    ])
+
+
+def tasks_updated(changes, organization_id):
+    """
+    changes: [(task, changed field names)], tasks without changes are not published
+    """
+    _publish_on_commit([
+        (
+            (organization_topic(organization_id, 'tasks'), project_topic(task.project_id, 'tasks')),
+            task_message(TASK_UPDATED, task, organization_id, [field for field in TASK_FIELDS if field in fields]),
+        )
+        for task, fields in changes if fields
+    ])
+
+
+def comments_created(comments, project_ids, organization_id):
+    """
+    project_ids: task id -> project id
+    """
+    _publish_on_commit([
+        (
+            (
+                organization_topic(organization_id, 'comments'),
+                project_topic(project_ids[comment.task_id], 'comments'),
+                task_topic(comment.task_id, 'comments'),
+            ),
+            comment_message(comment, project_ids[comment.task_id], organization_id),
+        )
+        for comment in comments
+    ])
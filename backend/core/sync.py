@@ -0,0 +1,155 @@
+"""
+Incremental sync of an organization, the changesSince query.
+
+A client keeps the cursor of its last sync and asks for the projects, tasks
+and comments created or updated after it, plus tombstones of the ones
+removed (written by core/archive.py), oldest first. Each source is read with
+one range scan of its (organization, updated_at, id) index and the sources
+are merged on (changed at, kind, id), the position a cursor encodes, so a
+page of N changes reads at most N + 1 rows per source.
+
+updated_at is set before commit: a transaction still running while a page
+is read may commit changes older than rows already served. No cursor is
+therefore handed back past the settle point, SETTLE_SECONDS in the past
+(longer than any write transaction plus the replication lag): a page ends
+on a settled change, or when every settled change is served, at the settle
+point itself, along with the newer changes that fit. Changes are delivered
+at least once and clients apply them by id. Tombstones are kept TOMBSTONE_DAYS,
+an older cursor gets a SYNC_CURSOR_EXPIRED error and syncs from scratch.
+"""
+import base64
+import binascii
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from graphql import GraphQLError
+
+from .complexity import complexity_error
+from .models import Projects, Tasks, TaskComment, Tombstone
+
+PROJECT = 'project'
+TASK = 'task'
+COMMENT = 'comment'
+DELETED = 'deleted'
+# sources in merge order, the rank of a source is its index
+SOURCES = (PROJECT, TASK, COMMENT, DELETED)
+MODEL_KINDS = {Projects: PROJECT, Tasks: TASK, TaskComment: COMMENT}
+
+Position = namedtuple('Position', 'changed_at rank pk')
+
+
+def sync_settings():
+    options = getattr(settings, 'SYNC', {})
+    return {
+        'PAGE_SIZE': options.get('PAGE_SIZE', 200),
+        'MAX_PAGE_SIZE': options.get('MAX_PAGE_SIZE', 1000),
+        'SETTLE_SECONDS': options.get('SETTLE_SECONDS', 10),
+        'TOMBSTONE_DAYS': options.get('TOMBSTONE_DAYS', 30),
+    }
+
+
+def encode_sync_cursor(position):
+    return base64.urlsafe_b64encode(
+        f"{position.changed_at.isoformat()}|{position.rank}|{position.pk}".encode()
+    ).decode()
+
+
+def decode_sync_cursor(cursor):
+    try:
+        changed_at, rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        changed_at = parse_datetime(changed_at)
+        if changed_at is None:
+            raise ValueError(cursor)
+        return Position(changed_at, int(rank), int(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def _after(field, rank, position):
+    """
+    rows of the source ranked `rank` that follow position in (field, rank, pk) order
+    """
+    if position is None:
+        return Q()
+    changed_at, cursor_rank, pk = position
+    if rank < cursor_rank:
+        return Q(**{f'{field}__gt': changed_at})
+    if rank > cursor_rank:
+        return Q(**{f'{field}__gte': changed_at})
+    return Q(**{f'{field}__gte': changed_at}) & (Q(**{f'{field}__gt': changed_at}) | Q(pk__gt=pk))
+
+
+def _sources(organization_id, projections):
+    projections = projections or {}
+    for kind, queryset, field in (
+        (PROJECT, Projects.objects.filter(organization_id=organization_id), 'updated_at'),
+        (TASK, Tasks.objects.filter(organization_id=organization_id), 'updated_at'),
+        (COMMENT, TaskComment.objects.filter(organization_id=organization_id), 'updated_at'),
+        (DELETED, Tombstone.objects.filter(organization_id=organization_id), 'deleted_at'),
+    ):
+        if kind in projections:
+            queryset = projections[kind].apply(queryset)
+        yield kind, queryset, field
+
+
+def changes_since(organization_id, cursor=None, first=None, projections=None):
+    """
+    one page of the changes of an organization after cursor (None: everything),
+    projections: kind -> core.projection.Projection of the selected rows;
+    return a dict of the changed rows of each kind, the deleted tombstones, the next cursor and has_more
+    """
+    options = sync_settings()
+    size = options['PAGE_SIZE'] if first is None else first
+    if size < 1:
+        raise GraphQLError("first must be at least 1")
+    size = min(size, options['MAX_PAGE_SIZE'])
+    now = timezone.now()
+    # see the module docstring, what commits after the read up to the settle point is served again
+    settle_point = Position(now - timedelta(seconds=options['SETTLE_SECONDS']), -1, 0)
+    position = decode_sync_cursor(cursor) if cursor else None
+    if position is not None and position.changed_at < now - timedelta(days=options['TOMBSTONE_DAYS']):
+        raise complexity_error(
+            f"Cursor older than {options['TOMBSTONE_DAYS']} days, deletions since may be lost; sync from scratch",
+            'SYNC_CURSOR_EXPIRED',
+        )
+
+    sources = []
+    for rank, (kind, queryset, field) in enumerate(_sources(organization_id, projections)):
+        rows = queryset.filter(_after(field, rank, position)).order_by(field, 'pk')[:size + 1]
+        sources.append([(Position(getattr(row, field), rank, row.pk), row) for row in rows])
+    changes = list(islice(heapq.merge(*sources, key=lambda change: change[0]), size + 1))
+
+    # changes are ordered, when more than a page of them is settled the page ends on a settled change
+    has_more = len(changes) > size and changes[size][0] < settle_point
+    changes = changes[:size]
+    next_position = changes[-1][0] if has_more else settle_point
+    page = {kind: [] for kind in SOURCES}
+    for change_position, row in changes:
+        page[SOURCES[change_position.rank]].append(row)
+    return {
+        'projects': page[PROJECT],
+        'tasks': page[TASK],
+        'comments': page[COMMENT],
+        'deleted': page[DELETED],
+        'cursor': encode_sync_cursor(next_position),
+        'has_more': has_more,
+    }
+
+
+def prune_tombstones(batch_size=10000):
+    """
+    delete tombstones older than TOMBSTONE_DAYS, return how many
+    """
+    cutoff = timezone.now() - timedelta(days=sync_settings()['TOMBSTONE_DAYS'])
+    pruned = 0
+    while True:
+        ids = list(Tombstone.objects.filter(deleted_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return pruned
+        pruned += Tombstone.objects.filter(pk__in=ids).delete()[0]
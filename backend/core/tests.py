@@ -1,3 +1,1373 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import json
+import random
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql import GraphQLError, parse
+import psycopg2
+from psycopg2 import extensions as psycopg2_extensions
+
+from . import activity, bulk, bulk_import, cache, counters, persisted_queries, ratelimit, routers, subscriptions, sync
+from .archive import Remover, cold_projects
+from .benchmarks import OPERATIONS, connection_modes, run_benchmarks, run_connection_benchmark
+from .complexity import OperationAnalysis
+from .filters import TASK_ORDERS
+from .instrumentation import OperationProfile, metrics, query_shape
+from .loaders import COMMENTS_PER_TASK, TASKS_PER_PROJECT
+from .management.commands.generate_load_data import zipf_allocation
+from .models import (
+    ActivityEntry, ArchivedProject, ArchivedTask, ArchivedTaskComment, OrganizationCounters, Organizations,
+    ProjectCounters, Projects, TaskComment, Tasks, Tombstone,
+)
+from .pagination import NEWEST, paginate
+from .postgresql_pool.base import ConnectionPool
+from .schema import async_schema, schema
+from .stats import compute_project_stats, read_project_stats
+from .views import PersistedGraphQLView
+
+
+def create_organization(name='Org', projects=1, tasks=2, comments=1):
+    organization = Organizations.objects.create(name=name, contact_email='contact@example.com')
+    for project_number in range(projects):
+        project = Projects.objects.create(organization=organization, name=f'Project {project_number}')
+        for task_number in range(tasks):
+            task = Tasks.objects.create(
+                project=project, title=f'Task {task_number}', status='DONE' if task_number % 2 else 'TODO',
+            )
+            for _ in range(comments):
+                TaskComment.objects.create(task=task, content='Comment', author_email='author@example.com')
+    return organization
+
+
+def analyze(query, variables=None):
+    document = parse(query)
+    return OperationAnalysis(schema.graphql_schema, document, document.definitions[0], variables)
+
+
+class GraphQLTestCase(TestCase):
+    endpoint = '/graphql/'
+
+    def setUp(self):
+        # process wide singletons outlive the rolled back test transactions
+        caches['default'].clear()
+        cache._query_cache = None
+        persisted_queries._persisted_queries = None
+        ratelimit._rate_limiter = None
+
+    def post(self, query, variables=None, endpoint=None, **data):
+        return self.client.post(
+            endpoint or self.endpoint, json.dumps({'query': query, 'variables': variables or {}, **data}),
+            content_type='application/json',
+        )
+
+    def error_codes(self, response):
+        return [error.get('extensions', {}).get('code') for error in response.json().get('errors', [])]
+
+
+class NestedLoadingTests(GraphQLTestCase):
+    query = (
+        '{ projects(organizationId: %d, first: 50) { edges { node { name taskCount completedTasksCount '
+        'completionRate tasks { title comments { content } } } } } }'
+    )
+
+    def count_queries(self, organization):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(self.query % organization.pk)
+        self.assertNotIn('errors', response.json())
+        return len(queries), response.json()['data']['projects']['edges']
+
+    def test_queries_do_not_grow_with_the_number_of_projects(self):
+        small, large = create_organization('Small', projects=2), create_organization('Large', projects=6, tasks=3)
+        small_queries, edges = self.count_queries(small)
+        large_queries, _ = self.count_queries(large)
+        self.assertEqual(small_queries, large_queries)
+        node = edges[0]['node']
+        self.assertEqual((node['taskCount'], node['completedTasksCount'], node['completionRate']), (2, 1, 50.0))
+        self.assertEqual([len(task['comments']) for task in node['tasks']], [1, 1])
+
+    def test_nested_lists_are_capped(self):
+        organization = create_organization(tasks=TASKS_PER_PROJECT + 5, comments=0)
+        newest = Tasks.objects.first()
+        for number in range(COMMENTS_PER_TASK + 5):
+            TaskComment.objects.create(task=newest, content=f'Comment {number}', author_email='author@example.com')
+        small_queries, _ = self.count_queries(create_organization('Small'))
+        queries, edges = self.count_queries(organization)
+        self.assertEqual(queries, small_queries)
+        tasks = edges[0]['node']['tasks']
+        newest_titles = Tasks.objects.filter(organization=organization).values_list('title', flat=True)
+        self.assertEqual([task['title'] for task in tasks], list(newest_titles[:TASKS_PER_PROJECT]))
+        comments = [comment['content'] for comment in tasks[0]['comments']]
+        self.assertEqual(comments, [f'Comment {number}' for number in range(COMMENTS_PER_TASK + 4, 4, -1)])
+
+
+class ProjectStatsTests(GraphQLTestCase):
+
+    def test_stats_of_many_organizations_take_two_queries(self):
+        first, second = create_organization('First', projects=2, tasks=3), create_organization('Second')
+        Projects.objects.filter(pk=first.projects.order_by('pk').first().pk).update(status='COMPLETED')
+        empty = Organizations.objects.create(name='Empty', contact_email='empty@example.com')
+        with self.assertNumQueries(2):
+            stats = compute_project_stats([first.pk, second.pk, empty.pk, first.pk])
+        self.assertEqual(list(stats), [first.pk, second.pk, empty.pk])
+        self.assertEqual(
+            {field: stats[first.pk][field] for field in ('total_projects', 'active_projects', 'completed_projects',
+                                                         'total_tasks', 'completed_tasks')},
+            {'total_projects': 2, 'active_projects': 1, 'completed_projects': 1, 'total_tasks': 6,
+             'completed_tasks': 2},
+        )
+        self.assertAlmostEqual(stats[first.pk]['overall_completion_rate'], 100 * 2 / 6)
+        self.assertEqual(stats[empty.pk]['overall_completion_rate'], 0)
+
+    def test_counter_rows_serve_the_same_stats(self):
+        organization = create_organization(projects=3)
+        live = compute_project_stats([organization.pk])
+        counters.rebuild_counters([organization.pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(read_project_stats([organization.pk]), live)
+        response = self.post('{ projectStats(organizationId: %d) { totalTasks completedTasks } }' % organization.pk)
+        self.assertEqual(response.json()['data']['projectStats'], {'totalTasks': 6, 'completedTasks': 3})
+
+
+class CounterTests(GraphQLTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.organization = create_organization(projects=2, tasks=3)
+        counters.rebuild_counters([self.organization.pk])
+        self.project = self.organization.projects.order_by('pk').first()
+
+    def assertCountersUpToDate(self):
+        self.assertEqual(list(counters.verify_counters(counters.all_organization_ids())), [])
+
+    def update_task(self, task, **fields):
+        response = self.post(
+            'mutation($input: UpdateTaskInput!) { updateTask(input: $input) { success errors } }',
+            {'input': {'id': task.pk, **fields}},
+        )
+        return response.json()['data']['updateTask']
+
+    def test_mutations_keep_counters_up_to_date(self):
+        create_task = self.post(
+            'mutation($input: CreateTaskInput!) { createTask(input: $input) { task { id } } }',
+            {'input': {'projectId': self.project.pk, 'title': 'New'}},
+        ).json()['data']['createTask']
+        self.assertCountersUpToDate()
+        task = Tasks.objects.get(pk=create_task['task']['id'])
+        self.assertTrue(self.update_task(task, status='IN_PROGRESS')['success'])
+        self.assertCountersUpToDate()
+        counter = ProjectCounters.objects.get(project=self.project)
+        self.assertEqual((counter.total_tasks, counter.in_progress_tasks), (4, 1))
+        self.post(
+            'mutation($input: UpdateProjectInput!) { updateProject(input: $input) { success } }',
+            {'input': {'id': self.project.pk, 'status': 'COMPLETED'}},
+        )
+        self.assertEqual(OrganizationCounters.objects.get(organization=self.organization).completed_projects, 1)
+        self.assertCountersUpToDate()
+
+    def test_status_changes_use_the_denormalized_organization(self):
+        task = self.project.tasks.first()
+        old_status, task.status = task.status, 'IN_PROGRESS'
+        task.save()
+        with self.assertNumQueries(2):
+            # one project row, one organization row
+            counters.task_status_changed(task, old_status)
+        self.assertCountersUpToDate()
+
+    def test_invalid_status_is_rejected(self):
+        task = self.project.tasks.first()
+        result = self.update_task(task, status='BOGUS')
+        self.assertFalse(result['success'])
+        self.assertEqual(len(result['errors']), 1)
+        self.assertTrue(result['errors'][0].startswith('status: '))
+        task.refresh_from_db()
+        self.assertIn(task.status, counters.TASK_STATUS_FIELDS)
+        self.assertCountersUpToDate()
+
+    def test_admin_saves_keep_counters_up_to_date(self):
+        request = RequestFactory().post('/admin/')
+        task_admin, project_admin = site._registry[Tasks], site._registry[Projects]
+        task = Tasks(project=self.project, title='Admin', status='DONE')
+        task_admin.save_model(request, task, None, False)
+        task.status = 'TODO'
+        task_admin.save_model(request, task, None, True)
+        project = Projects(organization=self.organization, name='Admin', status='COMPLETED')
+        project_admin.save_model(request, project, None, False)
+        project.status = 'ACTIVE'
+        project_admin.save_model(request, project, None, True)
+        task_admin.delete_model(request, task)
+        self.assertCountersUpToDate()
+        self.assertEqual(task_admin.get_readonly_fields(request, task), ['project'])
+
+    def test_sample_data_has_up_to_date_counters(self):
+        call_command('create_sample_data', stdout=StringIO())
+        self.assertCountersUpToDate()
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        organization = create_organization(tasks=7, comments=0)
+        now = timezone.now()
+        # ties and null due dates
+        for index, task in enumerate(Tasks.objects.order_by('pk')):
+            Tasks.objects.filter(pk=task.pk).update(
+                due_date=None if index % 3 == 0 else now + timedelta(days=index % 2),
+                created_at=now - timedelta(hours=index // 2),
+            )
+        self.tasks = Tasks.objects.filter(project__organization=organization)
+
+    def walk(self, order, first=None, last=None):
+        """
+        pks of every page, forwards with first or backwards with last
+        """
+        pks, cursor = [], None
+        while True:
+            if first:
+                nodes, _, has_more = paginate(self.tasks, first=first, after=cursor, order=order)
+                pks += [node.pk for node in nodes]
+                cursor = order.cursor(nodes[-1]) if nodes else None
+            else:
+                nodes, has_more, _ = paginate(self.tasks, last=last, before=cursor, order=order)
+                pks = [node.pk for node in nodes] + pks
+                cursor = order.cursor(nodes[0]) if nodes else None
+            if not has_more:
+                return pks
+
+    def expected(self, order):
+        def key(task):
+            value = getattr(task, order.field)
+            # nulls sort as the greatest value
+            return (value is None, value or timezone.now(), task.pk)
+        return [task.pk for task in sorted(self.tasks, key=key, reverse=order.descending)]
+
+    def test_pages_follow_the_order_both_ways(self):
+        for name, order in TASK_ORDERS.items():
+            with self.subTest(name):
+                expected = self.expected(order)
+                self.assertEqual(self.walk(order, first=2), expected)
+                self.assertEqual(self.walk(order, last=3), expected)
+
+    def test_page_flags(self):
+        nodes, has_previous_page, has_next_page = paginate(self.tasks, first=7, order=NEWEST)
+        self.assertEqual((len(nodes), has_previous_page, has_next_page), (7, False, False))
+        nodes, has_previous_page, has_next_page = paginate(
+            self.tasks, first=3, after=NEWEST.cursor(nodes[1]), order=NEWEST
+        )
+        self.assertEqual((len(nodes), has_previous_page, has_next_page), (3, True, True))
+
+    def test_invalid_cursors_are_rejected(self):
+        with self.assertRaisesMessage(GraphQLError, 'Invalid cursor: nope'):
+            paginate(self.tasks, after='nope')
+
+
+class QueryCacheTests(GraphQLTestCase):
+
+    def test_invalidation_is_scoped_to_one_organization(self):
+        query_cache = cache.QueryCache(cache.LocalMemoryBackend())
+        computed = []
+
+        def compute(value):
+            computed.append(value)
+            return value
+
+        for _ in range(2):
+            self.assertEqual(query_cache.fetch(1, 'project', {'id': 1}, lambda: compute('a')), 'a')
+            self.assertEqual(query_cache.fetch(2, 'project', {'id': 1}, lambda: compute('b')), 'b')
+        self.assertEqual(computed, ['a', 'b'])
+        query_cache.invalidate(1)
+        self.assertEqual(query_cache.fetch(1, 'project', {'id': 1}, lambda: compute('c')), 'c')
+        self.assertEqual(query_cache.fetch(2, 'project', {'id': 1}, lambda: compute('d')), 'b')
+        self.assertEqual(
+            query_cache.fetch_many('stats', {1: {}, 2: {}}, lambda scopes: {scope: compute(scope) for scope in scopes}),
+            {1: 1, 2: 2},
+        )
+        # unknown owner, never cached
+        self.assertEqual(query_cache.fetch(None, 'project', {'id': 1}, lambda: compute('e')), 'e')
+        self.assertEqual(computed, ['a', 'b', 'c', 1, 2, 'e'])
+
+    def test_mutations_invalidate_cached_results_once_committed(self):
+        organization = create_organization()
+        project = organization.projects.get()
+        query = '{ project(id: %d) { name } }' % project.pk
+        self.assertEqual(self.post(query).json()['data']['project']['name'], 'Project 0')
+        # written behind the cache's back, the cached result is served
+        Projects.objects.filter(pk=project.pk).update(name='Renamed')
+        self.assertEqual(self.post(query).json()['data']['project']['name'], 'Project 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post(
+                'mutation($input: UpdateProjectInput!) { updateProject(input: $input) { success } }',
+                {'input': {'id': project.pk, 'description': 'Changed'}},
+            )
+        self.assertEqual(self.post(query).json()['data']['project']['name'], 'Renamed')
+
+    def test_local_memory_backend_evicts_least_recently_used(self):
+        backend = cache.LocalMemoryBackend(max_entries=2)
+        backend.set_many({'a': 1, 'b': 2})
+        backend.get_many(['a'])
+        backend.set_many({'c': 3})
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+        backend.set_many({'d': 4}, timeout=0)
+        self.assertEqual(backend.get_many(['d']), {})
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    query = '{ organizations { name } }'
+
+    def post_hash(self, sha256_hash, query=None):
+        return self.post(query, extensions={'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash}})
+
+    def test_hash_is_registered_by_the_first_full_request(self):
+        create_organization('Persisted')
+        sha256_hash = persisted_queries.query_hash(self.query)
+        response = self.post_hash(sha256_hash)
+        self.assertEqual(self.error_codes(response), ['PERSISTED_QUERY_NOT_FOUND'])
+        self.assertEqual(response.json()['errors'][0]['message'], persisted_queries.NOT_FOUND)
+        data = {'organizations': [{'name': 'Persisted'}]}
+        self.assertEqual(self.post_hash(sha256_hash, self.query).json()['data'], data)
+        # other processes find the text in the shared store, this one skips parse and validate
+        persisted_queries.get_persisted_queries().documents.clear()
+        self.assertEqual(self.post_hash(sha256_hash).json()['data'], data)
+        self.assertIsNotNone(persisted_queries.get_persisted_queries().documents.get(sha256_hash))
+
+    def test_mismatched_hash_is_rejected(self):
+        response = self.post_hash('0' * 64, self.query)
+        self.assertEqual(self.error_codes(response), ['PERSISTED_QUERY_HASH_MISMATCH'])
+
+    def test_allow_list_only_serves_manifest_operations(self):
+        allowed = persisted_queries.PersistedQueries(allow_list_only=True)
+        allowed.allow_list = {persisted_queries.query_hash(self.query): self.query}
+        document, errors = allowed.get_document(schema.graphql_schema, None, persisted_queries.query_hash(self.query))
+        self.assertEqual(errors, [])
+        with self.assertRaises(GraphQLError) as raised:
+            allowed.get_document(schema.graphql_schema, '{ organizations { id } }', None)
+        self.assertEqual(raised.exception.extensions['code'], 'PERSISTED_QUERY_NOT_ALLOWED')
+
+    def test_invalid_documents_report_validation_errors(self):
+        response = self.post('{ organizations { unknownField } }')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('unknownField', response.json()['errors'][0]['message'])
+
+
+class BulkMutationTests(GraphQLTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.organization = create_organization(tasks=2)
+        self.other = create_organization('Other')
+        counters.rebuild_counters([self.organization.pk, self.other.pk])
+        self.project = self.organization.projects.get()
+
+    def bulk(self, name, argument, input_type, items):
+        response = self.post(
+            'mutation($organizationId: Int!, $items: [%s!]!) { %s(organizationId: $organizationId, %s: $items) '
+            '{ success errors itemErrors { index messages } } }' % (input_type, name, argument),
+            {'organizationId': self.organization.pk, 'items': items},
+        )
+        return response.json()['data'][name]
+
+    def test_invalid_items_are_reported_and_skipped(self):
+        result = self.bulk('bulkCreateTasks', 'tasks', 'CreateTaskInput', [
+            {'projectId': self.project.pk, 'title': 'First'},
+            {'projectId': self.other.projects.get().pk, 'title': 'Other tenant'},
+            {'projectId': self.project.pk, 'title': 'Bad email', 'assigneeEmail': 'not an email'},
+            {'projectId': self.project.pk, 'title': 'Second'},
+        ])
+        self.assertFalse(result['success'])
+        self.assertEqual([error['index'] for error in result['itemErrors']], [1, 2])
+        self.assertEqual(result['itemErrors'][0]['messages'], ['Project not found'])
+        self.assertTrue(result['itemErrors'][1]['messages'][0].startswith('assignee_email: '))
+        self.assertEqual(
+            set(self.project.tasks.values_list('title', flat=True)), {'Task 0', 'Task 1', 'First', 'Second'}
+        )
+        self.assertEqual(list(counters.verify_counters(counters.all_organization_ids())), [])
+
+    def test_updates_apply_valid_items_only(self):
+        first, second = self.project.tasks.order_by('pk')
+        result = self.bulk('bulkUpdateTasks', 'tasks', 'UpdateTaskInput', [
+            {'id': first.pk, 'status': 'IN_PROGRESS'},
+            {'id': second.pk, 'status': 'BOGUS'},
+            {'id': self.other.projects.get().tasks.first().pk, 'title': 'Other tenant'},
+        ])
+        self.assertEqual([error['index'] for error in result['itemErrors']], [1, 2])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('IN_PROGRESS', 'DONE'))
+        self.assertEqual(list(counters.verify_counters(counters.all_organization_ids())), [])
+
+    def test_comments_on_other_tenants_tasks_are_rejected(self):
+        task = self.project.tasks.first()
+        result = self.bulk('bulkCreateTaskComments', 'comments', 'CreateTaskCommentInput', [
+            {'taskId': task.pk, 'content': 'Mine', 'authorEmail': 'author@example.com'},
+            {'taskId': self.other.projects.get().tasks.first().pk, 'content': 'Theirs',
+             'authorEmail': 'author@example.com'},
+        ])
+        self.assertEqual(result['itemErrors'], [{'index': 1, 'messages': ['Task not found']}])
+        self.assertTrue(task.comments.filter(content='Mine', organization=self.organization).exists())
+
+    def test_item_limit(self):
+        with self.assertRaises(bulk.BulkLimitError):
+            bulk.create_tasks(self.organization.pk, [None] * (bulk.MAX_ITEMS + 1))
+
+
+class TokenSlugTests(TestCase):
+
+    def test_slugs_are_generated_without_queries(self):
+        organization = Organizations.objects.create(name='Slugs', contact_email='contact@example.com')
+        other = Organizations.objects.create(name='Slugs', contact_email='contact@example.com')
+        self.assertNotEqual(organization.slug, other.slug)
+        with self.assertNumQueries(1):
+            first = Projects.objects.create(organization=organization, name='Same Name')
+        second = Projects.objects.create(organization=other, name='Same Name')
+        self.assertTrue(first.slug.startswith('same-name-'))
+        self.assertNotEqual(first.slug, second.slug)
+        self.assertEqual(len(first.slug), len('same-name-') + 12)
+
+    def test_bulk_created_rows_get_slugs_and_explicit_slugs_are_kept(self):
+        organization = create_organization(tasks=0)
+        project = organization.projects.get()
+        tasks = Tasks.objects.bulk_create(
+            [Tasks(project=project, organization=organization, title='Bulk task') for _ in range(3)]
+        )
+        self.assertEqual(len({task.slug for task in tasks}), 3)
+        self.assertTrue(all(task.slug.startswith('bulk-task-') for task in tasks))
+        named = Projects.objects.create(organization=organization, name='Named', slug='Custom Slug')
+        self.assertEqual(named.slug, 'custom-slug')
+
+
+class LoadDataTests(GraphQLTestCase):
+
+    def test_zipf_allocation_adds_up(self):
+        rng = random.Random(1)
+        for skew in (0, 1, 2):
+            counts = zipf_allocation(1000, 7, skew, rng)
+            self.assertEqual((len(counts), sum(counts)), (7, 1000))
+        self.assertEqual(zipf_allocation(10, 5, 0, rng), [2] * 5)
+        # zipf(2): the largest share is 1 / sum(1 / rank ** 2), about 65%
+        self.assertGreater(max(zipf_allocation(1000, 10, 2, rng)), 600)
+
+    def test_counts_that_would_drop_rows_are_rejected(self):
+        for counts, message in [
+            ({'projects': 0, 'tasks': 10}, '--tasks need at least one project'),
+            ({'projects': 1, 'tasks': 0, 'comments': 5}, '--comments need at least one task'),
+            ({'tasks': -1}, '--tasks must not be negative'),
+            ({'batch_size': 0}, '--batch-size must be at least 1'),
+        ]:
+            with self.subTest(**counts), self.assertRaisesMessage(CommandError, message):
+                call_command('generate_load_data', organizations=1, stdout=StringIO(), **counts)
+        self.assertFalse(Organizations.objects.exists())
+
+    def test_generated_data_is_benchmarked_without_errors(self):
+        call_command(
+            'generate_load_data', organizations=3, projects=6, tasks=40, comments=60, seed=1, stdout=StringIO()
+        )
+        self.assertEqual(
+            (Organizations.objects.count(), Projects.objects.count(), Tasks.objects.count(),
+             TaskComment.objects.count()),
+            (3, 6, 40, 60),
+        )
+        self.assertEqual(list(counters.verify_counters(counters.all_organization_ids())), [])
+        results = run_benchmarks(schema, iterations=2, seed=1, operations=[*OPERATIONS])
+        self.assertEqual({name: result.errors for name, result in results.items()}, dict.fromkeys(OPERATIONS, 0))
+        # mutations are rolled back
+        self.assertEqual(Tasks.objects.count(), 40)
+        self.assertEqual(results['task'].summary()['runs'], 2)
+
+
+class InstrumentationTests(GraphQLTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def test_query_shape_strips_literals(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id = 12 AND name = 'it''s' AND pk IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND pk IN (...)",
+        )
+
+    def test_repeated_query_shapes_are_reported(self):
+        create_organization(tasks=6)
+        with OperationProfile('tasks', n_plus_one_threshold=5) as profile:
+            for pk in Tasks.objects.values_list('pk', flat=True):
+                Tasks.objects.get(pk=pk)
+        self.assertEqual(len(profile.queries), 7)
+        [duplicate] = profile.duplicate_queries()
+        self.assertEqual(duplicate['count'], 6)
+
+    @override_settings(GRAPHQL_INSTRUMENTATION={'EXTENSIONS': True, 'METRICS_TOKEN': 'secret'})
+    def test_profile_extensions_and_metrics(self):
+        organization = create_organization()
+        response = self.post('query Names { organization(id: %d) { name } }' % organization.pk)
+        profile = response.json()['extensions']['profile']
+        self.assertEqual(profile['operation'], 'Names')
+        self.assertIn('Query.organization', profile['resolvers'])
+        self.assertGreater(profile['sql']['count'], 0)
+
+        self.assertEqual(self.client.get('/graphql/metrics/').status_code, 403)
+        snapshot = self.client.get('/graphql/metrics/', HTTP_AUTHORIZATION='Bearer secret').json()
+        self.assertEqual(snapshot['operation_duration_ms']['Names']['count'], 1)
+        self.assertEqual(snapshot['operation_sql_queries']['Names']['count'], 1)
+
+    @override_settings(GRAPHQL_INSTRUMENTATION={'EXTENSIONS': False})
+    def test_extensions_are_off_unless_enabled(self):
+        response = self.post('{ organizations { id } }')
+        self.assertNotIn('extensions', response.json())
+        self.assertEqual(metrics.snapshot()['operation_sql_queries']['anonymous']['count'], 1)
+
+
+class OperationLimitsTests(GraphQLTestCase):
+
+    def test_owners_are_resolved_with_one_query_per_kind(self):
+        organization = create_organization(projects=2)
+        task_ids = list(Tasks.objects.values_list('pk', flat=True))
+        project_ids = list(Projects.objects.values_list('pk', flat=True))
+        fields = [f't{pk}: task(id: {pk}) {{ id }}' for pk in [*task_ids, *range(10 ** 6, 10 ** 6 + 50)]]
+        fields += [f'p{pk}: project(id: {pk}) {{ id }}' for pk in project_ids]
+        analysis = analyze('{ %s }' % ' '.join(fields))
+        with self.assertNumQueries(2):
+            self.assertEqual(analysis.organizations(), {organization.pk})
+        with self.assertNumQueries(0):
+            analysis.organizations()
+            # known owners are cached
+            self.assertEqual(analyze('{ %s }' % fields[0]).organizations(), {organization.pk})
+
+    def test_bulk_item_targets_are_resolved_together(self):
+        organization = create_organization(tasks=3)
+        comments = [{'taskId': pk, 'content': 'Comment', 'authorEmail': 'author@example.com'} for pk in
+                    Tasks.objects.values_list('pk', flat=True)]
+        analysis = analyze(
+            'mutation($comments: [CreateTaskCommentInput!]!) '
+            '{ bulkCreateTaskComments(comments: $comments) { success } }',
+            {'comments': comments},
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(analysis.organizations(), {organization.pk})
+
+    @override_settings(GRAPHQL_COMPLEXITY={'MAX_TARGETS': 10})
+    def test_too_many_targets_are_rejected_before_lookups(self):
+        query = '{ %s }' % ' '.join(f't{pk}: task(id: {pk}) {{ id }}' for pk in range(1, 12))
+        with self.assertNumQueries(0):
+            response = self.post(query)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.error_codes(response), ['TOO_MANY_TARGETS'])
+
+    @override_settings(GRAPHQL_COMPLEXITY={'MAX_DEPTH': 2})
+    def test_deep_operations_are_rejected_before_lookups(self):
+        with self.assertNumQueries(0):
+            response = self.post('{ project(id: 1) { tasks { comments { id } } } }')
+        self.assertEqual(self.error_codes(response), ['QUERY_TOO_DEEP'])
+
+    def test_cost_counts_connection_pages(self):
+        narrow = analyze('{ projects(organizationId: 1, first: 2) { edges { node { id taskCount } } } }')
+        wide = analyze('{ projects(organizationId: 1, first: 20) { edges { node { id taskCount } } } }')
+        self.assertGreater(wide.cost, narrow.cost)
+        self.assertEqual(narrow.targets, {('organization', 1)})
+
+
+@override_settings(GRAPHQL_INSTRUMENTATION={'EXTENSIONS': False})
+class AsyncViewTests(GraphQLTestCase):
+    query = '''
+        query($organization: Int!, $project: Int!) {
+            organization(id: $organization) { name }
+            projects(organizationId: $organization, first: 5) {
+                edges { node { name taskCount tasks { title comments { content } } } }
+            }
+            tasks(projectId: $project, first: 5, orderBy: "OLDEST") { edges { node { title status } } }
+            projectStats(organizationId: $organization) { totalProjects completedTasks }
+        }
+    '''
+
+    def test_queries_match_the_sync_view(self):
+        organization = create_organization(projects=2)
+        variables = {'organization': organization.pk, 'project': organization.projects.first().pk}
+        expected = self.post(self.query, variables).json()
+        self.assertNotIn('errors', expected)
+        caches['default'].clear()
+        self.assertEqual(self.post(self.query, variables, endpoint='/graphql/async/').json(), expected)
+
+    def test_mutations_run_on_the_async_endpoint(self):
+        organization = create_organization()
+        response = self.post(
+            'mutation($id: Int!) { createProject(input: {organizationId: $id, name: "Async"}) '
+            '{ success project { name } } }',
+            {'id': organization.pk}, endpoint='/graphql/async/',
+        )
+        self.assertEqual(response.json()['data']['createProject'], {'success': True, 'project': {'name': 'Async'}})
+        self.assertEqual(OrganizationCounters.objects.get(pk=organization.pk).total_projects, 2)
+
+    def test_operation_errors_keep_their_status(self):
+        response = self.post('{ organization(id: 1) { nope } }', endpoint='/graphql/async/')
+        self.assertEqual(response.status_code, 400)
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, message):
+        self.published.append((topic, message))
+
+
+class SubscriptionTests(GraphQLTestCase):
+
+    def test_broker_fans_out_and_drops_for_slow_subscribers(self):
+        async def run():
+            broker = subscriptions.Broker(queue_size=1)
+            stream = broker.subscribe(['project:1:tasks'])
+            first = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            broker.deliver('project:2:tasks', 'other project')
+            broker.deliver('project:1:tasks', 'first')
+            self.assertEqual(await first, 'first')
+            broker.deliver('project:1:tasks', 'second')
+            broker.deliver('project:1:tasks', 'dropped')
+            await asyncio.sleep(0)
+            self.assertEqual(await stream.__anext__(), 'second')
+            await stream.aclose()
+            self.assertEqual(dict(broker._subscribers), {})
+        asyncio.run(run())
+
+    def test_updates_publish_the_changed_fields_once_committed(self):
+        organization = create_organization(tasks=1)
+        task = Tasks.objects.get()
+        layer = RecordingChannelLayer()
+        subscriptions._broker = subscriptions.Broker(layer)
+        self.addCleanup(setattr, subscriptions, '_broker', None)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.post(
+                'mutation($input: UpdateTaskInput!) { updateTask(input: $input) { success } }',
+                {'input': {'id': task.pk, 'title': 'Renamed', 'status': task.status}},
+            )
+        self.assertEqual(layer.published, [])
+        for callback in callbacks:
+            callback()
+        topics = [topic for topic, message in layer.published]
+        self.assertEqual(topics, [f'organization:{organization.pk}:tasks', f'project:{task.project_id}:tasks'])
+        message = layer.published[0][1]
+        self.assertEqual((message['kind'], message['changed_fields']), ('UPDATED', ['title']))
+        self.assertEqual(message['task']['title'], 'Renamed')
+        self.assertNotIn('status', message['task'])
+
+    def test_created_tasks_carry_every_field(self):
+        organization = create_organization(tasks=1)
+        task = Tasks.objects.get()
+        message = subscriptions.task_message(subscriptions.TASK_CREATED, task, organization.pk)
+        self.assertEqual(set(message['task']), {'id', 'project_id', 'created_at', 'updated_at',
+                                                *subscriptions.TASK_FIELDS})
+        self.assertEqual(message['changed_fields'], ['title', 'description', 'status', 'assigneeEmail', 'dueDate'])
+
+    def test_subscriptions_need_a_scope(self):
+        async def run():
+            return await async_schema.subscribe('subscription { taskChanged { kind } }')
+        result = asyncio.run(run())
+        self.assertEqual(result.errors[0].message, 'Pass an organizationId, projectId or taskId')
+
+
+class SearchTests(GraphQLTestCase):
+    query = '''
+        query($organization: Int!, $query: String!, $kinds: [String!], $first: Int, $after: String) {
+            search(organizationId: $organization, query: $query, kinds: $kinds, first: $first, after: $after) {
+                pageInfo { hasNextPage endCursor }
+                edges { node { kind rank project { name } task { title } comment { content } } }
+            }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.organization = create_organization(tasks=0)
+        project = self.organization.projects.get()
+        Tasks.objects.create(project=project, title='Fix login', description='')
+        Tasks.objects.create(project=project, title='Docs', description='Explain the login fix')
+        Tasks.objects.create(project=project, title='Login page', description='')
+        other = create_organization('Other', tasks=0)
+        Tasks.objects.create(project=other.projects.get(), title='Fix login')
+
+    def search(self, query, **variables):
+        response = self.post(self.query, {'organization': self.organization.pk, 'query': query, **variables})
+        return response.json()
+
+    def test_results_are_scoped_and_ranked_by_field_weight(self):
+        edges = self.search('login fix')['data']['search']['edges']
+        self.assertEqual([edge['node']['task']['title'] for edge in edges], ['Fix login', 'Docs'])
+        self.assertEqual([edge['node']['rank'] for edge in edges], [2.0, 0.8])
+
+    def test_pages_cover_every_result_once(self):
+        titles, after = [], None
+        while True:
+            page = self.search('login', kinds=['TASK'], first=1, after=after)['data']['search']
+            titles += [edge['node']['task']['title'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(sorted(titles), ['Docs', 'Fix login', 'Login page'])
+
+    def test_invalid_arguments(self):
+        self.assertEqual(self.search('login', kinds=['USER'])['errors'][0]['message'], 'Unknown search kinds: USER')
+        self.assertEqual(self.search('login', after='nope')['errors'][0]['message'], 'Invalid cursor: nope')
+        self.assertEqual(self.search('  ')['data']['search']['edges'], [])
+
+
+class TaskFilterTests(GraphQLTestCase):
+    query = '''
+        query($organization: Int, $project: Int, $status: [String!], $assignee: String, $dueAfter: DateTime,
+              $dueBefore: DateTime, $orderBy: String, $first: Int, $after: String) {
+            tasks(organizationId: $organization, projectId: $project, status: $status, assigneeEmail: $assignee,
+                  dueAfter: $dueAfter, dueBefore: $dueBefore, orderBy: $orderBy, first: $first, after: $after) {
+                pageInfo { hasNextPage endCursor }
+                edges { node { title } }
+            }
+        }
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.organization = create_organization(tasks=0)
+        project = self.organization.projects.get()
+        day = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        for title, status, assignee, due in [
+            ('a', 'TODO', 'ann@example.com', day),
+            ('b', 'DONE', 'ann@example.com', day + timedelta(days=1)),
+            ('c', 'TODO', 'bob@example.com', day + timedelta(days=2)),
+            ('d', 'IN_PROGRESS', 'ann@example.com', None),
+        ]:
+            Tasks.objects.create(project=project, title=title, status=status, assignee_email=assignee, due_date=due)
+        self.day = day
+
+    def titles(self, **variables):
+        response = self.post(self.query, {'organization': self.organization.pk, **variables}).json()
+        self.assertNotIn('errors', response)
+        return [edge['node']['title'] for edge in response['data']['tasks']['edges']]
+
+    def test_filters_combine(self):
+        self.assertEqual(self.titles(status=['TODO', 'IN_PROGRESS'], orderBy='OLDEST'), ['a', 'c', 'd'])
+        self.assertEqual(self.titles(assignee='ann@example.com', status=['TODO', 'DONE'], orderBy='OLDEST'),
+                         ['a', 'b'])
+        self.assertEqual(
+            self.titles(dueAfter=self.day.isoformat(), dueBefore=(self.day + timedelta(days=2)).isoformat(),
+                        orderBy='DUE_DATE'),
+            ['a', 'b'],
+        )
+
+    def test_due_date_orders_page_undated_tasks_as_the_latest(self):
+        titles, after = [], None
+        while True:
+            response = self.post(self.query, {'organization': self.organization.pk, 'orderBy': 'DUE_DATE_DESC',
+                                              'first': 1, 'after': after}).json()
+            page = response['data']['tasks']
+            titles += [edge['node']['title'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(titles, ['d', 'c', 'b', 'a'])
+        self.assertEqual(self.titles(orderBy='DUE_DATE'), ['a', 'b', 'c', 'd'])
+
+    def test_invalid_filters_are_rejected(self):
+        errors = self.post(self.query, {'organization': self.organization.pk, 'status': ['LATE']}).json()['errors']
+        self.assertEqual(errors[0]['message'], 'Unknown task status: LATE')
+        errors = self.post(self.query, {}).json()['errors']
+        self.assertEqual(errors[0]['message'], 'Pass an organizationId or a projectId')
+
+
+@override_settings(GRAPHQL_INSTRUMENTATION={'EXTENSIONS': False})
+class ProjectionTests(GraphQLTestCase):
+
+    def selects(self, query, variables, table):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(query, variables).json()
+        self.assertNotIn('errors', response)
+        statements = [query['sql'] for query in queries if query['sql'].startswith('SELECT')
+                      and f'FROM "{table}"' in query['sql']]
+        return response['data'], statements[0].split(' FROM ')[0]
+
+    def test_only_selected_columns_are_fetched(self):
+        organization = create_organization(tasks=1)
+        data, columns = self.selects(
+            'query($id: Int!) { tasks(organizationId: $id) { edges { node { title projectId } } } }',
+            {'id': organization.pk}, 'core_tasks',
+        )
+        self.assertEqual(data['tasks']['edges'][0]['node']['title'], 'Task 0')
+        self.assertIn('"title"', columns)
+        self.assertIn('"project_id"', columns)
+        # cursor column of the order
+        self.assertIn('"created_at"', columns)
+        self.assertNotIn('"description"', columns)
+        self.assertNotIn('"assignee_email"', columns)
+
+    def test_fragments_are_followed_and_projections_cached_apart(self):
+        organization = create_organization(tasks=0)
+        Projects.objects.filter(organization=organization).update(description='Described')
+        query = '''
+            query($id: Int!) { organization(id: $id) { name } projects(organizationId: $id) { edges { node {
+                ...on ProjectType { ...details } } } } }
+            fragment details on ProjectType { description }
+        '''
+        data, columns = self.selects(query, {'id': organization.pk}, 'core_projects')
+        self.assertEqual(data['projects']['edges'][0]['node'], {'description': 'Described'})
+        self.assertIn('"description"', columns)
+        self.assertNotIn('"name"', columns)
+        data, columns = self.selects(
+            'query($id: Int!) { projects(organizationId: $id) { edges { node { name } } } }',
+            {'id': organization.pk}, 'core_projects',
+        )
+        self.assertEqual(data['projects']['edges'][0]['node'], {'name': 'Project 0'})
+        self.assertNotIn('"description"', columns)
+
+
+@override_settings(EXPORT={'TOKEN': 'secret', 'CHUNK_SIZE': 1})
+class ExportTests(TestCase):
+
+    def export(self, organization, query='', token='secret'):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.get(f'/export/organizations/{organization.pk}/{query}', **headers)
+
+    def test_ndjson_holds_every_row_of_the_tenant_only(self):
+        organization = create_organization(projects=2, tasks=2, comments=1)
+        create_organization('Other')
+        response = self.export(organization)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines[0]['type'], 'organization')
+        self.assertEqual(lines[0]['id'], organization.pk)
+        types = [line['type'] for line in lines[1:]]
+        self.assertEqual(types, ['projects'] * 2 + ['tasks'] * 4 + ['comments'] * 4)
+        task_ids = [line['id'] for line in lines if line['type'] == 'tasks']
+        self.assertEqual(task_ids, sorted(Tasks.objects.filter(organization=organization).values_list('pk', flat=True)))
+        task = Tasks.objects.get(pk=task_ids[0])
+        self.assertEqual(lines[3]['created_at'], task.created_at.isoformat())
+
+    def test_csv_holds_one_kind(self):
+        organization = create_organization(tasks=2)
+        response = self.export(organization, '?format=csv&kind=tasks')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{organization.slug}-tasks.csv"')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0].split(','), ['id', 'project_id', 'title', 'description', 'status', 'assignee_email',
+                                              'due_date', 'slug', 'created_at', 'updated_at'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.export(organization, '?format=csv').status_code, 400)
+        self.assertEqual(self.export(organization, '?format=xml').status_code, 400)
+
+    def test_export_needs_staff_or_the_token(self):
+        organization = create_organization()
+        self.assertEqual(self.export(organization, token=None).status_code, 403)
+        self.assertEqual(self.export(organization, token='wrong').status_code, 403)
+        response = self.client.get('/export/organizations/123456/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 404)
+
+
+class FailingWriter(bulk_import.BulkCreateWriter):
+    """
+    fails the writes of one chunk, like a dropped connection
+    """
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def write(self, model, instances):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("connection lost")
+        super().write(model, instances)
+
+
+class BulkImportTests(TestCase):
+
+    def setUp(self):
+        self.organization = create_organization(tasks=0)
+        self.project = self.organization.projects.get()
+
+    def lines(self):
+        author = 'author@example.com'
+        return [
+            json.dumps({'type': 'tasks', 'ref': 'T-1', 'project_id': self.project.pk, 'title': 'First'}),
+            json.dumps({'type': 'comments', 'task_ref': 'T-1', 'content': 'On first', 'author_email': author}),
+            'not json',
+            json.dumps({'type': 'tasks', 'ref': 'T-2', 'project': self.project.name, 'title': 'Second'}),
+            json.dumps({'type': 'tasks', 'project_id': 123456, 'title': 'Orphan'}),
+            '',
+            json.dumps({'type': 'comments', 'task_ref': 'T-2', 'content': 'On second', 'author_email': author}),
+            json.dumps({'type': 'tasks', 'ref': 'T-1', 'project_id': self.project.pk, 'title': 'Duplicate ref'}),
+        ]
+
+    def test_records_are_imported_and_rejections_reported(self):
+        job = bulk_import.start_import(self.organization)
+        bulk_import.Importer(job, chunk_size=3).run(self.lines())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.records_committed, job.tasks_created, job.comments_created),
+                         ('COMPLETED', 7, 2, 2))
+        self.assertEqual([number for number, messages in job.errors], [3, 5, 7])
+        self.assertEqual(job.errors[2][1], ['Duplicate task ref T-1'])
+        comments = TaskComment.objects.filter(organization=self.organization).order_by('content')
+        self.assertEqual([comment.task.title for comment in comments], ['First', 'Second'])
+        self.assertEqual(ProjectCounters.objects.get(project=self.project).total_tasks, 2)
+
+    def test_failed_imports_resume_after_the_committed_chunks(self):
+        job = bulk_import.start_import(self.organization)
+        with self.assertRaises(bulk_import.ImportFailed):
+            # chunk 1 writes tasks, refs and a comment, chunk 2 fails on its tasks
+            bulk_import.Importer(job, writer=FailingWriter(fail_on=4), chunk_size=3).run(self.lines())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.records_committed, job.tasks_created), ('FAILED', 3, 1))
+        self.assertTrue(job.last_error.startswith('record 4-6: RuntimeError'))
+
+        job = bulk_import.resume_import(job.pk, self.organization.pk)
+        bulk_import.Importer(job, chunk_size=3).run(self.lines())
+        titles = Tasks.objects.filter(organization=self.organization).values_list('title', flat=True)
+        self.assertEqual(sorted(titles), ['First', 'Second'])
+        self.assertEqual(TaskComment.objects.filter(organization=self.organization).count(), 2)
+        with self.assertRaisesMessage(ValueError, 'already completed'):
+            bulk_import.resume_import(job.pk, self.organization.pk)
+
+    @override_settings(IMPORT={'TOKEN': 'secret'})
+    def test_csv_import_through_the_api(self):
+        url = f'/import/organizations/{self.organization.pk}/?format=csv&kind=tasks'
+        body = f'project_id,title,status\n{self.project.pk},Imported,DONE\n{self.project.pk},Late,LATE\n'
+        self.assertEqual(self.client.post(url, body, content_type='text/csv').status_code, 403)
+        response = self.client.post(url, body, content_type='text/csv', HTTP_AUTHORIZATION='Bearer secret')
+        report = response.json()
+        self.assertEqual((report['status'], report['tasks_created'], report['rejected']), ('COMPLETED', 1, 1))
+        self.assertEqual(Tasks.objects.get(title='Imported').status, 'DONE')
+
+
+@override_settings(DATABASE_ROUTING={'REPLICAS': ['replica_1', 'replica_2'], 'TENANT_DATABASES': {7: ['big_1']}})
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def test_tenants_pinned_together_read_from_their_replicas(self):
+        self.assertEqual(routers.replica_for([7]), 'big_1')
+        self.assertIn(routers.replica_for([7, 8]), ['replica_1', 'replica_2'])
+        self.assertIn(routers.replica_for(), ['replica_1', 'replica_2'])
+        with override_settings(DATABASE_ROUTING={}):
+            self.assertIsNone(routers.replica_for([7]))
+
+    def test_reads_of_the_block_go_to_the_replica_outside_transactions(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Tasks))
+        with routers.read_from('replica_1'):
+            self.assertEqual(router.db_for_read(Tasks), 'replica_1')
+            self.assertEqual(router.db_for_write(Tasks), 'default')
+        self.assertIsNone(router.db_for_read(Tasks))
+
+    def test_queries_of_clients_that_wrote_read_from_the_primary(self):
+        view = PersistedGraphQLView()
+        query = parse('{ organizations { id } }').definitions[0]
+        mutation = parse('mutation { createTaskComment(input: {taskId: 1}) { success } }').definitions[0]
+        request = RequestFactory().post('/graphql/')
+        self.assertIn(view.get_read_database(request, query), ['replica_1', 'replica_2'])
+        self.assertIsNone(view.get_read_database(request, mutation))
+        request.COOKIES['db_primary'] = '1'
+        self.assertIsNone(view.get_read_database(request, query))
+
+    def test_writes_set_the_sticky_cookie(self):
+        request = RequestFactory().post('/graphql/')
+        middleware = routers.ReplicaStickinessMiddleware(lambda request: HttpResponse())
+        self.assertNotIn('db_primary', middleware(request).cookies)
+        routers.mark_written(request)
+        cookie = middleware(request).cookies['db_primary']
+        self.assertEqual(cookie['max-age'], 5)
+
+
+class ReplicaTransactionTests(TestCase):
+
+    def test_reads_inside_transactions_stay_on_the_primary(self):
+        # TestCase runs every test in a transaction
+        with routers.read_from('replica_1'):
+            self.assertIsNone(routers.ReplicaRouter().db_for_read(Tasks))
+
+
+class FakeConnection:
+    """
+    the parts of a psycopg2 connection the pool uses
+    """
+
+    def __init__(self, status=psycopg2_extensions.TRANSACTION_STATUS_IDLE, healthy=True):
+        self.closed = 0
+        self.healthy = healthy
+        self.rolled_back = False
+        self.info = type('Info', (), {'transaction_status': status})()
+
+    def rollback(self):
+        self.rolled_back = True
+        self.info.transaction_status = psycopg2_extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        if not self.healthy:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        return contextlib.nullcontext(type('Cursor', (), {'execute': lambda self, sql: None})())
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connected.append(connection)
+        return connection, 'read committed'
+
+    def setUp(self):
+        self.connected = []
+        self.pool = ConnectionPool(max_size=2, timeout=0.01, max_lifetime=60)
+
+    def test_idle_connections_are_reused(self):
+        first = self.pool.checkout(self.connect)
+        self.pool.checkin(*first)
+        self.assertIs(self.pool.checkout(self.connect)[0], first[0])
+        self.assertEqual(len(self.connected), 1)
+
+    def test_open_transactions_are_rolled_back_on_checkin(self):
+        connection, isolation_level, created_at = self.pool.checkout(self.connect)
+        connection.info.transaction_status = psycopg2_extensions.TRANSACTION_STATUS_INERROR
+        self.pool.checkin(connection, isolation_level, created_at)
+        self.assertTrue(connection.rolled_back)
+        self.assertIs(self.pool.checkout(self.connect)[0], connection)
+
+    def test_expired_unhealthy_and_unusable_connections_are_discarded(self):
+        expired = self.pool.checkout(self.connect)
+        self.pool.checkin(expired[0], expired[1], expired[2] - 120)
+        self.assertEqual(expired[0].closed, 1)
+        unhealthy = self.pool.checkout(self.connect)
+        unhealthy[0].healthy = False
+        self.pool.checkin(*unhealthy)
+        self.assertIsNot(self.pool.checkout(self.connect, health_check=True)[0], unhealthy[0])
+        self.assertEqual(unhealthy[0].closed, 1)
+        broken = self.pool.checkout(self.connect)
+        self.pool.checkin(*broken, reusable=False)
+        self.assertEqual(broken[0].closed, 1)
+
+    def test_checkout_waits_for_a_free_slot(self):
+        self.pool.checkout(self.connect)
+        self.pool.checkout(self.connect)
+        with self.assertRaisesMessage(psycopg2.OperationalError, 'Connection pool exhausted'):
+            self.pool.checkout(self.connect)
+
+
+class ConnectionBenchmarkTests(TestCase):
+
+    def test_modes_of_the_database(self):
+        # sqlite has no POOL, the pooled mode needs core.postgresql_pool
+        self.assertEqual(connection_modes(), ['reconnect', 'persistent'])
+        with self.assertRaisesMessage(ValueError, 'pooled'):
+            run_connection_benchmark(schema, modes=['pooled'])
+        with self.assertRaisesMessage(ValueError, 'mutation'):
+            run_connection_benchmark(schema, operation='create_task')
+
+
+class TenantColumnTests(TestCase):
+
+    def test_created_rows_carry_their_organization(self):
+        organization = create_organization(tasks=1)
+        task = Tasks.objects.get()
+        self.assertEqual(task.organization_id, organization.pk)
+        self.assertEqual(TaskComment.objects.get().organization_id, organization.pk)
+        # no lookup with the parent loaded
+        project = task.project
+        with self.assertNumQueries(1):
+            Tasks.objects.create(project=project, title='Loaded project')
+        with self.assertNumQueries(1):
+            TaskComment.objects.create(task=task, content='Loaded task', author_email='author@example.com')
+
+    def test_backfill_fills_rows_written_without_one(self):
+        organization = create_organization(projects=2, tasks=3, comments=2)
+        Tasks.objects.update(organization=None)
+        TaskComment.objects.update(organization=None)
+        with self.assertRaisesMessage(CommandError, '6 tasks, 12 comments without organization_id'):
+            call_command('backfill_organization_ids', '--verify')
+        out = StringIO()
+        call_command('backfill_organization_ids', '--batch-size', '4', stdout=out)
+        self.assertIn('Backfilled 6 tasks and 12 comments', out.getvalue())
+        self.assertEqual(set(Tasks.objects.values_list('organization_id', flat=True)), {organization.pk})
+        self.assertEqual(set(TaskComment.objects.values_list('organization_id', flat=True)), {organization.pk})
+        call_command('backfill_organization_ids', '--verify', stdout=StringIO())
+
+    def test_owners_are_read_from_the_tenant_column(self):
+        organization = create_organization(tasks=2)
+        backfilled, pending = Tasks.objects.order_by('pk')
+        # written before the backfill, the project has the organization
+        Tasks.objects.filter(pk=pending.pk).update(organization=None)
+        with CaptureQueriesContext(connection) as queries:
+            owners = cache.QueryCache(cache.LocalMemoryBackend()).organizations_of_tasks([backfilled.pk, pending.pk])
+        self.assertEqual(owners, {backfilled.pk: organization.pk, pending.pk: organization.pk})
+        self.assertNotIn('JOIN', queries[0]['sql'])
+        comment = TaskComment.objects.create(task_id=pending.pk, content='Pending', author_email='author@example.com')
+        self.assertEqual(comment.organization_id, organization.pk)
+
+    def test_partitioning_needs_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'Declarative partitioning needs PostgreSQL'):
+            call_command('partition_tenant_tables', stdout=StringIO())
+
+
+class RateLimitTests(GraphQLTestCase):
+
+    def test_tenants_have_separate_buckets(self):
+        first, second = create_organization('First'), create_organization('Second')
+        query = '{ projects(organizationId: %d, first: 1) { edges { node { id } } } }'
+        with override_settings(GRAPHQL_RATE_LIMIT={'RATE': 0.01, 'BURST': 1}):
+            self.assertEqual(self.post(query % first.pk).status_code, 200)
+            response = self.post(query % first.pk)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(self.error_codes(response), ['RATE_LIMITED'])
+            self.assertIn('Retry-After', response)
+            self.assertEqual(self.post(query % second.pk).status_code, 200)
+
+    def test_unknown_ids_are_charged_to_the_global_scope(self):
+        organization = create_organization()
+        with override_settings(GRAPHQL_RATE_LIMIT={'RATE': 0.01, 'BURST': 1}):
+            self.assertEqual(self.post('{ organization(id: 123456) { id } }').status_code, 200)
+            response = self.post('{ organization(id: %d) { id } task(id: 654321) { id } }' % organization.pk)
+            self.assertEqual(response.status_code, 429)
+        self.assertEqual(analyze('{ organization(id: %d) { id } }' % organization.pk).scopes(), {organization.pk})
+
+    def test_unscoped_root_fields_are_charged_to_the_global_scope(self):
+        organization = create_organization()
+        analysis = analyze('{ organizations { id } organization(id: %d) { id } }' % organization.pk)
+        self.assertEqual(analysis.scopes(), {organization.pk, cache.GLOBAL_SCOPE})
+
+    def test_concurrent_operations_are_capped(self):
+        limiter = ratelimit.LocalRateLimiter(concurrency=1)
+        admission = limiter.admit({1})
+        with self.assertRaises(ratelimit.RateLimited) as raised:
+            limiter.admit({1, 2})
+        self.assertEqual(raised.exception.error.extensions['code'], 'TOO_MANY_CONCURRENT_OPERATIONS')
+        # all or nothing: the slot of 2 was given back
+        limiter.admit({2}).release()
+        admission.release()
+        admission.release()
+        limiter.admit({1}).release()
+        self.assertEqual(limiter._in_flight, {})
+
+    def test_in_flight_counters_expiring_mid_flight_stay_at_zero(self):
+        limiter = ratelimit.CacheRateLimiter(concurrency=2)
+        key = 'ratelimit:inflight:1'
+        running = [limiter.admit({1}), limiter.admit({1})]
+        # the counter expires while both operations run, then a third one comes in
+        caches['default'].delete(key)
+        running.append(limiter.admit({1}))
+        for admission in running:
+            admission.release()
+        self.assertEqual(caches['default'].get(key), 0)
+        limiter.admit({1})
+        limiter.admit({1})
+        with self.assertRaises(ratelimit.RateLimited):
+            limiter.admit({1})
+
+    def test_refilled_buckets_are_dropped(self):
+        limiter = ratelimit.LocalRateLimiter(rate=10 ** 6, burst=2)
+        limiter.SWEEP_AT = 10
+        for scope in range(100):
+            limiter.admit({scope}).release()
+        self.assertLess(len(limiter._buckets), 10)
+
+
+class RemovalTests(TestCase):
+
+    def setUp(self):
+        self.organization = create_organization(projects=2, tasks=3, comments=2)
+        self.other = create_organization('Other')
+        counters.rebuild_counters([self.organization.pk, self.other.pk])
+        self.project = self.organization.projects.order_by('pk').first()
+
+    def test_projects_are_removed_in_batches_with_bookkeeping(self):
+        batches = []
+        remover = Remover(batch_size=2, on_batch=lambda remover: batches.append(dict(remover.removed)))
+        remover.remove_project(self.project)
+        self.assertEqual(remover.removed, {'projects': 1, 'tasks': 3, 'comments': 6})
+        self.assertEqual(batches[0], {'projects': 0, 'tasks': 2, 'comments': 4})
+        self.assertFalse(Tasks.objects.filter(project_id=self.project.pk).exists())
+        organization_counters = OrganizationCounters.objects.get(pk=self.organization.pk)
+        self.assertEqual((organization_counters.total_projects, organization_counters.total_tasks), (1, 3))
+        kinds = Tombstone.objects.filter(organization_id=self.organization.pk).values_list('kind', flat=True)
+        self.assertEqual(set(kinds), {sync.MODEL_KINDS[model] for model in (Projects, Tasks, TaskComment)})
+        self.assertEqual(len(kinds), 10)
+
+    def test_cold_projects_are_archived(self):
+        Projects.objects.filter(pk=self.project.pk).update(status='COMPLETED')
+        Projects.objects.filter(organization=self.organization).update(updated_at=timezone.now() - timedelta(days=400))
+        Tasks.objects.filter(organization=self.organization).update(updated_at=timezone.now() - timedelta(days=400))
+        counters.rebuild_counters([self.organization.pk])
+        out = StringIO()
+        call_command('archive_projects', '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue().strip(), '1 projects to archive')
+        call_command('archive_projects', '--batch-size', '2', stdout=out)
+        self.assertIn('Archived 1 projects, 3 tasks and 6 comments', out.getvalue())
+        self.assertEqual(ArchivedProject.objects.get().name, self.project.name)
+        self.assertEqual(set(ArchivedTask.objects.values_list('project_id', flat=True)), {self.project.pk})
+        self.assertEqual(ArchivedTaskComment.objects.count(), 6)
+        self.assertEqual(Projects.objects.filter(organization=self.organization).count(), 1)
+
+    def test_recently_active_projects_stay(self):
+        Projects.objects.filter(organization=self.organization).update(
+            status='COMPLETED', updated_at=timezone.now() - timedelta(days=400)
+        )
+        # only the tasks of the first project are idle, the other project's were just created
+        Tasks.objects.filter(project=self.project).update(updated_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(list(cold_projects(organization_id=self.organization.pk)), [self.project])
+
+    def test_organizations_are_deleted_whole(self):
+        ActivityEntry.objects.bulk_create([
+            ActivityEntry(organization_id=organization.pk, kind=ActivityEntry.PROJECT, object_id=project.pk,
+                          action=ActivityEntry.CREATED, created_at=timezone.now())
+            for organization in (self.organization, self.other) for project in organization.projects.all()
+        ])
+        out = StringIO()
+        call_command('delete_organization', str(self.organization.pk), '--batch-size', '2', stdout=out)
+        self.assertIn('deleted: 2 projects, 6 tasks, 12 comments', out.getvalue())
+        self.assertFalse(Organizations.objects.filter(pk=self.organization.pk).exists())
+        self.assertFalse(Tombstone.objects.filter(organization_id=self.organization.pk).exists())
+        self.assertEqual(list(ActivityEntry.objects.values_list('organization_id', flat=True)), [self.other.pk])
+        self.assertEqual(TaskComment.objects.count(), 2)
+        with self.assertRaisesMessage(CommandError, 'does not exist'):
+            call_command('delete_organization', str(self.organization.pk), stdout=StringIO())
+
+
+class ChangesSinceTests(GraphQLTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.organization = create_organization(projects=2, tasks=2, comments=1)
+        # settled changes, older than SETTLE_SECONDS
+        self.settled_at = timezone.now() - timedelta(minutes=5)
+        for model in (Projects, Tasks, TaskComment):
+            model.objects.update(updated_at=self.settled_at)
+
+    def sync_all(self, cursor=None, first=3):
+        """
+        (kind, id) of the changes of every page from cursor, the cursor of the last page
+        """
+        changes = []
+        while True:
+            page = sync.changes_since(self.organization.pk, cursor, first)
+            changes += [(kind, row.pk) for kind in ('projects', 'tasks', 'comments') for row in page[kind]]
+            changes += [('deleted', tombstone.object_id) for tombstone in page['deleted']]
+            cursor = page['cursor']
+            if not page['has_more']:
+                return changes, cursor
+
+    def test_pages_cover_every_change_once(self):
+        changes, cursor = self.sync_all()
+        self.assertEqual(len(changes), 2 + 4 + 4)
+        self.assertEqual(len(set(changes)), len(changes))
+        self.assertEqual(self.sync_all(cursor)[0], [])
+
+    def test_updates_and_removals_after_a_cursor(self):
+        _, cursor = self.sync_all()
+        updated, removed = Tasks.objects.order_by('pk')[:2]
+        Tasks.objects.filter(pk=updated.pk).update(updated_at=timezone.now())
+        removed_comments = list(removed.comments.values_list('pk', flat=True))
+        Remover().remove_tasks(Tasks.objects.filter(pk=removed.pk), self.organization.pk)
+        changes, _ = self.sync_all(cursor)
+        self.assertEqual(sorted(changes), sorted([
+            ('tasks', updated.pk), ('deleted', removed.pk),
+            *[('deleted', pk) for pk in removed_comments],
+        ]))
+
+    def test_cursors_stop_at_the_settle_point(self):
+        # changes still settling are served, and served again once settled
+        TaskComment.objects.update(updated_at=timezone.now())
+        page = sync.changes_since(self.organization.pk, first=100)
+        self.assertEqual(len(page['comments']), 4)
+        self.assertFalse(page['has_more'])
+        self.assertEqual(len(sync.changes_since(self.organization.pk, page['cursor'])['comments']), 4)
+        # a page never ends past the settle point, even with more changes to come
+        page = sync.changes_since(self.organization.pk, first=7)
+        self.assertFalse(page['has_more'])
+        settle_point = sync.decode_sync_cursor(page['cursor']).changed_at
+        self.assertLess(settle_point, timezone.now() - timedelta(seconds=sync.sync_settings()['SETTLE_SECONDS'] - 1))
+        page = sync.changes_since(self.organization.pk, first=2)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(sync.decode_sync_cursor(page['cursor']).changed_at, self.settled_at)
+
+    def test_first_must_be_at_least_one(self):
+        response = self.post('{ changesSince(organizationId: %d, first: 0) { cursor } }' % self.organization.pk)
+        self.assertEqual(response.json()['errors'][0]['message'], 'first must be at least 1')
+
+    def test_expired_cursors_are_rejected(self):
+        cursor = sync.encode_sync_cursor(sync.Position(timezone.now() - timedelta(days=365), 0, 0))
+        response = self.post(
+            'query($cursor: String) { changesSince(organizationId: %d, cursor: $cursor) { cursor } }'
+            % self.organization.pk, {'cursor': cursor},
+        )
+        self.assertEqual(self.error_codes(response), ['SYNC_CURSOR_EXPIRED'])
+
+
+@override_settings(ACTIVITY_LOG={'BACKGROUND': False})
+class ActivityLogTests(GraphQLTestCase):
+
+    def setUp(self):
+        super().setUp()
+        activity._activity_writer = None
+        self.organization = create_organization(tasks=1)
+        self.project = self.organization.projects.get()
+
+    def mutate(self, query, variables):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.post(query, variables).json()['data']
+
+    def create_task(self, **fields):
+        return self.mutate(
+            'mutation($input: CreateTaskInput!) { createTask(input: $input) { task { id } } }',
+            {'input': {'projectId': self.project.pk, 'title': 'Write tests', **fields}},
+        )['createTask']['task']['id']
+
+    def update_task(self, pk, **fields):
+        return self.mutate(
+            'mutation($input: UpdateTaskInput!) { updateTask(input: $input) { success } }',
+            {'input': {'id': pk, **fields}},
+        )['updateTask']
+
+    def test_created_and_updated_objects_are_logged(self):
+        task_id = int(self.create_task(assigneeEmail='dev@example.com'))
+        self.update_task(task_id, title='Write more tests', status='IN_PROGRESS')
+        created, updated = ActivityEntry.objects.filter(object_id=task_id, kind=ActivityEntry.TASK).order_by('pk')
+        self.assertEqual(created.action, ActivityEntry.CREATED)
+        self.assertEqual(created.organization_id, self.organization.pk)
+        self.assertEqual(
+            {field: created.changes[field] for field in ('project_id', 'title', 'status', 'assignee_email')},
+            {
+                'project_id': self.project.pk, 'title': 'Write tests', 'status': 'TODO',
+                'assignee_email': 'dev@example.com',
+            },
+        )
+        self.assertEqual(updated.changes, {
+            'title': ['Write tests', 'Write more tests'], 'status': ['TODO', 'IN_PROGRESS'],
+        })
+
+    def test_unchanged_updates_are_not_logged(self):
+        task = self.project.tasks.get()
+        self.assertTrue(self.update_task(task.pk, title=task.title)['success'])
+        self.assertFalse(ActivityEntry.objects.exists())
+
+    def test_comments_are_logged_once_committed(self):
+        task = self.project.tasks.get()
+        data = self.mutate(
+            'mutation($input: CreateTaskCommentInput!) { createTaskComment(input: $input) { comment { id } } }',
+            {'input': {'taskId': task.pk, 'content': 'Looks good', 'authorEmail': 'reviewer@example.com'}},
+        )
+        entry = ActivityEntry.objects.get(kind=ActivityEntry.COMMENT)
+        self.assertEqual(str(entry.object_id), data['createTaskComment']['comment']['id'])
+        self.assertEqual(entry.changes['content'], 'Looks good')
+
+    def test_feed_is_newest_first(self):
+        first, second = self.create_task(), self.create_task()
+        response = self.post(
+            '{ activityFeed(organizationId: %d, kind: "task", first: 10) '
+            '{ edges { node { objectId kind action } } } }' % self.organization.pk
+        )
+        nodes = [edge['node'] for edge in response.json()['data']['activityFeed']['edges']]
+        self.assertEqual(nodes, [
+            {'objectId': int(second), 'kind': 'task', 'action': 'created'},
+            {'objectId': int(first), 'kind': 'task', 'action': 'created'},
+        ])
+        response = self.post('{ activityFeed(organizationId: %d, kind: "bogus") { edges { cursor } } }' % 1)
+        self.assertEqual(response.json()['errors'][0]['message'], 'Unknown activity kind: bogus')
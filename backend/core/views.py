@@ -1,3 +1,463 @@
-from django.shortcuts import render
+import codecs
+import json
+import math
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse,
+    StreamingHttpResponse,
+)
+from graphene_django.settings import graphene_settings
+from graphene_django.views import MUTATION_ERRORS_FLAG, GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+
+from .bulk_import import ImportFailed, Importer, import_settings, job_report, resume_import, start_import
+from .complexity import OperationAnalysis, check_limits, check_operation, complexity_settings
+from .export import CONTENT_TYPES, aiterate, export_chunks, export_settings
+from .instrumentation import OperationProfile, instrumentation_settings, metrics
+from .models import Organizations
+from .persisted_queries import get_persisted_queries
+from .ratelimit import RateLimited, get_rate_limiter, ratelimit_settings
+from .routers import is_sticky, mark_written, read_from, replica_for, routing_settings
+from .schema import async_schema, schema
+
+
+class PersistedGraphQLView(GraphQLView):
+    """
+    GraphQLView serving automatic persisted queries from the document cache
+    (see core/persisted_queries.py), profiling every operation
+    (see core/instrumentation.py), admitting operations within their
+    tenants' rate limits (see core/ratelimit.py), rejecting over-budget
+    operations before execution (see core/complexity.py) and reading queries
+    from the replicas (see core/routers.py)
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        request.graphql_retry_after = None
+        return self.set_retry_after(request, super().dispatch(request, *args, **kwargs))
+
+    @staticmethod
+    def set_retry_after(request, response):
+        retry_after = getattr(request, 'graphql_retry_after', None)
+        if retry_after is not None:
+            response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+
+    def get_response(self, request, data, show_graphiql=False):
+        request.graphql_rate_limited = False
+        result, status_code = super().get_response(request, data, show_graphiql)
+        return result, 429 if request.graphql_rate_limited else status_code
+
+    @staticmethod
+    def rate_limited(request, retry_after):
+        request.graphql_rate_limited = True
+        request.graphql_retry_after = max(retry_after, getattr(request, 'graphql_retry_after', None) or 0)
+
+    @staticmethod
+    def release_admission(request):
+        admission = request.__dict__.pop('graphql_admission', None)
+        if admission is not None:
+            admission.release()
+
+    @staticmethod
+    def get_persisted_hash(request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        persisted_query = (extensions or {}).get('persistedQuery') or {}
+        return persisted_query.get('sha256Hash')
+
+    def start_profile(self, request, operation_name):
+        options = instrumentation_settings()
+        if not options['ENABLED']:
+            return None
+        profile = request.graphql_profile = OperationProfile(operation_name, options['N_PLUS_ONE_THRESHOLD'])
+        return profile
+
+    def finish_profile(self, request, profile, result):
+        request.graphql_profile = None
+        if result is not None:
+            metrics.observe(profile)
+            if instrumentation_settings()['EXTENSIONS']:
+                request.graphql_extensions = {'profile': profile.as_extensions()}
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        profile = self.start_profile(request, operation_name)
+        if profile is None:
+            return self.execute_persisted_request(request, data, query, variables, operation_name, show_graphiql)
+        result = None
+        try:
+            with profile:
+                result = self.execute_persisted_request(
+                    request, data, query, variables, operation_name, show_graphiql
+                )
+        finally:
+            self.finish_profile(request, profile, result)
+        return result
+
+    def json_encode(self, request, d, pretty=False):
+        # graphene-django drops ExecutionResult.extensions, add the profile of the operation just run
+        extensions = request.__dict__.pop('graphql_extensions', None)
+        if extensions is not None:
+            d = {**d, 'extensions': extensions}
+        return super().json_encode(request, d, pretty)
+
+    def execute_persisted_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        document, operation_ast, result = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if document is None:
+            return result
+        try:
+            return self.execute_document(
+                request, self.schema.graphql_schema, document, operation_ast, variables, operation_name
+            )
+        finally:
+            self.release_admission(request)
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """
+        return (document, operation_ast, None) of an operation ready to be executed,
+        or (None, None, result) when it ends before execution
+        """
+        sha256_hash = self.get_persisted_hash(request, data)
+        if not query and not sha256_hash:
+            if show_graphiql:
+                return None, None, None
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return None, None, ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, validation_errors = get_persisted_queries().get_document(
+                schema, query or None, sha256_hash,
+                self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+        except GraphQLError as e:
+            return None, None, ExecutionResult(errors=[e])
+
+        if validation_errors:
+            return None, None, ExecutionResult(data=None, errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        profile = getattr(request, 'graphql_profile', None)
+        if profile is not None and operation_ast is not None and operation_ast.name is not None:
+            profile.operation_name = operation_ast.name.value
+
+        if operation_ast is not None and operation_ast.operation == OperationType.SUBSCRIPTION:
+            return None, None, ExecutionResult(errors=[
+                GraphQLError('Subscriptions are served over websocket (graphql-transport-ws) at /graphql/')
+            ])
+
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None, None, None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST request.'.format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        # targeted organizations are admitted, charged and pick the replicas of pinned tenants
+        request.graphql_organizations = set()
+        complexity_enabled = complexity_settings()['ENABLED']
+        ratelimit_enabled = ratelimit_settings()['ENABLED']
+        if operation_ast is None or not (
+            complexity_enabled or ratelimit_enabled or routing_settings()['TENANT_DATABASES']
+        ):
+            return document, operation_ast, None
+        try:
+            analysis = OperationAnalysis(schema, document, operation_ast, variables)
+            if complexity_enabled:
+                # too deep or complex operations are rejected before any owner lookup
+                check_limits(analysis)
+        except GraphQLError as e:
+            return None, None, ExecutionResult(errors=[e])
+        request.graphql_organizations = analysis.organizations()
+
+        if ratelimit_enabled:
+            try:
+                request.graphql_admission = get_rate_limiter().admit(analysis.scopes())
+            except RateLimited as e:
+                self.rate_limited(request, e.retry_after)
+                return None, None, ExecutionResult(errors=[e.error])
+
+        if complexity_enabled:
+            try:
+                check_operation(schema, document, operation_ast, variables, analysis)
+            except GraphQLError as e:
+                self.release_admission(request)
+                return None, None, ExecutionResult(errors=[e])
+            if profile is not None:
+                profile.cost = analysis.cost
+
+        return document, operation_ast, None
+
+    def get_read_database(self, request, operation_ast):
+        """
+        replica alias a query reads from, None for the primary
+        (mutations, and queries of a client that has just written)
+        """
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY or is_sticky(request):
+            return None
+        return replica_for(getattr(request, 'graphql_organizations', ()))
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options['execution_context_class'] = self.execution_context_class
+        return execute_options
+
+    def execute_document(self, request, schema, document, operation_ast, variables, operation_name):
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+                mark_written(request)
+                if (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+                ):
+                    with transaction.atomic():
+                        result = execute(schema, document, **execute_options)
+                        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                            transaction.set_rollback(True)
+                    return result
+
+            with read_from(self.get_read_database(request, operation_ast)):
+                return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncGraphQLView(PersistedGraphQLView):
+    """
+    PersistedGraphQLView for ASGI: queries run on core.schema.async_schema, whose
+    resolvers await the Django async ORM so sibling fields are resolved
+    concurrently; mutations (serial by definition) run on the ORM thread.
+    ATOMIC_REQUESTS does not apply to async views.
+    """
+    view_is_async = True
+
+    def __init__(self, schema=None, **kwargs):
+        super().__init__(schema=schema or async_schema, **kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.graphql_retry_after = None
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(
+                    HttpResponseNotAllowed(['GET', 'POST'], 'GraphQL only supports GET and POST requests.')
+                )
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            if self.batch:
+                responses = [await self.get_response(request, entry) for entry in data]
+                result = '[{}]'.format(','.join([response[0] for response in responses]))
+                status_code = responses and max(responses, key=lambda response: response[1])[1] or 200
+            else:
+                result, status_code = await self.get_response(request, data)
+
+            return self.set_retry_after(
+                request, HttpResponse(status=status_code, content=result, content_type='application/json')
+            )
+
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+
+    async def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        request.graphql_rate_limited = False
+
+        execution_result = await self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(not getattr(e, 'path', None) for e in execution_result.errors):
+            status_code = 429 if request.graphql_rate_limited else 400
+        else:
+            response['data'] = execution_result.data
+
+        if self.batch:
+            response['id'] = id
+            response['status'] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    async def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        profile = self.start_profile(request, operation_name)
+        if profile is None:
+            return await self.execute_persisted_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        result = None
+        # database connections belong to the ORM thread, the query wrappers have to be installed there
+        await sync_to_async(profile.__enter__)()
+        try:
+            result = await self.execute_persisted_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        finally:
+            await sync_to_async(profile.__exit__)(None, None, None)
+            self.finish_profile(request, profile, result)
+        return result
+
+    async def execute_persisted_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # document cache, cost budgets and owner lookups are synchronous
+        document, operation_ast, result = await sync_to_async(self.prepare_operation)(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if document is None:
+            return result
+        try:
+            return await self.execute_admitted_document(request, document, operation_ast, variables, operation_name)
+        finally:
+            self.release_admission(request)
+
+    async def execute_admitted_document(self, request, document, operation_ast, variables, operation_name):
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            request.graphql_async = False
+            return await sync_to_async(self.execute_document)(
+                request, schema.graphql_schema, document, operation_ast, variables, operation_name
+            )
+
+        request.graphql_async = True
+        try:
+            # the resolvers' ORM threads inherit the routing context
+            with read_from(self.get_read_database(request, operation_ast)):
+                result = execute(
+                    self.schema.graphql_schema, document,
+                    **self.get_execute_options(request, variables, operation_name)
+                )
+                if isawaitable(result):
+                    result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def graphql_metrics(request):
+    """
+    histograms of this process, for staff users or with GRAPHQL_INSTRUMENTATION['METRICS_TOKEN']
+    """
+    token = getattr(settings, 'GRAPHQL_INSTRUMENTATION', {}).get('METRICS_TOKEN')
+    authorized = request.user.is_staff or (
+        token and request.headers.get('Authorization') == f'Bearer {token}'
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    return JsonResponse(metrics.snapshot())
+
+
+def export_organization(request, organization_id):
+    """
+    streamed export of an organization (see core/export.py), for staff users or with EXPORT['TOKEN'];
+    ?format=ndjson|csv, ?kind=projects|tasks|comments repeatable (one kind for csv)
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    token = export_settings()['TOKEN']
+    authorized = request.user.is_staff or (
+        token and request.headers.get('Authorization') == f'Bearer {token}'
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    organization = Organizations.objects.filter(pk=organization_id).first()
+    if organization is None:
+        raise Http404(f"Organization {organization_id} does not exist")
+
+    export_format = request.GET.get('format', 'ndjson')
+    kinds = request.GET.getlist('kind')
+    try:
+        chunks = export_chunks(organization, export_format, kinds)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if isinstance(request, ASGIRequest):
+        # a sync iterator would be read whole before the first byte under ASGI
+        chunks = aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+    filename = '-'.join([organization.slug, *kinds]) if export_format == 'csv' else organization.slug
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+def import_organization(request, organization_id):
+    """
+    streamed import of tasks and comments into an organization (see core/bulk_import.py),
+    with `Authorization: Bearer IMPORT['TOKEN']`; the request body is read line by line.
+    ?format=ndjson|csv, ?kind=tasks|comments (required for csv), ?job=<id> resumes a failed import
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    token = import_settings()['TOKEN']
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    organization = Organizations.objects.filter(pk=organization_id).first()
+    if organization is None:
+        raise Http404(f"Organization {organization_id} does not exist")
+
+    try:
+        if request.GET.get('job'):
+            job = resume_import(request.GET['job'], organization.pk)
+        else:
+            job = start_import(
+                organization, request.GET.get('format', 'ndjson'), request.GET.get('kind', ''), source='api'
+            )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    importer = Importer(job)
+    try:
+        importer.run(codecs.iterdecode(request, 'utf-8'))
+    except ImportFailed as e:
+        return JsonResponse(job_report(e.job, importer), status=500)
+    return JsonResponse(job_report(job, importer))
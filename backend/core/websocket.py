@@ -0,0 +1,214 @@
+"""
+GraphQL subscriptions over websocket, graphql-transport-ws protocol
+(https://github.com/enisdenjo/graphql-ws/blob/master/PROTOCOL.md).
+
+GraphQLWebSocketApp is a plain ASGI application mounted by backend/asgi.py
+next to Django; every `subscribe` message runs one subscription operation of
+core.schema.async_schema and forwards its events as `next` messages until the
+client completes it or disconnects. Queries and mutations stay on /graphql/.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from graphql import GraphQLError, OperationType, get_operation_ast, subscribe
+
+from .persisted_queries import get_persisted_queries
+from .schema import async_schema
+from .subscriptions import subscription_settings
+
+PROTOCOL = 'graphql-transport-ws'
+
+# close codes of the protocol
+BAD_REQUEST = 4400
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+SUBPROTOCOL_NOT_ACCEPTABLE = 4406
+CONNECTION_INIT_TIMEOUT = 4408
+SUBSCRIBER_ALREADY_EXISTS = 4409
+TOO_MANY_INITIALISATION_REQUESTS = 4429
+
+
+class WebSocketContext:
+    """
+    info.context of subscription resolvers
+    """
+    graphql_async = True
+
+    def __init__(self, scope, connection_params=None):
+        self.scope = scope
+        self.connection_params = connection_params or {}
+
+
+class CloseConnection(Exception):
+
+    def __init__(self, code, reason=''):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class GraphQLWebSocketConnection:
+    """
+    One websocket connection and its running subscriptions
+    """
+
+    def __init__(self, schema, scope, receive, send, options):
+        self.schema = schema
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self.options = options
+        self.context = None
+        self.acknowledged = False
+        self.subscriptions = {}  # id -> task
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self._send_lock:
+            await self._send(message)
+
+    async def send_json(self, message):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def close(self, code, reason=''):
+        await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+
+    async def run(self):
+        init_timeout = asyncio.get_running_loop().call_later(
+            self.options['CONNECTION_INIT_TIMEOUT'], self._init_timed_out
+        )
+        try:
+            while True:
+                event = await self.receive()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                if event['type'] != 'websocket.receive':
+                    continue
+                try:
+                    await self.handle(event.get('text') or (event.get('bytes') or b'').decode())
+                except CloseConnection as e:
+                    await self.close(e.code, e.reason)
+                    break
+        finally:
+            init_timeout.cancel()
+            for task in self.subscriptions.values():
+                task.cancel()
+
+    def _init_timed_out(self):
+        if not self.acknowledged:
+            asyncio.ensure_future(self.close(CONNECTION_INIT_TIMEOUT, 'Connection initialisation timeout'))
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text)
+            message_type = message['type']
+        except (ValueError, TypeError, KeyError):
+            raise CloseConnection(BAD_REQUEST, 'Invalid message received')
+
+        if message_type == 'connection_init':
+            if self.context is not None:
+                raise CloseConnection(TOO_MANY_INITIALISATION_REQUESTS, 'Too many initialisation requests')
+            self.context = WebSocketContext(self.scope, message.get('payload'))
+            self.acknowledged = True
+            await self.send_json({'type': 'connection_ack'})
+        elif message_type == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif message_type == 'pong':
+            pass
+        elif message_type == 'subscribe':
+            if not self.acknowledged:
+                raise CloseConnection(UNAUTHORIZED, 'Unauthorized')
+            operation_id = message.get('id')
+            if not isinstance(operation_id, str) or not isinstance(message.get('payload'), dict):
+                raise CloseConnection(BAD_REQUEST, 'Invalid subscribe message')
+            if operation_id in self.subscriptions:
+                raise CloseConnection(SUBSCRIBER_ALREADY_EXISTS, f'Subscriber for {operation_id} already exists')
+            if len(self.subscriptions) >= self.options['MAX_SUBSCRIPTIONS']:
+                await self.send_error(operation_id, [GraphQLError('Too many subscriptions on this connection')])
+                return
+            task = asyncio.ensure_future(self.run_subscription(operation_id, message['payload']))
+            self.subscriptions[operation_id] = task
+            task.add_done_callback(lambda done: self._forget(operation_id, done))
+        elif message_type == 'complete':
+            task = self.subscriptions.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            raise CloseConnection(BAD_REQUEST, f'Unexpected message of type {message_type}')
+
+    def _forget(self, operation_id, task):
+        if self.subscriptions.get(operation_id) is task:
+            del self.subscriptions[operation_id]
+
+    async def send_error(self, operation_id, errors):
+        await self.send_json({'type': 'error', 'id': operation_id, 'payload': [error.formatted for error in errors]})
+
+    async def run_subscription(self, operation_id, payload):
+        persisted_query = (payload.get('extensions') or {}).get('persistedQuery') or {}
+        graphql_schema = self.schema.graphql_schema
+        try:
+            document, errors = await sync_to_async(get_persisted_queries().get_document)(
+                graphql_schema, payload.get('query') or None, persisted_query.get('sha256Hash')
+            )
+        except GraphQLError as e:
+            errors = [e]
+        if errors:
+            await self.send_error(operation_id, errors)
+            return
+
+        operation = get_operation_ast(document, payload.get('operationName'))
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            await self.send_error(operation_id, [GraphQLError(
+                'Only subscriptions are served over websocket, send queries and mutations to /graphql/'
+            )])
+            return
+
+        result = await subscribe(
+            graphql_schema, document,
+            context_value=self.context,
+            variable_values=payload.get('variables'),
+            operation_name=payload.get('operationName'),
+        )
+        if not hasattr(result, '__aiter__'):
+            await self.send_error(operation_id, result.errors)
+            return
+
+        try:
+            async for execution_result in result:
+                await self.send_json({'type': 'next', 'id': operation_id, 'payload': execution_result.formatted})
+        except GraphQLError as e:
+            await self.send_error(operation_id, [e])
+            return
+        finally:
+            await result.aclose()
+        await self.send_json({'type': 'complete', 'id': operation_id})
+
+
+class GraphQLWebSocketApp:
+    """
+    ASGI application serving graphql-transport-ws connections on path
+    """
+
+    def __init__(self, schema=None, path='/graphql/'):
+        self.schema = schema or async_schema
+        self.path = path
+
+    def allowed_origin(self, scope):
+        headers = dict(scope.get('headers') or [])
+        origin = headers.get(b'origin')
+        return origin is None or origin.decode() in getattr(settings, 'CORS_ALLOWED_ORIGINS', [])
+
+    async def __call__(self, scope, receive, send):
+        event = await receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if scope['path'] != self.path or not self.allowed_origin(scope):
+            await send({'type': 'websocket.close', 'code': FORBIDDEN})
+            return
+        if PROTOCOL not in scope.get('subprotocols', []):
+            await send({'type': 'websocket.close', 'code': SUBPROTOCOL_NOT_ACCEPTABLE})
+            return
+        await send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+        await GraphQLWebSocketConnection(self.schema, scope, receive, send, subscription_settings()).run()
@@ -4,6 +4,7 @@ import { GET_PROJECTS } from '../graphql/queries';
 import { useOrganization } from '../contexts/OrganizationContext';
 import { useNavigate } from 'react-router-dom';
 import { Project } from '../types';
+import { nodes } from '../lib/connection';
 import ProjectStats from './ProjectStats';
 import ProjectCard from './ProjectCard';
 import CreateProjectForm from './CreateProjectForm';
@@ -41,7 +42,7 @@ const Dashboard: React.FC = () => {
     );
   }
 
-  const projects = data?.projects || [];
+  const projects: Project[] = nodes(data?.projects);
 
   return (
     <div className="space-y-8">
@@ -3,7 +3,8 @@ import { useParams, useNavigate } from 'react-router-dom';
 import { useQuery } from '@apollo/client';
 import { GET_PROJECTS, GET_TASKS } from '../graphql/queries';
 import { useOrganization } from '../contexts/OrganizationContext';
-import { Project } from '../types';
+import { Project, Task } from '../types';
+import { nodes } from '../lib/connection';
 import TaskList from './TaskList';
 import CreateTaskForm from './CreateTaskForm';
 import { ArrowLeftIcon, PlusIcon } from '@heroicons/react/24/outline';
@@ -23,7 +24,7 @@ const ProjectView: React.FC = () => {
     skip: !selectedOrganization,
     onCompleted: (data) => {
       if (!selectedProject && projectId) {
-        const project = data.projects.find((p: Project) => p.id === projectId);
+        const project = nodes<Project>(data.projects).find((p) => p.id === projectId);
         if (project) setSelectedProject(project);
       }
     },
@@ -48,8 +49,8 @@ const ProjectView: React.FC = () => {
     return <div>Please select an organization first.</div>;
   }
 
-  const projects = projectsData?.projects || [];
-  const tasks = tasksData?.tasks || [];
+  const projects: Project[] = nodes(projectsData?.projects);
+  const tasks: Task[] = nodes(tasksData?.tasks);
 
   return (
     <div className="space-y-6">
@@ -3,6 +3,7 @@ import { useQuery, useMutation } from '@apollo/client';
 import { GET_TASK_COMMENTS } from '../graphql/queries';
 import { CREATE_TASK_COMMENT } from '../graphql/mutations';
 import { TaskComment } from '../types';
+import { nodes } from '../lib/connection';
 import { format } from 'date-fns';
 import { PaperAirplaneIcon } from '@heroicons/react/24/outline';
 
@@ -41,7 +42,7 @@ const TaskComments: React.FC<TaskCommentsProps> = ({ taskId }) => {
     }
   };
 
-  const comments: TaskComment[] = data?.taskComments || [];
+  const comments: TaskComment[] = nodes(data?.taskComments);
 
   return (
     <div className="bg-gray-50 rounded-lg p-4">
@@ -13,42 +13,66 @@ export const GET_ORGANIZATIONS = gql`
 `;
 
 export const GET_PROJECTS = gql`
-  query GetProjects($organizationId: Int!) {
-    projects(organizationId: $organizationId) {
-      id
-      name
-      description
-      status
-      dueDate
-      taskCount
-      completedTasksCount
-      completionRate
-      createdAt
+  query GetProjects($organizationId: Int!, $first: Int, $after: String) {
+    projects(organizationId: $organizationId, first: $first, after: $after) {
+      edges {
+        node {
+          id
+          name
+          description
+          status
+          dueDate
+          taskCount
+          completedTasksCount
+          completionRate
+          createdAt
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
     }
   }
 `;
 
 export const GET_TASKS = gql`
-  query GetTasks($projectId: Int!) {
-    tasks(projectId: $projectId) {
-      id
-      title
-      description
-      status
-      assigneeEmail
-      dueDate
-      createdAt
+  query GetTasks($projectId: Int!, $first: Int, $after: String) {
+    tasks(projectId: $projectId, first: $first, after: $after) {
+      edges {
+        node {
+          id
+          title
+          description
+          status
+          assigneeEmail
+          dueDate
+          createdAt
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
     }
   }
 `;
 
 export const GET_TASK_COMMENTS = gql`
-  query GetTaskComments($taskId: Int!) {
-    taskComments(taskId: $taskId) {
-      id
-      content
-      authorEmail
-      createdAt
+  query GetTaskComments($taskId: Int!, $first: Int, $after: String) {
+    taskComments(taskId: $taskId, first: $first, after: $after) {
+      edges {
+        node {
+          id
+          content
+          authorEmail
+          createdAt
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
     }
   }
 `;
@@ -1,11 +1,24 @@
 import { ApolloClient, InMemoryCache, createHttpLink } from '@apollo/client';
+import { createPersistedQueryLink } from '@apollo/client/link/persisted-queries';
 
 const httpLink = createHttpLink({
   uri: 'http://127.0.0.1:8000/graphql/', //backend graphQL endpoint
+  credentials: 'include', // read-your-writes cookie of the replica router
 });
 
+// hex encoded sha256 through the Web Crypto API
+const sha256 = async (query: string): Promise<string> => {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(query));
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
+// automatic persisted queries: operations are sent as a hash once the server knows them
+const persistedQueryLink = createPersistedQueryLink({ sha256 });
+
 export const client = new ApolloClient({
-  link: httpLink,
+  link: persistedQueryLink.concat(httpLink),
   cache: new InMemoryCache({
     typePolicies: {
       Query: {
@@ -0,0 +1,5 @@
+import { Connection } from '../types';
+
+// flattens a Relay connection into its nodes
+export const nodes = <T,>(connection?: Connection<T>): T[] =>
+  connection ? connection.edges.map((edge) => edge.node) : [];
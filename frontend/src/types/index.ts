@@ -35,6 +35,16 @@ export interface TaskComment {
   createdAt: string;
 }
 
+export interface PageInfo {
+  hasNextPage: boolean;
+  endCursor?: string;
+}
+
+export interface Connection<T> {
+  edges: { node: T }[];
+  pageInfo: PageInfo;
+}
+
 export interface ProjectStats {
   totalProjects: number;
   activeProjects: number;